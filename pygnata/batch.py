@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import json
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from path import path
+from . import yamlio
+from .config.config import pygconfig
+from .exception import BatchError
+from .logger import logger
+from .profiler import profiler
+
+
+class PygnataBatch(object):
+    """
+        Class used to install many .pyg files in a single process.
+        The entries of a manifest sharing a target, or with a target
+        in the target of another entry, are installed in order, the
+        different targets are installed concurrently. The parsed
+        templates are shared through the parser cache.
+    """
+    #Fields of a manifest entry
+    TEMPLATE = 'template'
+    TARGET = 'target'
+    VARS = 'vars'
+    PROVIDER = 'provider'
+
+    def __init__(self, provider, parser, processor, jobs=None, values=None,
+                 sync=False, atomic=None, stream=False):
+        self.provider = provider
+        self.parser = parser
+        self.processor = processor
+
+        #Values of the VAR parts shared by the entries
+        self.values = values or {}
+
+        #Number of targets installed at the same time
+        if jobs is None:
+            jobs = pygconfig.getint('BATCH', 'Jobs')
+        self.jobs = max(1, int(jobs))
+
+        #Create only the missing entries of the existing targets
+        self.sync = sync
+        #Build each tree in a staging folder, None for the processor default
+        self.atomic = atomic
+        #Create each tree while it is parsed, always done when atomic
+        self.stream = (stream or parser.stream_tree or
+                       processor.is_atomic(atomic, sync))
+
+        #Associate the URLs of a manifest to their downloaded path or error
+        self.downloaded = {}
+
+        #Associate the provider names of a manifest to the providing methods
+        self.types = {'current': pygconfig.get('PROVIDER', 'Current'),
+                      'local': pygconfig.get('PROVIDER', 'Local'),
+                      'url': pygconfig.get('PROVIDER', 'Url'),
+                      'database': pygconfig.get('PROVIDER', 'Database')}
+
+    def load_manifest(self, manifest_path):
+        """
+            Read a YAML or JSON manifest. It is a list of entries with a
+            template, a target folder, and optionally the values of the
+            VAR part (vars) and the providing method (provider).
+
+            :param manifest_path: The path of the manifest
+
+            :type manifest_path: string
+
+            :return: The entries of the manifest
+            :rtype: list
+        """
+        if not os.path.isfile(manifest_path):
+            raise BatchError("The manifest {} does not exist".format(
+                manifest_path))
+
+        with open(manifest_path, 'r') as fd:
+            entries = yamlio.load(fd.read())
+
+        if not isinstance(entries, list):
+            raise BatchError("The manifest should be a list of entries")
+
+        #Check each entry
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                raise BatchError("Entry {} is not a dict".format(index))
+            for field in (PygnataBatch.TEMPLATE, PygnataBatch.TARGET):
+                if not entry.get(field):
+                    raise BatchError("Entry {}- Field {} absent".format(
+                        index, field))
+            provider = entry.get(PygnataBatch.PROVIDER, 'current')
+            if provider not in self.types:
+                raise BatchError("Entry {}- Unknown provider {}".format(
+                    index, provider))
+            if not isinstance(entry.get(PygnataBatch.VARS) or {}, dict):
+                raise BatchError("Entry {}- Field {} is not a dict".format(
+                    index, PygnataBatch.VARS))
+
+        return entries
+
+    def run(self, entries):
+        """
+            Install the entries of a manifest
+
+            :param entries: The entries of the manifest
+
+            :type entries: list
+
+            :return: The result of each entry, in the manifest order
+            :rtype: list
+        """
+        targets = [os.path.realpath(path(entry[PygnataBatch.TARGET]).expand())
+                   for entry in entries]
+
+        #Group the entries by target, in the manifest order. A target in
+        #the target of another entry joins its group, they share folders
+        known = set(targets)
+        groups = {}
+        for index, entry in enumerate(entries):
+            target = top = targets[index]
+            while True:
+                parent = os.path.dirname(target)
+                if parent == target:
+                    break
+                target = parent
+                if target in known:
+                    top = target
+            groups.setdefault(top, []).append((index, entry))
+
+        results = [None] * len(entries)
+        with profiler.phase('batch.run'):
+            self.download(entries)
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                for group_results in pool.map(self.install_group,
+                                              groups.values()):
+                    for index, result in group_results:
+                        results[index] = result
+
+        return results
+
+    def download(self, entries):
+        """
+            Download at once the templates provided by an URL
+
+            :param entries: The entries of the manifest
+
+            :type entries: list
+        """
+        urls = []
+        for entry in entries:
+            url = entry[PygnataBatch.TEMPLATE]
+            if (entry.get(PygnataBatch.PROVIDER) == 'url' and
+                    url not in self.downloaded and url not in urls):
+                urls.append(url)
+
+        if urls:
+            self.downloaded.update(zip(urls, self.provider.search_urls(urls)))
+
+    def install_group(self, group):
+        """
+            Install in order the entries sharing a target or nested
+            targets
+
+            :param group: The (index, entry) of the entries
+
+            :type group: list
+
+            :return: The (index, result) of the entries
+            :rtype: list
+        """
+        return [(index, self.install(entry)) for index, entry in group]
+
+    def install(self, entry):
+        """
+            Install an entry, the errors are kept in the result
+
+            :param entry: The entry of the manifest
+
+            :type entry: dict
+
+            :return: The result of the entry
+            :rtype: dict
+        """
+        result = {'template': entry[PygnataBatch.TEMPLATE],
+                  'target': entry[PygnataBatch.TARGET],
+                  'status': 'ok', 'error': None}
+        start = time.perf_counter()
+
+        try:
+            provide_type = self.types[entry.get(PygnataBatch.PROVIDER,
+                                                'current')]
+            file_path = None
+            if entry.get(PygnataBatch.PROVIDER) == 'url':
+                file_path = self.downloaded.get(entry[PygnataBatch.TEMPLATE])
+            if isinstance(file_path, Exception):
+                raise file_path
+            if file_path is None:
+                file_path = self.provider.search(provide_type,
+                                                 entry[PygnataBatch.TEMPLATE])
+            if not file_path:
+                raise BatchError("Template {} not found".format(
+                    entry[PygnataBatch.TEMPLATE]))
+
+            #The values come from the manifest, nothing is asked
+            values = dict(self.values)
+            values.update(entry.get(PygnataBatch.VARS) or {})
+            part_dic = self.parser.parse(file_path, True, values, False,
+                                         self.stream)
+
+            target = path(entry[PygnataBatch.TARGET]).expand()
+            if not target.isdir():
+                os.makedirs(target)
+            report = self.processor.process(target, part_dic,
+                                            self.provider.source_dir(
+                                                file_path),
+                                            self.sync, self.atomic)
+            if report is not None:
+                result['sync'] = report.counts()
+                if report.entries[report.CONFLICTS]:
+                    result['status'] = 'conflict'
+                    result['conflicts'] = sorted(
+                        report.entries[report.CONFLICTS])
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = '{}: {}'.format(type(e).__name__, e)
+            logger.error("{} -> {}: {}".format(result['template'],
+                                               result['target'],
+                                               result['error']))
+
+        result['time'] = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def summary(results):
+        """
+            Format the results of a batch in a table
+
+            :param results: The result of each entry
+
+            :type results: list
+
+            :return: The table
+            :rtype: string
+        """
+        lines = ["{:<6} {:>10}  {:<30} {}".format("STATUS", "TIME (s)",
+                                                 "TEMPLATE", "TARGET")]
+        for result in results:
+            lines.append("{:<6} {:>10.4f}  {:<30} {}".format(
+                result['status'], result['time'], result['template'],
+                result['target']))
+            if result['error']:
+                lines.append("       {}".format(result['error']))
+            if result.get('sync'):
+                lines.append("       {created} created, {existing} existing, "
+                             "{conflicts} conflicts".format(**result['sync']))
+
+        nb_errors = len([result for result in results
+                         if result['status'] == 'error'])
+        lines.append("{} entries, {} failed".format(len(results), nb_errors))
+        return "\n".join(lines)
+
+    @staticmethod
+    def save(results, dest_path):
+        """
+            Write the results of a batch in a JSON file
+
+            :param results: The result of each entry
+            :param dest_path: The path of the JSON file
+
+            :type results: list
+            :type dest_path: string
+        """
+        with open(dest_path, 'w') as fd:
+            json.dump(results, fd, indent=2, sort_keys=True)
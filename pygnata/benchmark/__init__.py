@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+"""
+    Benchmarks of the pygnata pipeline on synthetic trees:
+
+    - PygnataTreeGenerator: generate source folders and .pyg files
+    - PygnataBenchmark: measure the stages and compare with a baseline
+
+    Run ``python -m pygnata.benchmark -h`` for the command line.
+"""
+
+from .generator import PygnataTreeGenerator
+from .runner import PygnataBenchmark, STAGES
+
+__all__ = ['PygnataTreeGenerator', 'PygnataBenchmark', 'STAGES']
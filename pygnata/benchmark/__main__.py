@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+"""Pygnata benchmark.
+Usage:
+  benchmark [options]
+
+Options:
+  -h --help  Show this help message and exit
+  -n <sizes>, --nodes <sizes>  Comma separated numbers of nodes [default: 10000,100000,1000000]
+  -s <stages>, --stages <stages>  Comma separated stages (startup,create,parse,show,install)
+  -b <breadth>, --breadth <breadth>  Number of entries in each folder [default: 20]
+  -D <depth>, --depth <depth>  Maximum depth of the trees [default: 8]
+  -r <ratio>, --dir-ratio <ratio>  Part of the entries which are folders [default: 0.3]
+  -v <density>, --var-density <density>  Part of the names using a Jinja variable [default: 0.1]
+  -w <dir>, --workdir <dir>  Folder of the generated trees (a tmpfs by default)
+  -o <file>, --output <file>  Write the JSON report in a file
+  -c <file>, --compare <file>  Compare with a baseline JSON report
+  -t <ratio>, --threshold <ratio>  Allowed relative increase of a metric [default: 0.1]
+  --startup-budget <seconds>  Maximum startup time of 'pygnata -h' [default: 0.1]
+"""
+
+import sys
+import json
+
+from docopt import docopt
+
+from ..logger import logger
+from .generator import PygnataTreeGenerator
+from .runner import PygnataBenchmark, STAGES
+
+
+def benchmark_run():
+    """
+        Entry point of the benchmark
+    """
+    arguments = docopt(__doc__)
+
+    generator = PygnataTreeGenerator(
+        breadth=int(arguments['--breadth']),
+        depth=int(arguments['--depth']),
+        dir_ratio=float(arguments['--dir-ratio']),
+        var_density=float(arguments['--var-density']))
+
+    sizes = [int(size) for size in arguments['--nodes'].split(',')]
+    stages = STAGES
+    if arguments['--stages']:
+        stages = arguments['--stages'].split(',')
+        for stage in stages:
+            if stage not in STAGES:
+                logger.error("Unknown stage {}".format(stage))
+                return 2
+
+    bench = PygnataBenchmark(generator, arguments['--workdir'])
+    report = bench.run(sizes, stages)
+
+    if arguments['--output']:
+        bench.save(report, arguments['--output'])
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+    baseline = {}
+    if arguments['--compare']:
+        baseline = bench.load(arguments['--compare'])
+
+    budgets = {'startup': float(arguments['--startup-budget'])}
+    regressions = bench.compare(report, baseline,
+                                float(arguments['--threshold']), budgets)
+    for regression in regressions:
+        logger.error("Regression: {}".format(regression))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(benchmark_run())
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import re
+import random
+
+from collections import deque
+
+from .. import yamlio
+
+#Pattern of the Jinja variables in the generated names
+VAR_PATTERN = re.compile(r"\{\{ (v\d+) \}\}")
+
+
+class PygnataTreeGenerator(object):
+    """
+        Class used to generate synthetic trees, as source folders
+        and as .pyg files
+    """
+    def __init__(self, breadth=20, depth=8, dir_ratio=0.3,
+                 var_density=0.1, nb_vars=16, seed=0):
+        #Number of entries in each folder
+        self.breadth = breadth
+        #Maximum depth of the tree
+        self.depth = depth
+        #Part of the entries which are folders
+        self.dir_ratio = dir_ratio
+        #Part of the names using a Jinja variable
+        self.var_density = var_density
+        #Values of the Jinja variables, given by the STATIC part
+        self.variables = dict(('v{}'.format(index), 'val{}'.format(index))
+                              for index in range(nb_vars))
+        self.seed = seed
+
+    def generate(self, nodes):
+        """
+            Generate a nested tree, breadth first, with the TREE part
+            structure. Some names use Jinja variables.
+
+            :param nodes: The number of nodes of the tree
+
+            :type nodes: int
+
+            :return: The tree and its real number of nodes
+            :rtype: tuple
+
+            .. note:: The tree is smaller if nodes is bigger than what
+                      the breadth and the depth allow
+        """
+        rng = random.Random(self.seed)
+        nb_vars = len(self.variables)
+
+        root = []
+        count = 1
+        queue = deque([(root, 1)])
+
+        while queue and count < nodes:
+            children, depth = queue.popleft()
+            for _ in range(self.breadth):
+                if count >= nodes:
+                    break
+
+                name = 'n{}'.format(count)
+                if rng.random() < self.var_density:
+                    name += '_{{{{ v{} }}}}'.format(count % nb_vars)
+
+                #The last level contains only files
+                if depth < self.depth and rng.random() < self.dir_ratio:
+                    sub_dir = []
+                    children.append({name: sub_dir})
+                    queue.append((sub_dir, depth + 1))
+                else:
+                    children.append(name)
+                count += 1
+
+            #Keep at least one folder to go on
+            if not queue and count < nodes and depth < self.depth:
+                sub_dir = []
+                children.append({'d{}'.format(count): sub_dir})
+                queue.append((sub_dir, depth + 1))
+                count += 1
+
+        return [{'root': root}], count
+
+    def render_name(self, name):
+        """
+            Replace the Jinja variables of a name by their value
+
+            :param name: The generated name
+
+            :type name: string
+
+            :return: The rendered name
+            :rtype: string
+        """
+        return VAR_PATTERN.sub(lambda match: self.variables[match.group(1)],
+                               name)
+
+    def write_source(self, tree, root_path):
+        """
+            Create the folders and files of a generated tree
+
+            :param tree: The generated tree
+            :param root_path: The folder where the tree is created
+
+            :type tree: list
+            :type root_path: string
+        """
+        stack = [(root_path, tree)]
+        while stack:
+            dir_path, children = stack.pop()
+            for value in children:
+                if isinstance(value, dict):
+                    for key, sub_value in value.items():
+                        new_path = os.path.join(dir_path, self.render_name(key))
+                        os.mkdir(new_path)
+                        stack.append((new_path, sub_value))
+                else:
+                    new_file = os.path.join(dir_path, self.render_name(value))
+                    open(new_file, 'w').close()
+
+    def write_pyg(self, tree, dest_path):
+        """
+            Write a .pyg file with a generated tree, the Jinja variables
+            are given by the STATIC part so nothing is asked.
+
+            :param tree: The generated tree
+            :param dest_path: The path of the .pyg file
+
+            :type tree: list
+            :type dest_path: string
+        """
+        info = {'title': 'Pygnata benchmark', 'author': 'pygnata',
+                'version': 0.1, 'date': '2015-07-23 22:29:23'}
+        with open(dest_path, 'w') as fd:
+            fd.write("---\nINFO:\n")
+            fd.write(yamlio.dump(info, default_flow_style=False))
+            fd.write("---\nSTATIC:\n")
+            fd.write(yamlio.dump(self.variables, default_flow_style=False))
+            fd.write("---\nTREE:\n")
+            yamlio.dump(tree, fd, default_flow_style=False)
@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+
+from .. import __version__
+from .. import yamlio
+from ..logger import logger
+from .generator import PygnataTreeGenerator
+
+#The stages which can be measured
+STAGES = ['startup', 'create', 'parse', 'show', 'install']
+
+#Command used to measure the startup time
+STARTUP_CODE = ("import sys; sys.argv = ['pygnata', '-h'];"
+                "from pygnata.pygnata import pygnata_run; pygnata_run()")
+
+#Metrics compared with a baseline
+METRICS = ['wall_time', 'peak_rss_kb']
+
+
+def read_io_counters():
+    """
+        Read the I/O counters of the current process, only the read and
+        write calls are counted (syscr and syscw of /proc/self/io)
+
+        :return: The numbers of read and write calls, empty if unknown
+        :rtype: dict
+    """
+    counters = {}
+    try:
+        with open('/proc/self/io') as fd:
+            for line in fd:
+                key, value = line.split(':')
+                counters[key] = int(value)
+    except (OSError, IOError, ValueError):
+        return {}
+    return {'read_calls': counters.get('syscr', 0),
+            'write_calls': counters.get('syscw', 0)}
+
+
+def measure(stage, workdir, pipe):
+    """
+        Run a stage in a child process and send its measures
+
+        :param stage: The name of the stage
+        :param workdir: The folder with the generated files
+        :param pipe: The connection used to send the measures
+
+        :type stage: string
+        :type workdir: string
+        :type pipe: Connection
+    """
+    try:
+        #Keep the logs of each node out of the measures
+        logger.setLevel(logging.WARNING)
+        #Use the folders of the benchmark instead of ~/.pygnata
+        os.environ['HOME'] = workdir
+
+        stage_fct = globals()['stage_' + stage]
+        prepare = stage_fct(workdir)
+
+        before = read_io_counters()
+        start = time.perf_counter()
+        prepare()
+        wall_time = time.perf_counter() - start
+        after = read_io_counters()
+
+        result = {'wall_time': wall_time,
+                  'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+        for key in after:
+            result[key] = after[key] - before[key]
+        pipe.send(result)
+    except Exception as e:
+        pipe.send({'error': '{}: {}'.format(type(e).__name__, e)})
+    finally:
+        pipe.close()
+
+
+def stage_startup(workdir):
+    """
+        Prepare the measure of the startup time of 'pygnata -h'
+
+        :param workdir: The folder with the generated files
+
+        :type workdir: string
+
+        :return: The function to measure
+        :rtype: function
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=package_dir)
+
+    def run():
+        subprocess.check_call([sys.executable, '-c', STARTUP_CODE], env=env,
+                              stdout=subprocess.DEVNULL)
+    return run
+
+
+def stage_create(workdir):
+    """
+        Prepare the measure of PygnataBuilder.build on the source tree
+
+        :param workdir: The folder with the generated files
+
+        :type workdir: string
+
+        :return: The function to measure
+        :rtype: function
+    """
+    from ..builder import PygnataBuilder
+
+    builder = PygnataBuilder()
+    out_dir = os.path.join(workdir, 'built')
+    os.mkdir(out_dir)
+    return lambda: builder.build(os.path.join(workdir, 'source'), out_dir)
+
+
+def get_parser():
+    """
+        Create a parser without the cache, to measure a real parsing
+
+        :return: The parser
+        :rtype: PygnataParser
+    """
+    from ..cache import PygnataCache
+    from ..parser import PygnataParser
+
+    return PygnataParser(PygnataCache(enabled=False))
+
+
+def stage_parse(workdir):
+    """
+        Prepare the measure of PygnataParser.parse on the .pyg file
+
+        :param workdir: The folder with the generated files
+
+        :type workdir: string
+
+        :return: The function to measure
+        :rtype: function
+    """
+    parser = get_parser()
+    return lambda: parser.parse(os.path.join(workdir, 'bench.pyg'), False)
+
+
+def stage_show(workdir):
+    """
+        Prepare the measure of PygnataDisplay.show on the parsed file
+
+        :param workdir: The folder with the generated files
+
+        :type workdir: string
+
+        :return: The function to measure
+        :rtype: function
+    """
+    from ..display import PygnataDisplay
+
+    part_dic = get_parser().parse(os.path.join(workdir, 'bench.pyg'), False)
+    display = PygnataDisplay()
+
+    def run():
+        with open(os.devnull, 'w') as devnull:
+            display.show(part_dic, stream=devnull)
+    return run
+
+
+def stage_install(workdir):
+    """
+        Prepare the measure of the parsing and PygnataProcessor.process
+
+        :param workdir: The folder with the generated files
+
+        :type workdir: string
+
+        :return: The function to measure
+        :rtype: function
+    """
+    from ..processor import PygnataProcessor
+
+    parser = get_parser()
+    processor = PygnataProcessor()
+    target = os.path.join(workdir, 'installed')
+    os.mkdir(target)
+
+    def run():
+        part_dic = parser.parse(os.path.join(workdir, 'bench.pyg'), False)
+        processor.process(target, part_dic)
+    return run
+
+
+class PygnataBenchmark(object):
+    """
+        Class used to measure the pipeline stages on synthetic trees
+    """
+    def __init__(self, generator=None, base_dir=None):
+        #Generator of the trees
+        self.generator = generator or PygnataTreeGenerator()
+
+        #Prefer a tmpfs to measure pygnata and not the disk
+        if base_dir is None and os.access('/dev/shm', os.W_OK):
+            base_dir = '/dev/shm'
+        self.base_dir = base_dir
+
+    def run(self, sizes, stages=None):
+        """
+            Measure the stages for each tree size
+
+            :param sizes: The numbers of nodes of the trees
+            :param stages: The stages to measure, all by default
+
+            :type sizes: list
+            :type stages: list
+
+            :return: The benchmark report
+            :rtype: dict
+        """
+        stages = stages or STAGES
+        results = []
+
+        for nodes in sizes:
+            workdir = tempfile.mkdtemp(prefix='pygnata-bench-',
+                                       dir=self.base_dir)
+            try:
+                real_nodes = self.prepare(workdir, nodes)
+                for stage in stages:
+                    result = self.run_stage(stage, workdir)
+                    result.update({'stage': stage, 'nodes': real_nodes})
+                    results.append(result)
+                    logger.info("{:>8} {:>9} nodes {}".format(
+                        stage, real_nodes, self.format_result(result)))
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        return {'version': __version__,
+                'python': platform.python_version(),
+                'yaml_backend': yamlio.backend(),
+                'generator': {'breadth': self.generator.breadth,
+                              'depth': self.generator.depth,
+                              'dir_ratio': self.generator.dir_ratio,
+                              'var_density': self.generator.var_density},
+                'results': results}
+
+    def prepare(self, workdir, nodes):
+        """
+            Generate the source tree and the .pyg file of a size
+
+            :param workdir: The folder of the generated files
+            :param nodes: The number of nodes of the tree
+
+            :type workdir: string
+            :type nodes: int
+
+            :return: The real number of nodes
+            :rtype: int
+        """
+        tree, real_nodes = self.generator.generate(nodes)
+        source = os.path.join(workdir, 'source')
+        os.mkdir(source)
+        self.generator.write_source(tree, source)
+        self.generator.write_pyg(tree, os.path.join(workdir, 'bench.pyg'))
+        return real_nodes
+
+    @staticmethod
+    def run_stage(stage, workdir):
+        """
+            Measure a stage in a new process, so the peak memory is the
+            one of the stage. The process is spawned and not forked, a
+            forked process starts with the peak memory of the generator.
+
+            :param stage: The name of the stage
+            :param workdir: The folder with the generated files
+
+            :type stage: string
+            :type workdir: string
+
+            :return: The measures of the stage
+            :rtype: dict
+        """
+        context = multiprocessing.get_context('spawn')
+        reader, writer = context.Pipe(duplex=False)
+        process = context.Process(target=measure, args=(stage, workdir, writer))
+        process.start()
+        writer.close()
+        try:
+            result = reader.recv()
+        except EOFError:
+            result = {'error': 'The stage process died'}
+        process.join()
+        return result
+
+    @staticmethod
+    def format_result(result):
+        """
+            Format the measures of a stage on one line
+
+            :param result: The measures of the stage
+
+            :type result: dict
+
+            :return: The formatted measures
+            :rtype: string
+        """
+        if 'error' in result:
+            return "error: {}".format(result['error'])
+        line = "{:10.4f}s {:>10} kB".format(result['wall_time'],
+                                             result['peak_rss_kb'])
+        if 'read_calls' in result:
+            line += " {:>9} reads {:>9} writes".format(
+                result['read_calls'], result['write_calls'])
+        return line
+
+    @staticmethod
+    def compare(report, baseline, threshold=0.1, budgets=None):
+        """
+            Compare a report with a baseline report
+
+            :param report: The new benchmark report
+            :param baseline: The baseline benchmark report
+            :param threshold: The allowed relative increase of a metric
+            :param budgets: The maximum wall time of some stages
+
+            :type report: dict
+            :type baseline: dict
+            :type threshold: float
+            :type budgets: dict
+
+            :return: The description of each regression
+            :rtype: list
+        """
+        regressions = []
+        known = dict(((result['stage'], result['nodes']), result)
+                     for result in baseline.get('results', []))
+
+        for result in report['results']:
+            if 'error' in result:
+                regressions.append("{} {} nodes: {}".format(
+                    result['stage'], result['nodes'], result['error']))
+                continue
+
+            #Check the absolute budget of the stage
+            budget = (budgets or {}).get(result['stage'])
+            if budget is not None and result['wall_time'] > budget:
+                regressions.append("{} {} nodes: {:.4f}s over the {}s budget"
+                                   .format(result['stage'], result['nodes'],
+                                           result['wall_time'], budget))
+
+            old = known.get((result['stage'], result['nodes']))
+            if not old or 'error' in old:
+                continue
+            for metric in METRICS:
+                if not old.get(metric):
+                    continue
+                ratio = result[metric] / float(old[metric])
+                if ratio > 1 + threshold:
+                    regressions.append("{} {} nodes: {} {} -> {} (x{:.2f})"
+                                       .format(result['stage'], result['nodes'],
+                                               metric, old[metric],
+                                               result[metric], ratio))
+        return regressions
+
+    @staticmethod
+    def save(report, dest_path):
+        """
+            Write a report in a JSON file
+
+            :param report: The benchmark report
+            :param dest_path: The path of the JSON file
+
+            :type report: dict
+            :type dest_path: string
+        """
+        with io.open(dest_path, 'w') as fd:
+            json.dump(report, fd, indent=2, sort_keys=True)
+
+    @staticmethod
+    def load(src_path):
+        """
+            Read a report from a JSON file
+
+            :param src_path: The path of the JSON file
+
+            :type src_path: string
+
+            :return: The benchmark report
+            :rtype: dict
+        """
+        with io.open(src_path) as fd:
+            return json.load(fd)
@@ -3,20 +3,46 @@
 #The MIT License (MIT)
 #Copyright (c) 2015 Alexandre LM, Dimitri S
 
+import os
 import time
+import threading
 import yaml
-import re
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 from path import path
-from jinja2 import Environment
+from yaml.events import (StreamStartEvent, StreamEndEvent,
+                         DocumentStartEvent, DocumentEndEvent,
+                         SequenceStartEvent, SequenceEndEvent,
+                         MappingStartEvent, MappingEndEvent, ScalarEvent)
+from yaml.resolver import Resolver
+from . import yamlio
 from .config.config import pygconfig
+from .contents import PygnataContents, SOURCE, WRITE_FLAGS
+from .environment import get_template
 from .exception import BuilderError
+from .ignore import PygnataIgnore
+from .profiler import profiler
+from .snapshot import PygnataSnapshot
+from .tree import PygnataTree
+from . import tree as tree_kinds
+
+
+#Placeholder of the tree in the rendered template when it is streamed
+TREE_MARK = "\x00PYGNATA_TREE\x00"
+
+#Tag of the YAML strings
+STR_TAG = 'tag:yaml.org,2002:str'
 
 
 class PygnataBuilder(object):
     """
         Class use for build a pygnata file
     """
+    #Suffix of the folder receiving the captured contents
+    blob_suffix = '_files'
+
     def __init__(self):
 
         #Get the file extension for the built files
@@ -37,7 +63,23 @@ class PygnataBuilder(object):
         #Get the pattern for the date in the template file
         self.date_pattern = path(pygconfig.get('BUILDER', 'DateFormat'))
 
-    def build(self, src_folder, dst=None, out_name=None, ignored=None):
+        #Get the field of the tree and the default building mode
+        self.tree_field = pygconfig.get('BUILDER', 'TreeField')
+        self.stream = pygconfig.getboolean('BUILDER', 'Stream')
+
+        #Get the number of scanning threads and how far they can go ahead
+        self.jobs = pygconfig.getint('BUILDER', 'Jobs')
+        self.scan_ahead = pygconfig.getint('BUILDER', 'ScanAhead')
+
+        #Reuse the listings of the folders unchanged since the last build
+        self.snapshot = pygconfig.getboolean('BUILDER', 'Snapshot')
+
+        #Used to know if a name must be quoted in the YAML tree
+        self.resolver = Resolver()
+
+    def build(self, src_folder, dst=None, out_name=None, ignored=None,
+              stream=None, jobs=None, contents=False, snapshot=None,
+              excluded=None):
         """
             Build a .pyg file base on an existing directory
 
@@ -45,16 +87,46 @@ class PygnataBuilder(object):
             :param dst: The destination path of the built .pyg file
             :param out_name: The custom name for the built .pyg file
             :param ignored: Regex list for ignored files/folder
+            :param stream: Write the tree while walking the folder
+            :param jobs: The number of threads scanning the folder
+            :param contents: Copy the non empty files next to the .pyg file
+            :param snapshot: Reuse the listings of the last build
+            :param excluded: Rules of ignored files/folders, in the
+                             .gitignore syntax
 
             :type src_folder: string
             :type dst: string
             :type out_name: string
             :type ignored: list
+            :type stream: bool
+            :type jobs: int
+            :type contents: bool
+            :type snapshot: bool
+            :type excluded: list
 
             :return: The absolute path of the built .pyg file
             :rtype: string
 
+            .. note:: In stream mode, the entries of a folder are sorted
+                      by name and the memory use does not depend on the
+                      size of the tree. Using more than one job or
+                      capturing the contents enables the stream mode.
+                      The snapshot of the folders is only used in
+                      stream mode. The rules of the .gitignore and
+                      .pygignore files found in the folder are applied.
         """
+        if stream is None:
+            stream = self.stream
+
+        if snapshot is None:
+            snapshot = self.snapshot
+
+        if jobs is None:
+            jobs = self.jobs
+        #Only the stream mode can scan in parallel or capture the contents
+        if jobs > 1 or contents:
+            stream = True
+
         src_path = path(src_folder).expand()
 
         #Set the name of the destination file
@@ -70,9 +142,8 @@ class PygnataBuilder(object):
             if dst is not None:
                 raise BuilderError("{} is not a directory".format(dst))
 
-        #Compile regex list for ignored files/folders
-        if ignored:
-            ignored = [re.compile(regex) for regex in ignored]
+        #Compile the regex list and the rules for ignored files/folders
+        ignored = PygnataIgnore(ignored, excluded)
 
         #If provided, set the new name of the .pyg file
         if out_name:
@@ -83,22 +154,42 @@ class PygnataBuilder(object):
         #Set the path of the destination file
         dest_path = dest_folder / dest_name
 
+        #The contents are copied in a folder named like the .pyg file
+        blob_dir = None
+        if contents:
+            blob_dir = dest_folder / (dest_name[:-len(self.extension)] +
+                                      self.blob_suffix)
+
         #Open the template defining the .pyg file
         with open(self.template, 'r') as src_file_desc:
             template = src_file_desc.read()
 
-            #browse the field list and launch the appropriate function
-            for field, funct in list(self.fields.items()):
-                ret = funct(src_folder, ignored)
-                self.fields[field] = ret
-
-            #Replace the value in template with jinja
-            new_template = Environment().from_string(template)
-            new_template = new_template.render(self.fields)
-
-            #open the destination file and write the new template inside
-            with open(dest_path, 'w') as dest_file_desc:
-                dest_file_desc.write(str(new_template))
+        #browse the field list and launch the appropriate function
+        values = {}
+        for field, funct in list(self.fields.items()):
+            if stream and field == self.tree_field:
+                #The tree is written later, keep its place
+                values[field] = TREE_MARK
+            else:
+                with profiler.phase('builder.' + field):
+                    values[field] = funct(src_folder, ignored)
+
+        #Replace the value in template with jinja
+        with profiler.phase('builder.jinja'):
+            new_template = get_template(template)
+            new_template = str(new_template.render(values))
+
+        #open the destination file and write the new template inside
+        with open(dest_path, 'w') as dest_file_desc:
+            if stream:
+                head, tail = new_template.split(TREE_MARK, 1)
+                dest_file_desc.write(head)
+                with profiler.phase('builder.tree'):
+                    self.write_tree(src_folder, ignored, dest_file_desc, jobs,
+                                    blob_dir, snapshot)
+                dest_file_desc.write(tail)
+            else:
+                dest_file_desc.write(new_template)
 
         #return the absolute path of the .pyg file
         return dest_path
@@ -122,16 +213,14 @@ class PygnataBuilder(object):
             Create and return a Yaml tree of a folder
 
             :param src_folder: The root folder of the tree
-            :param ignored: A list of regex use to ignore files and folders
+            :param ignored: Tells the ignored files and folders
 
             :type src_folder: string
-            :type ignored: list
+            :type ignored: PygnataIgnore
 
             :return: A YAML folder tree
             :rtype: string
         """
-        tree_list = []
-
         #Get the absolute path of the src_folder
         abs_path = path(src_folder).abspath()
 
@@ -139,68 +228,402 @@ class PygnataBuilder(object):
         if not abs_path.exists():
             raise BuilderError("File {} unknown".format(abs_path))
 
-        #Set the root path
-        root_path = abs_path
-
         #Get the tree
-        tree_list.append(self.generate_tree_dict(root_path, ignored))
+        tree = self.generate_tree(abs_path, ignored)
 
         #Return a Yaml format of the tree
-        return yaml.dump(tree_list, default_flow_style=False)
+        return yamlio.dump(tree.to_yaml(), default_flow_style=False)
 
-    def generate_tree_dict(self, root_path, ignored):
+    def generate_tree(self, root_path, ignored):
         """
-            Generate a dict of a folder and sub folders from a root path.
+            Generate the tree of a folder and sub folders from a root
+            path, the folders are walked without recursion.
 
             :param root_path: The root folder of the folder tree
-            :param ignored: A list of regex use to ignore files and folders
+            :param ignored: Tells the ignored files and folders
 
-            :type root_path: string
-            :type ignored: list
+            :type root_path: Path
+            :type ignored: PygnataIgnore
 
-            :return: A dict representing a folder tree
-            :rtype: dic
+            :return: The folder tree
+            :rtype: PygnataTree
         """
+        tree = PygnataTree()
 
-        tree_dic = {}
+        #Initiate the tree with the root path
+        root_index = tree.add(root_path.name, tree_kinds.DIR)
 
-        #Initiate the dict with the root path
-        tree_dic[str(root_path.name)] = []
-
-        #If the root_path is just a file
+        #The remaining entries of each open folder with its node and the
+        #ignore rules of its sub folders
+        stack = []
+        #If the root_path is just a file, it is an empty folder
         if not root_path.isfile():
-            #For each dir/file in root_path
-            for objects in root_path.listdir():
-                #If the object name is in the exclusion list
-                if not self.match_with_regex(objects.name, ignored):
-                    if objects.isfile():
-                        #Add in folder array for the root path
-                        tree_dic[str(root_path.name)].append(str(objects.name))
+            entries, context = self.list_dir(root_path, ignored)
+            stack.append((iter(entries), root_index, context))
+
+        while stack:
+            entry = next(stack[-1][0], None)
+            if entry is None:
+                stack.pop()
+                continue
+            name, is_dir, entry_path = entry
+            parent, context = stack[-1][1], stack[-1][2]
+
+            if is_dir:
+                index = tree.add(name, tree_kinds.DIR, parent)
+                entries, sub_context = self.list_dir(entry_path, ignored,
+                                                     context=context)
+                stack.append((iter(entries), index, sub_context))
+            else:
+                #Add in folder array for the root path
+                tree.add(name, tree_kinds.FILE, parent)
+
+        tree.finish()
+        return tree
+
+    def write_tree(self, src_folder, ignored, stream, jobs=1, blob_dir=None,
+                   snapshot=False):
+        """
+            Walk a folder and write its YAML tree in a stream. The output
+            is the same as yaml.dump with the entries sorted by name.
+            With the snapshot, only the folders changed since the last
+            build are scanned.
+
+            :param src_folder: The root folder of the tree
+            :param ignored: Tells the ignored files and folders
+            :param stream: The file object where the tree is written
+            :param jobs: The number of threads scanning the folder
+            :param blob_dir: The folder receiving the non empty files
+            :param snapshot: Reuse the listings of the last build
+
+            :type src_folder: string
+            :type ignored: PygnataIgnore
+            :type stream: file
+            :type jobs: int
+            :type blob_dir: string
+            :type snapshot: bool
+        """
+        #Get the absolute path of the src_folder
+        abs_path = os.path.abspath(os.path.expanduser(src_folder))
+
+        #If the folder doesn't exist
+        if not os.path.exists(abs_path):
+            raise BuilderError("File {} unknown".format(abs_path))
+
+        dir_snapshot = None
+        if snapshot:
+            dir_snapshot = PygnataSnapshot(abs_path)
+            dir_snapshot.load()
+
+        list_dir = partial(self.list_dir, ignored=ignored,
+                           snapshot=dir_snapshot)
+        scanner = PygnataScanner(list_dir, jobs, self.scan_ahead)
+        capture = None
+        if blob_dir is not None:
+            #The files are referenced from the folder of the .pyg file
+            base_dir = os.path.dirname(os.path.abspath(blob_dir))
+            root_parent = os.path.dirname(abs_path)
+            capture = partial(self.capture_file, root_parent=root_parent,
+                              blob_dir=blob_dir, base_dir=base_dir)
+
+        try:
+            yamlio.emit(self.iter_tree_events(abs_path, scanner, capture),
+                        stream)
+        finally:
+            scanner.close()
+
+        #Kept only when the whole tree was written
+        if dir_snapshot is not None:
+            dir_snapshot.save()
+
+    def capture_file(self, file_path, root_parent, blob_dir, base_dir):
+        """
+            Copy a non empty file in the blob folder
+
+            :param file_path: The absolute path of the file
+            :param root_parent: The parent of the root folder
+            :param blob_dir: The folder receiving the files
+            :param base_dir: The folder of the .pyg file
+
+            :type file_path: string
+            :type root_parent: string
+            :type blob_dir: string
+            :type base_dir: string
 
-                    if objects.isdir():
-                        tmp_dir = {}
-                        #Call generate_tree_dict recursively
-                        tmp_dir = self.generate_tree_dict(objects, ignored)
-                        tree_dic[str(root_path.name)].append(tmp_dir)
+            :return: The path of the copy from the .pyg folder, or None
+                     for an empty file
+            :rtype: string
+        """
+        if os.stat(file_path).st_size == 0:
+            return None
+
+        blob_path = os.path.join(blob_dir, os.path.relpath(file_path,
+                                                           root_parent))
+        blob_parent = os.path.dirname(blob_path)
+        if not os.path.isdir(blob_parent):
+            os.makedirs(blob_parent)
 
-        return tree_dic
+        blob_fd = os.open(blob_path, WRITE_FLAGS, 0o666)
+        try:
+            PygnataContents.copy(file_path, blob_fd)
+        finally:
+            os.close(blob_fd)
+        profiler.count('builder.captured')
 
-    def match_with_regex(self, value, ignored_lst):
+        return os.path.relpath(blob_path, base_dir).replace(os.sep, '/')
+
+    def iter_tree_events(self, root_path, scanner, capture=None):
         """
-            Test if a string match with a list of regex
+            Walk a folder iteratively and yield the YAML events of its tree
 
-            :param value: The string to test
-            :param ignored_lst: A list of regex use to ignore files and folders
+            :param root_path: The absolute path of the root folder
+            :param scanner: The scanner listing the folders
+            :param capture: Function copying a file and returning its
+                            reference, None to keep the files empty
+
+            :type root_path: string
+            :type scanner: PygnataScanner
+            :type capture: function
+
+            :return: A generator of YAML events
+            :rtype: generator
+        """
+        yield StreamStartEvent()
+        yield DocumentStartEvent(explicit=False)
+        yield SequenceStartEvent(None, None, True, flow_style=False)
+
+        #Open the root folder
+        for event in self.open_dir_events(os.path.basename(root_path)):
+            yield event
+
+        #A stack with the remaining entries of each open folder
+        stack = []
+        if os.path.isdir(root_path):
+            stack.append(iter(scanner.scan(root_path)))
+        else:
+            #If the root_path is just a file
+            stack.append(iter(()))
+
+        while stack:
+            entry = next(stack[-1], None)
+
+            #The folder is done, close it
+            if entry is None:
+                stack.pop()
+                yield SequenceEndEvent()
+                yield MappingEndEvent()
+                continue
+
+            name, is_dir, entry_path, ahead, context = entry
+            if is_dir:
+                for event in self.open_dir_events(name):
+                    yield event
+                stack.append(iter(scanner.result(entry_path, ahead,
+                                                 context)))
+            else:
+                source = capture(entry_path) if capture else None
+                if source is None:
+                    yield self.scalar_event(name)
+                    continue
+                #A file with a content: "- name: {source: path}"
+                yield MappingStartEvent(None, None, True, flow_style=False)
+                yield self.scalar_event(name)
+                yield MappingStartEvent(None, None, True, flow_style=False)
+                yield self.scalar_event(SOURCE)
+                yield self.scalar_event(source)
+                yield MappingEndEvent()
+                yield MappingEndEvent()
+
+        yield SequenceEndEvent()
+        yield DocumentEndEvent(explicit=False)
+        yield StreamEndEvent()
+
+    def open_dir_events(self, name):
+        """
+            Return the YAML events opening a folder
+
+            :param name: The name of the folder
+
+            :type name: string
+
+            :return: The YAML events
+            :rtype: list
+        """
+        return [MappingStartEvent(None, None, True, flow_style=False),
+                self.scalar_event(name),
+                SequenceStartEvent(None, None, True, flow_style=False)]
+
+    def scalar_event(self, value):
+        """
+            Create the YAML event of a name, quoted like yaml.dump does
+
+            :param value: The name of the file or folder
 
             :type value: string
-            :type ignored_lst: list
 
-            :return: If the name match with a regex
-            :rtype: bool
+            :return: The YAML event
+            :rtype: ScalarEvent
+        """
+        plain = self.resolver.resolve(yaml.ScalarNode, value, (True, False))
+        quoted = self.resolver.resolve(yaml.ScalarNode, value, (False, True))
+        implicit = (plain == STR_TAG, quoted == STR_TAG)
+        return ScalarEvent(None, None, implicit, value)
+
+    def list_dir(self, dir_path, ignored=None, snapshot=None, context=None):
+        """
+            List a folder with os.scandir, the type of the entries comes
+            from the directory listing when the filesystem provides it.
+            The ignored entries are left out, so the ignored folders are
+            never scanned.
+
+            :param dir_path: The absolute path of the folder
+            :param ignored: Tells the ignored files and folders
+            :param snapshot: The listings of the last build
+            :param context: The ignore rules of the parent folder, None
+                            for the root folder
+
+            :type dir_path: string
+            :type ignored: PygnataIgnore
+            :type snapshot: PygnataSnapshot
+            :type context: tuple
+
+            :return: The sorted (name, is_dir, path) of the entries and
+                     the ignore rules of the sub folders
+            :rtype: tuple
+        """
+        #The snapshot keeps the whole listing, the rules may change
+        listing = None
+        stat = None
+        if snapshot is not None:
+            stat = os.stat(dir_path)
+            listing = snapshot.get(dir_path, stat)
+
+        if listing is None:
+            listing = []
+            has_link = False
+            with os.scandir(dir_path) as iterator:
+                for entry in iterator:
+                    #A link may change without its folder, even a broken one
+                    has_link = has_link or entry.is_symlink()
+                    if entry.is_file():
+                        listing.append((entry.name, False))
+                    elif entry.is_dir():
+                        listing.append((entry.name, True))
+            listing.sort()
+
+            if stat is not None and not has_link:
+                snapshot.put(dir_path, stat, listing)
+            profiler.count('fs.scandir')
+
+        if ignored is not None:
+            context = ignored.enter(context, dir_path,
+                                    [name for name, _ in listing])
+            #If the object name is in the exclusion list
+            listing = [(name, is_dir) for name, is_dir in listing
+                       if not ignored.is_ignored(context, dir_path, name,
+                                                 is_dir)]
+
+        entries = [(name, is_dir, os.path.join(dir_path, name))
+                   for name, is_dir in listing]
+        profiler.count('builder.entries', len(entries))
+        return entries, context
+
+
+class PygnataScanner(object):
+    """
+        Class used to list folders ahead of a walk with a pool of threads.
+        When a folder is scanned, its sub folders are handed to the pool,
+        so the scan goes deeper where the tree is big. The number of
+        listings waiting for the walk is limited to keep the memory low.
+    """
+    def __init__(self, list_dir, jobs=1, ahead=0):
+        #Function returning the sorted (name, is_dir, path) of a folder
+        #and the ignore rules of its sub folders
+        self.list_dir = list_dir
+
+        #No pool if there is only one job, the walk scans the folders
+        self.pool = None
+        if jobs > 1:
+            self.pool = ThreadPoolExecutor(max_workers=jobs)
+
+        #Count of the listings not yet used by the walk
+        self.ahead = ahead
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def scan(self, dir_path, context=None):
+        """
+            List a folder and hand its sub folders to the pool
+
+            :param dir_path: The absolute path of the folder
+            :param context: The ignore rules of the parent folder, None
+                            for the root folder
+
+            :type dir_path: string
+            :type context: tuple
+
+            :return: The sorted (name, is_dir, path, future, context) of
+                     the entries, with the ignore rules of the sub folders
+            :rtype: list
+        """
+        entries = []
+        listing, context = self.list_dir(dir_path, context=context)
+        for name, is_dir, entry_path in listing:
+            ahead = self.submit(entry_path, context) if is_dir else None
+            entries.append((name, is_dir, entry_path, ahead, context))
+        return entries
+
+    def submit(self, dir_path, context=None):
+        """
+            Scan a folder in the pool if the limit is not reached
+
+            :param dir_path: The absolute path of the folder
+            :param context: The ignore rules of the parent folder
+
+            :type dir_path: string
+            :type context: tuple
+
+            :return: The future of the scan or None
+            :rtype: Future
+        """
+        if self.pool is None:
+            return None
+
+        with self.lock:
+            if self.pending >= self.ahead:
+                return None
+            self.pending += 1
+
+        return self.pool.submit(self.scan, dir_path, context)
+
+    def result(self, dir_path, ahead, context=None):
+        """
+            Get the listing of a folder, scanned ahead or not
+
+            :param dir_path: The absolute path of the folder
+            :param ahead: The future of the scan or None
+            :param context: The ignore rules of the parent folder
+
+            :type dir_path: string
+            :type ahead: Future
+            :type context: tuple
+
+            :return: The sorted (name, is_dir, path, future, context) of
+                     the entries
+            :rtype: list
+        """
+        if ahead is None:
+            return self.scan(dir_path, context)
+
+        try:
+            return ahead.result()
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def close(self):
+        """
+            Stop the pool of threads
         """
-        if ignored_lst:
-            for regex in ignored_lst:
-                #If only one match it's done
-                if regex.match(value):
-                    return True
-        return False
+        if self.pool is not None:
+            self.pool.shutdown()
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+import threading
+
+from collections import OrderedDict
+
+from path import path
+from .config.config import pygconfig
+from .logger import logger
+
+
+class PygnataCache(object):
+    """
+        Class used to keep the parsed .pyg files between two runs.
+        Each entry is a file named by a hash in a tier folder, the
+        least recently used entries are removed when the cache is full.
+    """
+    #Tier of the split and decoded parts, keyed by the file hash
+    PARTS = 'parts'
+    #Tier of the rendered trees, keyed by the file hash and the values
+    TREES = 'trees'
+
+    #Extension of the cache entries
+    extension = '.pickle'
+
+    def __init__(self, cache_dir=None, max_size=None, enabled=None):
+        #Get the folder of the cache
+        if cache_dir is None:
+            cache_dir = pygconfig.get('CACHE', 'Dir')
+        self.cache_dir = path(cache_dir).expand()
+
+        #Get the maximum size of the cache in bytes
+        if max_size is None:
+            max_size = pygconfig.getint('CACHE', 'MaxSize')
+        self.max_size = max_size
+
+        #Check if the cache is used
+        if enabled is None:
+            enabled = pygconfig.getboolean('CACHE', 'Enabled')
+        self.enabled = enabled
+
+        #The entries used by the process, pickled so each get is a copy
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.lock = threading.Lock()
+
+        #Size of the entry files, listed on the first write only
+        self.disk_size = None
+
+    @staticmethod
+    def digest(content):
+        """
+            Compute the hash of a content
+
+            :param content: The content to hash
+
+            :type content: string
+
+            :return: The hexadecimal hash
+            :rtype: string
+        """
+        if not isinstance(content, bytes):
+            content = content.encode('utf-8')
+        return hashlib.sha256(content).hexdigest()
+
+    def tree_key(self, file_hash, values):
+        """
+            Compute the key of a rendered tree
+
+            :param file_hash: The hash of the .pyg file
+            :param values: The values of the Jinja variables
+
+            :type file_hash: string
+            :type values: dict
+
+            :return: The key of the tree
+            :rtype: string
+        """
+        dump = json.dumps([file_hash, values], sort_keys=True, default=repr)
+        return self.digest(dump)
+
+    def entry_path(self, tier, key):
+        """
+            Get the path of an entry
+
+            :param tier: The tier of the entry
+            :param key: The key of the entry
+
+            :type tier: string
+            :type key: string
+
+            :return: The path of the entry
+            :rtype: Path
+        """
+        return self.cache_dir / tier / (key + PygnataCache.extension)
+
+    def get(self, tier, key):
+        """
+            Get an entry of the cache
+
+            :param tier: The tier of the entry
+            :param key: The key of the entry
+
+            :type tier: string
+            :type key: string
+
+            :return: The cached value or None
+            :rtype: object
+        """
+        if not self.enabled:
+            return None
+
+        #Look in the memory first
+        with self.lock:
+            data = self.memory.get((tier, key))
+            if data is not None:
+                self.memory.move_to_end((tier, key))
+        if data is not None:
+            return pickle.loads(data)
+
+        entry = self.entry_path(tier, key)
+        try:
+            with open(entry, 'rb') as fd:
+                data = fd.read()
+            value = pickle.loads(data)
+        except (OSError, IOError):
+            return None
+        except Exception as e:
+            #A broken entry is removed
+            logger.debug("Invalid cache entry {} ({})".format(entry, e))
+            self.remove(entry)
+            return None
+
+        #Mark the entry as recently used
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+
+        self.keep(tier, key, data)
+        return value
+
+    def put(self, tier, key, value):
+        """
+            Add an entry in the cache
+
+            :param tier: The tier of the entry
+            :param key: The key of the entry
+            :param value: The value to cache
+
+            :type tier: string
+            :type key: string
+            :type value: object
+        """
+        if not self.enabled:
+            return
+
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self.keep(tier, key, data)
+
+        entry = self.entry_path(tier, key)
+        try:
+            if not entry.parent.isdir():
+                os.makedirs(entry.parent)
+            try:
+                old_size = os.stat(entry).st_size
+            except OSError:
+                old_size = 0
+
+            #Write a temporary file and rename it for the other processes
+            fd, tmp_path = tempfile.mkstemp(dir=entry.parent)
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, entry)
+        except (OSError, IOError) as e:
+            logger.debug("Cannot write cache entry {} ({})".format(entry, e))
+            return
+
+        with self.lock:
+            if self.disk_size is None:
+                disk_size = None
+            else:
+                self.disk_size += len(data) - old_size
+                disk_size = self.disk_size
+        if disk_size is None:
+            disk_size = sum(size for _, size, _ in self.entries())
+            with self.lock:
+                self.disk_size = disk_size
+        #The folder is listed again only when the cache is full
+        if disk_size > self.max_size:
+            self.evict()
+
+    def keep(self, tier, key, data):
+        """
+            Keep a pickled entry in memory, the least recently used
+            entries are forgotten when the memory is full
+
+            :param tier: The tier of the entry
+            :param key: The key of the entry
+            :param data: The pickled value
+
+            :type tier: string
+            :type key: string
+            :type data: bytes
+        """
+        with self.lock:
+            old = self.memory.pop((tier, key), None)
+            if old is not None:
+                self.memory_size -= len(old)
+            self.memory[(tier, key)] = data
+            self.memory_size += len(data)
+
+            while self.memory_size > self.max_size and self.memory:
+                _, old = self.memory.popitem(last=False)
+                self.memory_size -= len(old)
+
+    def entries(self):
+        """
+            List the entries of the cache
+
+            :return: The (mtime, size, path) of the entries
+            :rtype: list
+        """
+        entries = []
+        for tier in (PygnataCache.PARTS, PygnataCache.TREES):
+            try:
+                iterator = os.scandir(self.cache_dir / tier)
+            except OSError:
+                continue
+            with iterator:
+                for entry in iterator:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """
+            Remove the least recently used entries until the cache
+            size is under the maximum size
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        #The oldest entries first
+        if total > self.max_size:
+            for _, size, entry in sorted(entries):
+                self.remove(entry)
+                total -= size
+                if total <= self.max_size:
+                    break
+
+        with self.lock:
+            self.disk_size = total
+
+    def clear(self):
+        """
+            Remove all the entries of the cache
+
+            :return: The number of removed entries
+            :rtype: int
+        """
+        with self.lock:
+            self.memory.clear()
+            self.memory_size = 0
+
+        entries = self.entries()
+        for _, _, entry in entries:
+            self.remove(entry)
+        with self.lock:
+            self.disk_size = 0
+        return len(entries)
+
+    @staticmethod
+    def remove(entry):
+        """
+            Remove an entry file
+
+            :param entry: The path of the entry
+
+            :type entry: string
+        """
+        try:
+            os.remove(entry)
+        except OSError:
+            pass
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from path import path
+import os.path
 
 try:
     import configparser
@@ -7,7 +7,7 @@ except ImportError:
     import ConfigParser as configparser
 
 #Set the path of the current file
-current = path(__file__)
+current = os.path.dirname(os.path.abspath(__file__))
 pygconfig = configparser.SafeConfigParser()
 #Load the config file
-pygconfig.read(current.parent / 'pygnata.conf')
+pygconfig.read(os.path.join(current, 'pygnata.conf'))
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import errno
+
+from .exception import ProcessorError
+from .profiler import profiler
+
+#Inline text of a file, rendered with the TREE part
+CONTENT = 'content'
+#Static file copied as is, relative to the .pyg file
+SOURCE = 'source'
+#Jinja file rendered with the VAR and STATIC values, relative to the .pyg file
+TEMPLATE = 'template'
+
+#Flags used to write the content of a file
+WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+
+#Errors meaning that a copy method is not supported for these files
+UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+               getattr(errno, 'EOPNOTSUPP', errno.EINVAL))
+
+#Size of the buffer when the kernel cannot copy the file
+COPY_BUFFER = 1024 * 1024
+
+
+class PygnataContents(object):
+    """
+        Class used to write the content of the files of a tree. A file
+        of the TREE part has a content when it is written as a mapping:
+
+            - main.py: {content: "print('{{name}}')"}
+            - logo.png: {source: files/logo.png}
+            - setup.py: {template: files/setup.py.j2}
+
+        The static files are copied by the kernel without being read in
+        Python, only the template files are rendered, chunk by chunk.
+    """
+    def __init__(self, source_dir=None, values=None):
+        #Folder of the .pyg file, the source and template paths start there
+        self.source_dir = os.path.abspath(source_dir or os.getcwd())
+
+        #Values of the Jinja variables of the template files
+        self.values = values or {}
+
+    def write(self, file_fd, name, spec):
+        """
+            Write the content of a file
+
+            :param file_fd: The open file descriptor of the file
+            :param name: The name of the file
+            :param spec: The mapping describing the content
+
+            :type file_fd: int
+            :type name: string
+            :type spec: dict
+        """
+        if len(spec) != 1:
+            raise ProcessorError("{}- One of {}, {} or {} expected".format(
+                name, CONTENT, SOURCE, TEMPLATE))
+
+        kind, value = list(spec.items())[0]
+        if kind == CONTENT:
+            data = ('' if value is None else str(value)).encode('utf-8')
+            self.write_all(file_fd, data)
+            profiler.count('contents.bytes', len(data))
+        elif kind == SOURCE:
+            self.copy(self.resolve(name, value), file_fd)
+        elif kind == TEMPLATE:
+            self.render(self.resolve(name, value), file_fd)
+        else:
+            raise ProcessorError("{}- Unknown content {}".format(name, kind))
+
+    def resolve(self, name, value):
+        """
+            Get the path of a source or template file, it must be in the
+            folder of the .pyg file once the links are resolved
+
+            :param name: The name of the created file
+            :param value: The path relative to the .pyg file
+
+            :type name: string
+            :type value: string
+
+            :return: The absolute path
+            :rtype: string
+        """
+        source_dir = os.path.realpath(self.source_dir)
+        file_path = os.path.realpath(os.path.join(source_dir, str(value)))
+        if os.path.commonpath([source_dir, file_path]) != source_dir:
+            raise ProcessorError("{}- {} is outside of {}".format(
+                name, value, self.source_dir))
+        if not os.path.isfile(file_path):
+            raise ProcessorError("{}- {} does not exist".format(name, value))
+        return file_path
+
+    def render(self, template_path, file_fd):
+        """
+            Render a template file, the chunks of the template are written
+            as they are generated
+
+            :param template_path: The path of the template file
+            :param file_fd: The open file descriptor of the file
+
+            :type template_path: string
+            :type file_fd: int
+        """
+        #Jinja is imported only when a template file is used
+        from .environment import get_template
+
+        with open(template_path, 'r') as fd:
+            template = get_template(fd.read())
+
+        with open(file_fd, 'w', encoding='utf-8', closefd=False) as fd:
+            for chunk in template.generate(self.values):
+                fd.write(chunk)
+        profiler.count('contents.rendered')
+
+    @staticmethod
+    def copy(src_path, file_fd):
+        """
+            Copy a file in the kernel with copy_file_range, or sendfile,
+            the data is read in Python only when both are unsupported.
+            The permissions of the source are kept.
+
+            :param src_path: The path of the source file
+            :param file_fd: The open file descriptor of the destination
+
+            :type src_path: string
+            :type file_fd: int
+        """
+        src_fd = os.open(src_path, os.O_RDONLY)
+        try:
+            stat = os.fstat(src_fd)
+            copied = PygnataContents.kernel_copy(src_fd, file_fd, stat.st_size)
+            if copied < stat.st_size:
+                #Copy the rest from where the kernel stopped
+                os.lseek(src_fd, copied, os.SEEK_SET)
+                os.lseek(file_fd, copied, os.SEEK_SET)
+                while True:
+                    data = os.read(src_fd, COPY_BUFFER)
+                    if not data:
+                        break
+                    PygnataContents.write_all(file_fd, data)
+                profiler.count('contents.read_copy')
+            os.fchmod(file_fd, stat.st_mode & 0o777)
+        finally:
+            os.close(src_fd)
+        profiler.count('contents.bytes', stat.st_size)
+
+    @staticmethod
+    def kernel_copy(src_fd, file_fd, size):
+        """
+            Copy a file without reading it in Python
+
+            :param src_fd: The open file descriptor of the source
+            :param file_fd: The open file descriptor of the destination
+            :param size: The size of the source
+
+            :type src_fd: int
+            :type file_fd: int
+            :type size: int
+
+            :return: The number of copied bytes
+            :rtype: int
+        """
+        copied = 0
+        for name in ('copy_file_range', 'sendfile'):
+            method = getattr(os, name, None)
+            if method is None:
+                continue
+            try:
+                while copied < size:
+                    if name == 'copy_file_range':
+                        sent = method(src_fd, file_fd, size - copied,
+                                      copied, copied)
+                    else:
+                        #sendfile writes at the current offset
+                        os.lseek(file_fd, copied, os.SEEK_SET)
+                        sent = method(file_fd, src_fd, copied, size - copied)
+                    if not sent:
+                        break
+                    copied += sent
+                profiler.count('contents.' + name)
+                return copied
+            except OSError as e:
+                if e.errno not in UNSUPPORTED:
+                    raise
+        return copied
+
+    @staticmethod
+    def write_all(file_fd, data):
+        """
+            Write all the data in a file descriptor
+
+            :param file_fd: The open file descriptor
+            :param data: The data to write
+
+            :type file_fd: int
+            :type data: bytes
+        """
+        view = memoryview(data)
+        while view:
+            written = os.write(file_fd, view)
+            view = view[written:]
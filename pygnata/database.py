@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+
+from path import path
+from .cache import PygnataCache
+from .config.config import pygconfig
+from .exception import ParserError, ProviderError
+from .index import PygnataIndex
+from .logger import logger
+from .profiler import profiler
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    hash TEXT NOT NULL,
+    body TEXT NOT NULL,
+    author TEXT,
+    title TEXT,
+    version TEXT,
+    date TEXT,
+    description TEXT
+);
+"""
+
+#Full text index over the searchable fields, if SQLite has FTS5
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS templates_fts USING fts5(
+    name, title, description, author,
+    content='templates', content_rowid='id'
+);
+"""
+
+#The fields of the full text index
+FTS_FIELDS = ('name', 'title', 'description', 'author')
+
+#The INFO fields kept in the database
+FIELDS = ('author', 'title', 'version', 'date', 'description')
+
+
+class PygnataDatabase(object):
+    """
+        Class used to store .pyg files in a SQLite database. The
+        templates are found by name or by keywords of their name,
+        title, description and author, with the FTS5 full text index
+        when SQLite provides it and with LIKE otherwise.
+    """
+    def __init__(self, db_path=None, parser=None):
+        #Get the path of the database
+        if db_path is None:
+            db_path = pygconfig.get('DATABASE', 'Path')
+        self.db_path = path(db_path).expand()
+
+        #Parser used to read the INFO part, created on the first need
+        self.parser = parser
+
+        self.extension = pygconfig.get('PROVIDER', 'Extension')
+        self.pack_extension = pygconfig.get('PACK', 'Extension')
+        self.lock = threading.Lock()
+        self.connection = None
+        #Check if the full text index is available
+        self.fts = False
+
+    def connect(self):
+        """
+            Open the database, the tables are created if needed
+
+            :return: The connection
+            :rtype: Connection
+        """
+        if self.connection is None:
+            if not self.db_path.parent.isdir():
+                os.makedirs(self.db_path.parent)
+            connection = sqlite3.connect(self.db_path,
+                                         check_same_thread=False)
+            connection.executescript(SCHEMA)
+            try:
+                connection.executescript(FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                logger.debug("No full text search ({}), LIKE used".format(e))
+                self.fts = False
+            self.connection = connection
+        return self.connection
+
+    def close(self):
+        """
+            Close the database
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def import_folder(self, folder):
+        """
+            Add the .pyg files of a folder and its sub folders. A file
+            already stored with the same content is skipped, all the
+            files are written in a single transaction.
+
+            :param folder: The folder of the .pyg files
+
+            :type folder: string
+
+            :return: The number of imported, unchanged and invalid files
+            :rtype: tuple
+        """
+        if self.parser is None:
+            from .parser import PygnataParser
+            self.parser = PygnataParser()
+
+        folder = path(folder).expand()
+        if not folder.isdir():
+            raise ProviderError("The folder {} does not exist".format(folder))
+
+        with self.lock:
+            known = dict(self.connect().execute(
+                "SELECT name, hash FROM templates"))
+
+        rows = []
+        nb_unchanged = 0
+        nb_invalid = 0
+        with profiler.phase('database.read'):
+            for root, dirs, files in os.walk(folder):
+                dirs.sort()
+                for file_name in sorted(files):
+                    if file_name.endswith(self.extension):
+                        name = file_name[:-len(self.extension)]
+                    elif file_name.endswith(self.pack_extension):
+                        name = file_name[:-len(self.pack_extension)]
+                    else:
+                        continue
+                    file_path = os.path.join(root, file_name)
+                    try:
+                        body = self.read_body(file_path)
+                    except (OSError, IOError, UnicodeDecodeError,
+                            ProviderError) as e:
+                        logger.warning("Cannot read {} ({})".format(file_path,
+                                                                     e))
+                        nb_invalid += 1
+                        continue
+
+                    file_hash = PygnataCache.digest(body)
+                    if known.get(name) == file_hash:
+                        nb_unchanged += 1
+                        continue
+
+                    info, error = PygnataIndex.parse_info(self.parser, body)
+                    if error:
+                        logger.warning("Invalid file {} ({})".format(file_path,
+                                                                     error))
+                        nb_invalid += 1
+                        continue
+
+                    row = [name, file_hash, body]
+                    row.extend(None if info.get(field) is None
+                               else str(info[field]) for field in FIELDS)
+                    rows.append(row)
+                    #The last file of a name wins
+                    known[name] = file_hash
+
+        with profiler.phase('database.write'):
+            with self.lock:
+                connection = self.connect()
+                with connection:
+                    for row in rows:
+                        self.store(connection, row)
+        profiler.count('database.imported', len(rows))
+
+        return len(rows), nb_unchanged, nb_invalid
+
+    def read_body(self, file_path):
+        """
+            Read the source of a .pyg file or of a packed one
+
+            :param file_path: The path of the file
+
+            :type file_path: string
+
+            :return: The source
+            :rtype: string
+        """
+        if not file_path.endswith(self.pack_extension):
+            with open(file_path, 'r') as fd:
+                return fd.read()
+
+        from .pack import PygnataPack
+
+        try:
+            with PygnataPack(file_path) as pack:
+                return pack.source()
+        except ParserError as e:
+            raise ProviderError(e.value)
+
+    def store(self, connection, row):
+        """
+            Insert or replace a template and its full text entry
+
+            :param connection: The open connection
+            :param row: The name, hash, body and INFO fields
+
+            :type connection: Connection
+            :type row: list
+        """
+        columns = ('name', 'hash', 'body') + FIELDS
+        if self.fts:
+            old = connection.execute(
+                "SELECT id, {} FROM templates WHERE name = ?".format(
+                    ", ".join(FTS_FIELDS)), (row[0],)).fetchone()
+            if old is not None:
+                #An external content index is updated with a delete command
+                connection.execute(
+                    "INSERT INTO templates_fts (templates_fts, rowid, {}) "
+                    "VALUES ('delete', ?, ?, ?, ?, ?)".format(
+                        ", ".join(FTS_FIELDS)), old)
+
+        connection.execute(
+            "INSERT INTO templates ({}) VALUES ({}) ON CONFLICT (name) DO "
+            "UPDATE SET {}".format(
+                ", ".join(columns), ", ".join("?" * len(columns)),
+                ", ".join("{0} = excluded.{0}".format(column)
+                          for column in columns[1:])), row)
+
+        if self.fts:
+            connection.execute(
+                "INSERT INTO templates_fts (rowid, {0}) SELECT id, {0} "
+                "FROM templates WHERE name = ?".format(", ".join(FTS_FIELDS)),
+                (row[0],))
+
+    def find(self, query):
+        """
+            Find the template matching a query: the template with this
+            name, else the best match of the keywords
+
+            :param query: A name or keywords
+
+            :type query: string
+
+            :return: The name, hash and body of the template or None
+            :rtype: tuple
+        """
+        words = re.findall(r"\w+", query, re.UNICODE)
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute(
+                "SELECT name, hash, body FROM templates WHERE name = ?",
+                (query,)).fetchone()
+            if row is not None or not words:
+                return row
+
+            if self.fts:
+                #Each word is a prefix, all the words must match
+                match = " ".join('"{}"*'.format(word) for word in words)
+                return connection.execute(
+                    "SELECT t.name, t.hash, t.body FROM templates_fts "
+                    "JOIN templates AS t ON t.id = templates_fts.rowid "
+                    "WHERE templates_fts MATCH ? "
+                    "ORDER BY templates_fts.rank, t.name LIMIT 1",
+                    (match,)).fetchone()
+
+            searched = " || ' ' || ".join("coalesce({}, '')".format(field)
+                                          for field in FTS_FIELDS)
+            clauses = " AND ".join("({}) LIKE ?".format(searched)
+                                   for _ in words)
+            return connection.execute(
+                "SELECT name, hash, body FROM templates WHERE {} "
+                "ORDER BY length(name), name LIMIT 1".format(clauses),
+                ['%{}%'.format(word) for word in words]).fetchone()
+
+    def materialize(self, query, folder):
+        """
+            Write the template matching a query in a folder. The file
+            is named by the content hash, so it is written only once.
+
+            :param query: A name or keywords
+            :param folder: The folder of the written files
+
+            :type query: string
+            :type folder: string
+
+            :return: The path of the .pyg file or None
+            :rtype: string
+        """
+        with profiler.phase('database.find'):
+            row = self.find(query)
+        if row is None:
+            return None
+
+        name, file_hash, body = row
+        file_path = os.path.join(folder, "{}-{}{}".format(
+            name, file_hash[:12], self.extension))
+        if not os.path.isfile(file_path):
+            #Write a temporary file and rename it for the other processes
+            fd, tmp_path = tempfile.mkstemp(dir=folder)
+            with os.fdopen(fd, 'w') as tmp_file:
+                tmp_file.write(body)
+            os.replace(tmp_path, file_path)
+        return file_path
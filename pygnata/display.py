@@ -3,127 +3,358 @@
 #The MIT License (MIT)
 #Copyright (c) 2015 Alexandre LM, Dimitri S
 
+import sys
+import json
+
 from .config.config import pygconfig
-from path import path
+from .profiler import profiler
+from .tree import PygnataTree
+
+#Events of the tree walk
+FILE = 0
+OPEN = 1
+CLOSE = 2
+#A folder whose entries are under the depth limit
+MORE = 3
+
+#Modes of the show command
+TEXT = 'text'
+SUMMARY = 'summary'
+JSON = 'json'
+
+#Connectors of the tree
+BRANCH = "├── "
+LAST = "└── "
+PIPE = "│   "
+SPACE = "    "
+
+
+class PygnataWriter(object):
+    """
+        Class used to write many small strings in a stream with few
+        calls, the strings are joined and written by blocks
+    """
+    def __init__(self, stream=None, size=None):
+        self.stream = stream if stream is not None else sys.stdout
+
+        #Number of characters kept before writing them
+        if size is None:
+            size = pygconfig.getint('DISPLAY', 'BufferSize')
+        self.size = size
+
+        self.chunks = []
+        self.length = 0
+
+    def write(self, text):
+        """
+            Add a string to the buffer
+
+            :param text: The string
+
+            :type text: string
+        """
+        self.chunks.append(text)
+        self.length += len(text)
+        if self.length >= self.size:
+            self.flush()
+
+    def flush(self):
+        """
+            Write the buffer in the stream
+        """
+        if self.chunks:
+            self.stream.write("".join(self.chunks))
+            self.chunks = []
+            self.length = 0
+        self.stream.flush()
 
 
 class PygnataDisplay(object):
     """
-        Class used to display various informations about a .pyg file
+        Class used to display various informations about a .pyg file.
+        The tree is walked iteratively, so its depth is not limited by
+        the recursion limit, and only the open folders are kept.
     """
 
     def __init__(self):
         #Associate the print function to each part
+        self.tree_part = pygconfig.get('GENERAL', 'TreePart')
         self.parts_fcn = {pygconfig.get('GENERAL', 'InfoPart'): self.print_part,
-                      pygconfig.get('GENERAL', 'VarPart'): self.print_part,
-                      pygconfig.get('GENERAL', 'StaticPart'): self.print_part,
-                      pygconfig.get('GENERAL', 'TreePart'): self.print_tree}
+                          pygconfig.get('GENERAL', 'VarPart'): self.print_part,
+                          pygconfig.get('GENERAL', 'StaticPart'): self.print_part,
+                          self.tree_part: self.print_tree}
 
         #Get the parts to display
         self.to_print = pygconfig.get('DISPLAY', 'ToPrint').split(',')
 
-    def show(self, part_dic):
+    def show(self, part_dic, depth=None, max_entries=None, mode=TEXT,
+             stream=None):
         """
             Function that show all the parts
 
             :param part_dic: The dict containing informations about the parts
+            :param depth: The number of tree levels shown, None for all
+            :param max_entries: The number of tree entries shown, None
+                                for all
+            :param mode: Show the parts as text, as JSON, or only the
+                         counts of the tree
+            :param stream: The output, the standard output by default
 
             :type part_dic: dict
+            :type depth: int
+            :type max_entries: int
+            :type mode: string
+            :type stream: file
         """
-        #Browse the parts
-        for part in sorted(part_dic):
-            #if the part is in parts dict and is in the to_print dict
-            if part in self.parts_fcn and part in self.to_print:
-                #Call the function associated to the part
-                self.parts_fcn[part](part, part_dic[part])
-        print()
+        out = PygnataWriter(stream)
+        with profiler.phase('display.show'):
+            if mode == SUMMARY:
+                self.print_summary(part_dic.get(self.tree_part), out)
+            elif mode == JSON:
+                self.print_json(part_dic, out, depth, max_entries)
+            else:
+                #Browse the parts
+                for part in sorted(part_dic):
+                    #if the part is in parts dict and is in the to_print dict
+                    if part in self.parts_fcn and part in self.to_print:
+                        #Call the function associated to the part
+                        self.parts_fcn[part](part, part_dic[part], out,
+                                             depth, max_entries)
+                out.write("\n")
+            out.flush()
 
-    def print_part(self, part, info_dic):
+    def print_part(self, part, info_dic, out, *limits):
         """
             Print a regular part
 
             :param part: The part name
             :param info_dic: The part content
+            :param out: The output
+            :param limits: The unused limits of the tree
 
             :type part: string
             :type info_dic: dict
+            :type out: PygnataWriter
+            :type limits: list
         """
         #if part isn't empty
         if info_dic:
-            print(("\n────────────[{} PART]────────────\n".format(part)))
+            out.write("\n────────────[{} PART]────────────\n\n".format(part))
             #Browse the part content
             for key, value in sorted(list(info_dic.items())):
-                print(("<{}> ─ {}".format(key, value)))
+                out.write("<{}> ─ {}\n".format(key, value))
 
-    def print_tree(self, part, tree_dic):
+    def print_tree(self, part, tree, out, depth=None, max_entries=None):
         """
-            Print the content of the tree part
+            Print the content of the tree part. The entries of the top
+            level are printed without connector.
 
             :param part: The part name
-            :param tree_dic: The dict containing the (sub)folders of the tree
+            :param tree: The TREE part, or its YAML list
+            :param out: The output
+            :param depth: The number of levels shown, None for all
+            :param max_entries: The number of entries shown, None for all
 
             :type part: string
-            :type tree_dic: dict
+            :type tree: PygnataTree
+            :type out: PygnataWriter
+            :type depth: int
+            :type max_entries: int
         """
-        #If the tree isn't empty
-        if tree_dic:
-            print()
-            print(("────────────[{} PART]────────────\n".format(part)))
-            self.print_recursive_tree("", tree_dic)
+        #If the tree is empty
+        if not tree:
+            return
+
+        out.write("\n────────────[{} PART]────────────\n\n".format(part))
+
+        #The prefix of the children of each open folder
+        prefixes = []
+        nb_entries = 0
+        for event, level, name, value, is_last in self.walk(tree, depth):
+            if event == CLOSE:
+                prefixes.pop()
+                continue
+            if event == MORE:
+                #The entries under the depth limit are not shown
+                out.write(prefixes[-1] + LAST + "…\n")
+                continue
+
+            if max_entries is not None and nb_entries >= max_entries:
+                out.write("… limited to {} entries\n".format(max_entries))
+                break
+            nb_entries += 1
+
+            if level == 0:
+                out.write(name + "\n")
+            else:
+                out.write(prefixes[-1] + (LAST if is_last else BRANCH) +
+                          name + "\n")
+
+            if event == OPEN:
+                if level == 0:
+                    prefixes.append("")
+                else:
+                    prefixes.append(prefixes[-1] +
+                                    (SPACE if is_last else PIPE))
 
-    def print_recursive_tree(self, root_path, tree_dic):
+    def print_summary(self, tree, out):
         """
-            Print a folder tree recurcively
+            Print the number of folders and files of the tree and its depth
 
-            :param root_path: The root path of the tree
-            :param tree_dic: The dict containing the (sub)folders of the tree
+            :param tree: The TREE part, or its YAML list
+            :param out: The output
 
-            :type root_path: string
-            :type tree_dic: dict
+            :type tree: PygnataTree
+            :type out: PygnataWriter
         """
-        root = path(root_path)
+        nb_dirs, nb_files, max_depth = PygnataTree.from_yaml(tree).count()
+        out.write("{} folders, {} files, depth {}\n".format(nb_dirs, nb_files,
+                                                            max_depth))
+
+    def print_json(self, part_dic, out, depth=None, max_entries=None):
+        """
+            Print the parts in JSON. The tree is a list of nodes with a
+            name, a type (folder or file), the children of the folders
+            and the content of the files having one. A folder cut by the
+            depth is "truncated", and the parts too when the number of
+            entries cuts the tree.
+
+            :param part_dic: The dict containing informations about the parts
+            :param out: The output
+            :param depth: The number of tree levels written, None for all
+            :param max_entries: The number of tree entries written, None
+                                for all
 
-        #Browse the tree array
-        for index, value in enumerate(tree_dic):
+            :type part_dic: dict
+            :type out: PygnataWriter
+            :type depth: int
+            :type max_entries: int
+        """
+        parts = [part for part in sorted(part_dic) if part in self.to_print]
+        truncated = False
+        out.write("{")
+        for index, part in enumerate(parts):
+            if index:
+                out.write(", ")
+            out.write(json.dumps(part) + ": ")
+            if part == self.tree_part:
+                truncated = self.write_json_tree(part_dic[part], out, depth,
+                                                 max_entries)
+            else:
+                out.write(json.dumps(part_dic[part], sort_keys=True,
+                                     default=str))
+        if truncated:
+            out.write(', "truncated": true')
+        out.write("}\n")
 
-            #if it is a sub folder
-            if isinstance(value, dict):
-                for key, value in list(value.items()):
+    def write_json_tree(self, tree, out, depth=None, max_entries=None):
+        """
+            Write the tree in JSON, node by node
 
-                    #Create the new root path
-                    new_path = root / key
+            :param tree: The TREE part, or its YAML list
+            :param out: The output
+            :param depth: The number of levels written, None for all
+            :param max_entries: The number of entries written, None for all
 
-                    #If it is not the first folder
-                    if new_path.parent:
-                        #If it is the last line
-                        if index == (len(tree_dic) - 1):
-                            print("│  └── {}".format(new_path.name))
-                        else:
-                            print("│  ├── {}".format(new_path.name))
+            :type tree: PygnataTree
+            :type out: PygnataWriter
+            :type depth: int
+            :type max_entries: int
 
-                    else:
-                        #redefine the root
-                        print("{}".format(new_path.name))
+            :return: If the number of entries cut the tree
+            :rtype: bool
+        """
+        #If the next node of each open list is the first one
+        first = [True]
+        #The end of each open folder
+        ends = []
+        truncated = False
+        nb_entries = 0
+        out.write("[")
+        for event, level, name, value, _ in self.walk(tree, depth):
+            if event == CLOSE:
+                first.pop()
+                out.write(ends.pop())
+                continue
+            if event == MORE:
+                #The entries under the depth limit are not written
+                out.write('], "truncated": true')
+                ends[-1] = "}"
+                continue
+            if max_entries is not None and nb_entries >= max_entries:
+                truncated = True
+                break
+            nb_entries += 1
 
-                    #call print_recursive_tree recursively
-                    self.print_recursive_tree(new_path, value)
+            if not first[-1]:
+                out.write(", ")
+            first[-1] = False
 
-            #If not a sub folder, create the file
+            if event == OPEN:
+                out.write('{{"name": {}, "type": "folder", "children": ['
+                          .format(json.dumps(name)))
+                first.append(True)
+                ends.append("]}")
+            elif value is None:
+                out.write('{{"name": {}, "type": "file"}}'.format(
+                    json.dumps(name)))
             else:
+                out.write('{{"name": {}, "type": "file", "content": {}}}'
+                          .format(json.dumps(name),
+                                  json.dumps(value, sort_keys=True,
+                                             default=str)))
 
-                #Define the new file path
-                new_file = root / value
+        #Close the folders left open by the limit
+        out.write("".join(reversed(ends)))
+        out.write("]")
+        return truncated
 
-                #If the file is the child of the main folder
-                if new_file.parent.parent:
-                    #If it is the last line
-                    if index == (len(tree_dic) - 1):
-                        print("│     └── {}".format(new_file.name))
-                    else:
-                        print("│     ├── {}".format(new_file.name))
-                else:
-                    #If it is the last line
-                    if index == (len(tree_dic) - 1):
-                        print("└── {}".format(new_file.name))
-                    else:
-                        print("├── {}".format(new_file.name))
+    def walk(self, tree, depth=None):
+        """
+            Walk a tree iteratively, in the order of the part
+
+            :param tree: The TREE part, or its YAML list
+            :param depth: The number of levels walked, None for all
+
+            :type tree: PygnataTree
+            :type depth: int
+
+            :return: A generator of (event, level, name, value, is_last),
+                     value is the content of a file
+            :rtype: generator
+        """
+        tree = PygnataTree.from_yaml(tree)
+        ends = tree.ends
+
+        #The ends of the open folders
+        stack = []
+        index = 0
+        count = len(tree)
+        while index < count:
+            while stack and index >= stack[-1]:
+                stack.pop()
+                yield CLOSE, len(stack), None, None, None
+
+            level = len(stack)
+            name = tree.name(index)
+            is_last = tree.is_last(index)
+            if not tree.is_dir(index):
+                yield FILE, level, name, tree.content(index), is_last
+                index += 1
+                continue
+
+            yield OPEN, level, name, None, is_last
+            if depth is None or level + 1 < depth:
+                stack.append(ends[index])
+                index += 1
+                continue
+
+            #Skip the levels under the limit
+            if ends[index] > index + 1:
+                yield MORE, level + 1, None, None, True
+            yield CLOSE, level, None, None, None
+            index = ends[index]
+
+        while stack:
+            stack.pop()
+            yield CLOSE, len(stack), None, None, None
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import json
+import time
+import socket
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .config.config import pygconfig
+from .logger import logger
+from .profiler import profiler
+
+#HTTP status worth a new try
+TRANSIENT_STATUS = (408, 429, 500, 502, 503, 504)
+#HTTP status of an unchanged file
+NOT_MODIFIED = 304
+
+
+class PygnataDownloader(object):
+    """
+        Class used to download files. Several files can be fetched
+        concurrently, the transient errors are retried and the progress
+        is logged at a limited rate. A downloaded file is kept with its
+        ETag and Last-Modified headers, it is used again without request
+        during the TTL, then revalidated with a conditional request.
+    """
+    #Extension of the metadata of a downloaded file
+    meta_extension = '.meta'
+
+    def __init__(self, jobs=None, retries=None, timeout=None):
+        #Number of files downloaded at the same time
+        if jobs is None:
+            jobs = pygconfig.getint('DOWNLOAD', 'Jobs')
+        self.jobs = max(1, int(jobs))
+
+        #Number of new tries after a transient error
+        if retries is None:
+            retries = pygconfig.getint('DOWNLOAD', 'Retries')
+        self.retries = retries
+
+        #Timeout of the connection and of each read, in seconds
+        if timeout is None:
+            timeout = pygconfig.getfloat('DOWNLOAD', 'Timeout')
+        self.timeout = timeout
+
+        #Delay before the first new try, doubled for the next ones
+        self.backoff = pygconfig.getfloat('DOWNLOAD', 'Backoff')
+
+        #Size of the read buffer, it grows while the reads fill it
+        self.min_buffer = pygconfig.getint('DOWNLOAD', 'MinBuffer')
+        self.max_buffer = pygconfig.getint('DOWNLOAD', 'MaxBuffer')
+
+        #Maximum number of progress updates per second
+        self.progress_rate = pygconfig.getfloat('DOWNLOAD', 'ProgressRate')
+
+        #Seconds during which a downloaded file is used without request
+        self.ttl = pygconfig.getfloat('DOWNLOAD', 'CacheTTL')
+
+        #Maximum size in bytes of the downloaded files
+        self.max_size = pygconfig.getint('DOWNLOAD', 'CacheMaxSize')
+
+    def fetch_many(self, downloads):
+        """
+            Download several files concurrently
+
+            :param downloads: The (url, destination path) of the files
+
+            :type downloads: list
+
+            :return: The destination path or the error of each file
+            :rtype: list
+        """
+        def fetch_one(download):
+            try:
+                return self.fetch(*download)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            return list(pool.map(fetch_one, downloads))
+
+    def fetch(self, url, dest_path):
+        """
+            Get a file, from the previous download when it is still valid
+
+            :param url: The URL of the file
+            :param dest_path: The destination path of the file
+
+            :type url: string
+            :type dest_path: string
+
+            :return: The destination path
+            :rtype: string
+        """
+        meta = self.read_meta(dest_path) if os.path.isfile(dest_path) else None
+        if meta is not None and meta.get('url') != url:
+            meta = None
+
+        headers = {}
+        if meta is not None:
+            #The file is recent enough, no request
+            if time.time() - meta.get('checked', 0) < self.ttl:
+                profiler.count('download.fresh')
+                self.touch(dest_path)
+                return dest_path
+
+            #Ask for the file only if it changed
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        import urllib.error
+
+        try:
+            response_headers = self.retrieve(url, dest_path, headers)
+        except urllib.error.HTTPError as e:
+            if meta is None or e.code != NOT_MODIFIED:
+                raise
+            #The file did not change, keep the new validators if any
+            logger.info("Not modified: {}".format(url))
+            profiler.count('download.not_modified')
+            response_headers = {
+                'ETag': e.headers.get('ETag') or meta.get('etag'),
+                'Last-Modified': (e.headers.get('Last-Modified') or
+                                  meta.get('last_modified'))}
+        except Exception as e:
+            if meta is None or not self.is_transient(e):
+                raise
+            #Keep working offline with the previous download
+            logger.warning("Cannot revalidate {} ({}), previous download used"
+                           .format(url, e))
+            self.touch(dest_path)
+            return dest_path
+        else:
+            profiler.count('download.miss')
+
+        self.write_meta(dest_path, {
+            'url': url,
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+            'checked': time.time()})
+        self.touch(dest_path)
+        return dest_path
+
+    def retrieve(self, url, dest_path, headers=None):
+        """
+            Download a file, with new tries on the transient errors.
+            The data is written in a .part file renamed at the end.
+
+            :param url: The URL of the file
+            :param dest_path: The destination path of the file
+            :param headers: The additional request headers
+
+            :type url: string
+            :type dest_path: string
+            :type headers: dict
+
+            :return: The response headers
+            :rtype: HTTPMessage
+        """
+        attempt = 0
+        while True:
+            try:
+                with profiler.phase('downloader.fetch'):
+                    return self.download(url, dest_path, headers)
+            except Exception as e:
+                if attempt >= self.retries or not self.is_transient(e):
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                attempt += 1
+                logger.warning("Download of {} failed ({}), try {} in {}s"
+                               .format(url, e, attempt + 1, delay))
+                time.sleep(delay)
+
+    def open(self, url, headers=None):
+        """
+            Send the request of a file
+
+            :param url: The URL of the file
+            :param headers: The additional request headers
+
+            :type url: string
+            :type headers: dict
+
+            :return: The response
+            :rtype: HTTPResponse
+        """
+        #Imported only when needed, it is slow to import
+        import urllib.request
+
+        request = urllib.request.Request(url, headers=headers or {})
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def download(self, url, dest_path, headers=None):
+        """
+            Download a file once
+
+            :param url: The URL of the file
+            :param dest_path: The destination path of the file
+            :param headers: The additional request headers
+
+            :type url: string
+            :type dest_path: string
+            :type headers: dict
+
+            :return: The response headers
+            :rtype: HTTPMessage
+        """
+        import http.client
+
+        part_path = dest_path + ".part"
+        response = self.open(url, headers)
+        try:
+            #The length is unknown for a chunked response
+            file_size = response.getheader("Content-Length")
+            file_size = int(file_size) if file_size else None
+            logger.info("Downloading: {}({} b)".format(
+                dest_path, file_size if file_size is not None else "?"))
+
+            file_size_dl = 0
+            block_sz = self.min_buffer
+            last_update = time.monotonic()
+
+            with open(part_path, 'wb') as fd:
+                while True:
+                    file_buffer = response.read(block_sz)
+                    #If nothing to read
+                    if not file_buffer:
+                        break
+                    #Copy the buffer in the file
+                    fd.write(file_buffer)
+                    file_size_dl += len(file_buffer)
+
+                    #Read more at once while the buffer is filled
+                    if len(file_buffer) == block_sz:
+                        block_sz = min(block_sz * 2, self.max_buffer)
+
+                    now = time.monotonic()
+                    if now - last_update >= 1.0 / self.progress_rate:
+                        last_update = now
+                        self.progress(dest_path, file_size_dl, file_size)
+
+            if file_size is not None and file_size_dl < file_size:
+                raise http.client.IncompleteRead(b'', file_size - file_size_dl)
+
+            self.progress(dest_path, file_size_dl, file_size)
+            profiler.count('net.bytes', file_size_dl)
+            os.replace(part_path, dest_path)
+            return response.headers
+        finally:
+            response.close()
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    @staticmethod
+    def progress(dest_path, file_size_dl, file_size):
+        """
+            Log the progress of a download
+
+            :param dest_path: The destination path of the file
+            :param file_size_dl: The number of bytes downloaded
+            :param file_size: The size of the file or None
+
+            :type dest_path: string
+            :type file_size_dl: int
+            :type file_size: int
+        """
+        if file_size:
+            ddl_percent = (file_size_dl / float(file_size)) * 100
+            status = r"%10d [%3.2f%%]" % (file_size_dl, ddl_percent)
+        else:
+            status = r"%10d" % file_size_dl
+        logger.info("{} {}".format(os.path.basename(dest_path), status))
+
+    @staticmethod
+    def is_transient(error):
+        """
+            Check if an error is worth a new try
+
+            :param error: The error of a download
+
+            :type error: Exception
+
+            :return: If the download should be tried again
+            :rtype: bool
+        """
+        import http.client
+        import urllib.error
+
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code in TRANSIENT_STATUS
+        if isinstance(error, urllib.error.URLError):
+            return isinstance(error.reason, (socket.timeout, OSError))
+        return isinstance(error, (socket.timeout, ConnectionError,
+                                  http.client.IncompleteRead,
+                                  http.client.RemoteDisconnected))
+
+    def read_meta(self, dest_path):
+        """
+            Read the metadata of a downloaded file
+
+            :param dest_path: The path of the downloaded file
+
+            :type dest_path: string
+
+            :return: The metadata or None
+            :rtype: dict
+        """
+        try:
+            with open(dest_path + PygnataDownloader.meta_extension, 'r') as fd:
+                meta = json.load(fd)
+        except (OSError, IOError, ValueError):
+            return None
+        return meta if isinstance(meta, dict) else None
+
+    def write_meta(self, dest_path, meta):
+        """
+            Write the metadata of a downloaded file
+
+            :param dest_path: The path of the downloaded file
+            :param meta: The URL, validators and check time of the file
+
+            :type dest_path: string
+            :type meta: dict
+        """
+        meta_path = dest_path + PygnataDownloader.meta_extension
+        try:
+            #Write a temporary file and rename it for the other processes
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(meta_path))
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump(meta, tmp_file)
+            os.replace(tmp_path, meta_path)
+        except (OSError, IOError) as e:
+            logger.debug("Cannot write {} ({})".format(meta_path, e))
+
+    @staticmethod
+    def touch(dest_path):
+        """
+            Mark a downloaded file as recently used
+
+            :param dest_path: The path of the downloaded file
+
+            :type dest_path: string
+        """
+        try:
+            os.utime(dest_path, None)
+        except OSError:
+            pass
+
+    @staticmethod
+    def downloads(folder):
+        """
+            List the downloaded files of a folder
+
+            :param folder: The folder of the downloaded files
+
+            :type folder: string
+
+            :return: The (mtime, size, path) of the downloaded files
+            :rtype: list
+        """
+        downloads = []
+        try:
+            iterator = os.scandir(folder)
+        except OSError:
+            return downloads
+        with iterator:
+            for entry in iterator:
+                if not entry.name.endswith(PygnataDownloader.meta_extension):
+                    continue
+                dest_path = entry.path[:-len(PygnataDownloader.meta_extension)]
+                try:
+                    stat = os.stat(dest_path)
+                    size = stat.st_size + entry.stat().st_size
+                except OSError:
+                    #The downloaded file is missing, only the metadata is left
+                    size = 0
+                    stat = entry.stat()
+                downloads.append((stat.st_mtime, size, dest_path))
+        return downloads
+
+    def evict(self, folder, keep=()):
+        """
+            Remove the least recently used downloads of a folder until
+            their size is under the maximum size
+
+            :param folder: The folder of the downloaded files
+            :param keep: The paths of the files to keep
+
+            :type folder: string
+            :type keep: list
+        """
+        downloads = self.downloads(folder)
+        total = sum(size for _, size, _ in downloads)
+        if total <= self.max_size:
+            return
+
+        keep = set(os.path.abspath(dest_path) for dest_path in keep)
+        #The oldest downloads first
+        for _, size, dest_path in sorted(downloads):
+            if os.path.abspath(dest_path) in keep:
+                continue
+            logger.debug("Evict {}".format(dest_path))
+            self.remove(dest_path)
+            total -= size
+            if total <= self.max_size:
+                break
+
+    def clear(self, folder):
+        """
+            Remove all the downloads of a folder
+
+            :param folder: The folder of the downloaded files
+
+            :type folder: string
+
+            :return: The number of removed files
+            :rtype: int
+        """
+        downloads = self.downloads(folder)
+        for _, _, dest_path in downloads:
+            self.remove(dest_path)
+        return len(downloads)
+
+    @staticmethod
+    def remove(dest_path):
+        """
+            Remove a downloaded file and its metadata
+
+            :param dest_path: The path of the downloaded file
+
+            :type dest_path: string
+        """
+        for file_path in (dest_path,
+                          dest_path + PygnataDownloader.meta_extension):
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import hashlib
+import threading
+
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache
+from jinja2.exceptions import TemplateNotFound
+from path import path
+from .config.config import pygconfig
+
+
+class PygnataLoader(BaseLoader):
+    """
+        Jinja loader of the templates given by their source. A template
+        is named by the hash of its source, so a same source is compiled
+        only once and its bytecode can be cached on disk. A source is
+        kept only while its template is loaded, the compiled templates
+        are kept by the cache of the environment.
+    """
+    def __init__(self):
+        #Associate the name of a template to its source and its number
+        #of loads in progress
+        self.sources = {}
+        self.lock = threading.Lock()
+
+    def add(self, source):
+        """
+            Register a template source
+
+            :param source: The source of the template
+
+            :type source: string
+
+            :return: The name of the template
+            :rtype: string
+        """
+        name = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        with self.lock:
+            count = self.sources.get(name, (source, 0))[1]
+            self.sources[name] = (source, count + 1)
+        return name
+
+    def release(self, name):
+        """
+            Forget a template source once its template is loaded
+
+            :param name: The name of the template
+
+            :type name: string
+        """
+        with self.lock:
+            source, count = self.sources[name]
+            if count > 1:
+                self.sources[name] = (source, count - 1)
+            else:
+                del self.sources[name]
+
+    def get_source(self, environment, template):
+        """
+            Get the source of a registered template
+
+            :param environment: The Jinja environment
+            :param template: The name of the template
+
+            :type environment: Environment
+            :type template: string
+
+            :return: The source, the filename and the uptodate function
+            :rtype: tuple
+        """
+        with self.lock:
+            if template not in self.sources:
+                raise TemplateNotFound(template)
+            source = self.sources[template][0]
+        #The name depends on the source, so the template is always uptodate
+        return source, None, lambda: True
+
+
+#The environment shared by the process
+_environment = None
+_lock = threading.Lock()
+
+
+def get_environment():
+    """
+        Get the Jinja environment shared by the process, it is created
+        on the first call from the JINJA section of the configuration.
+
+        :return: The Jinja environment
+        :rtype: Environment
+    """
+    global _environment
+
+    with _lock:
+        if _environment is None:
+            bytecode_cache = None
+            if pygconfig.getboolean('JINJA', 'BytecodeCache'):
+                bytecode_dir = path(pygconfig.get('JINJA', 'BytecodeDir'))
+                bytecode_dir = bytecode_dir.expand()
+                try:
+                    if not bytecode_dir.isdir():
+                        os.makedirs(bytecode_dir)
+                    bytecode_cache = FileSystemBytecodeCache(bytecode_dir)
+                except OSError:
+                    #Work without the bytecode cache
+                    bytecode_cache = None
+
+            cache_size = pygconfig.getint('JINJA', 'CacheSize')
+            _environment = Environment(loader=PygnataLoader(),
+                                       cache_size=cache_size,
+                                       bytecode_cache=bytecode_cache)
+
+    return _environment
+
+
+def get_template(source):
+    """
+        Get a compiled template from its source, the template is
+        compiled only if it is not in the memory or bytecode cache.
+
+        :param source: The source of the template
+
+        :type source: string
+
+        :return: The compiled template
+        :rtype: Template
+    """
+    environment = get_environment()
+    name = environment.loader.add(source)
+    try:
+        return environment.get_template(name)
+    finally:
+        environment.loader.release(name)
@@ -49,3 +49,35 @@ class BuilderError(Exception):
 
     def __str__(self):
         return repr(self.value)
+
+
+class BatchError(Exception):
+    """Exception raised for errors in the batch class.
+
+    Attributes:
+        value -- explanation of the error
+    """
+
+    def __init__(self, value):
+        super(BatchError, self).__init__(value)
+
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
+
+
+class ProcessorError(Exception):
+    """Exception raised for errors in the processor class.
+
+    Attributes:
+        value -- explanation of the error
+    """
+
+    def __init__(self, value):
+        super(ProcessorError, self).__init__(value)
+
+        self.value = value
+
+    def __str__(self):
+        return repr(self.value)
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import re
+
+from .config.config import pygconfig
+from .exception import BuilderError
+from .logger import logger
+from .profiler import profiler
+
+#End of the folder paths given to the rules
+DIR_MARK = "\x00"
+
+
+class PygnataIgnore(object):
+    """
+        Class used to tell which entries of a folder are ignored while it
+        is walked. The rules follow the .gitignore syntax: globs, rules
+        anchored by a slash, negation with "!", folder only rules ending
+        with a slash, and the last matching rule wins.
+
+        The rules of a source are compiled in a single regex, in reverse
+        order, so the first alternative matching an entry is the last
+        matching rule. The ignore files found in a folder apply to it and
+        to its sub folders, before the rules of its parents. The rules of
+        the command line and of the configuration apply from the root
+        folder, after all the ignore files.
+
+        An ignored folder is not walked, its entries cannot be included
+        again.
+    """
+    def __init__(self, regexes=None, rules=None, files=None):
+        #The regexes of the names always ignored, each one is compiled
+        #alone to keep its own flags
+        self.names = []
+        for regex in regexes or []:
+            try:
+                self.names.append(re.compile(regex))
+            except re.error as e:
+                raise BuilderError("Invalid ignore regex {} ({})".format(
+                    regex, e))
+
+        #The rules of the root folder, from the configuration and the
+        #command line
+        if rules is None:
+            rules = []
+        default = pygconfig.get('BUILDER', 'IgnoreRules')
+        self.rules = self.compile([rule.strip() for rule in default.split(',')
+                                   if rule.strip()] + list(rules))
+
+        #The names of the files giving the rules of their folder
+        if files is None:
+            files = pygconfig.get('BUILDER', 'IgnoreFiles').split(',')
+        self.files = [name.strip() for name in files if name.strip()]
+
+    def enter(self, context, dir_path, names):
+        """
+            Get the rules applying to the entries of a folder
+
+            :param context: The rules of the parent folder, None for the
+                            root folder
+            :param dir_path: The path of the folder
+            :param names: The names of the entries of the folder
+
+            :type context: tuple
+            :type dir_path: string
+            :type names: list
+
+            :return: The rules of the folder, deepest first
+            :rtype: tuple
+        """
+        base = os.path.join(dir_path, '')
+        if context is None:
+            context = ()
+            if self.rules is not None:
+                context = ((len(base),) + self.rules,)
+
+        lines = []
+        for file_name in self.files:
+            if file_name in names:
+                lines.extend(self.read(os.path.join(dir_path, file_name)))
+        rules = self.compile(lines)
+        if rules is not None:
+            context = ((len(base),) + rules,) + context
+        return context
+
+    def is_ignored(self, context, dir_path, name, is_dir):
+        """
+            Check if an entry of a folder is ignored
+
+            :param context: The rules of the folder
+            :param dir_path: The path of the folder
+            :param name: The name of the entry
+            :param is_dir: If the entry is a folder
+
+            :type context: tuple
+            :type dir_path: string
+            :type name: string
+            :type is_dir: bool
+
+            :return: If the entry is ignored
+            :rtype: bool
+        """
+        for regex in self.names:
+            if regex.match(name):
+                return True
+        if not context:
+            return False
+
+        #The folders are matched with a trailing NUL, it is in no name
+        entry_path = os.path.join(dir_path, name)
+        if os.sep != '/':
+            entry_path = entry_path.replace(os.sep, '/')
+        if is_dir:
+            entry_path += DIR_MARK
+
+        for start, regex, negated in context:
+            match = regex.match(entry_path, start)
+            if match is not None:
+                return not negated[match.lastindex - 1]
+        return False
+
+    @staticmethod
+    def read(file_path):
+        """
+            Read the rules of an ignore file
+
+            :param file_path: The path of the file
+
+            :type file_path: string
+
+            :return: The lines of the file
+            :rtype: list
+        """
+        try:
+            with open(file_path, 'r', encoding='utf-8',
+                      errors='replace') as fd:
+                lines = fd.read().splitlines()
+        except (OSError, IOError) as e:
+            logger.debug("Cannot read {} ({})".format(file_path, e))
+            return []
+        profiler.count('ignore.files')
+        return lines
+
+    @staticmethod
+    def compile(lines):
+        """
+            Compile rules in a single regex
+
+            :param lines: The rules, in the .gitignore syntax
+
+            :type lines: list
+
+            :return: The regex and if each of its groups is a negation,
+                     None without rule
+            :rtype: tuple
+        """
+        alternatives = []
+        negated = []
+        for line in reversed(lines):
+            rule = PygnataIgnore.translate(line)
+            if rule is not None:
+                alternatives.append("({})".format(rule[0]))
+                negated.append(rule[1])
+        if not alternatives:
+            return None
+        return re.compile("(?s)(?:{})".format("|".join(alternatives))), negated
+
+    @staticmethod
+    def translate(line):
+        """
+            Translate a rule in the .gitignore syntax to a regex matching
+            the paths relative to the folder of the rule, a folder path
+            ending with DIR_MARK
+
+            :param line: The rule
+
+            :type line: string
+
+            :return: The regex and if the rule is a negation, None for a
+                     blank line or a comment
+            :rtype: tuple
+        """
+        #The trailing spaces are kept only when escaped
+        while line.endswith(' ') and not line.endswith('\\ '):
+            line = line[:-1]
+        if not line or line.startswith('#'):
+            return None
+
+        negation = line.startswith('!')
+        if negation:
+            line = line[1:]
+        elif line.startswith(('\\!', '\\#')):
+            line = line[1:]
+
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+
+        #A rule with a slash is relative to its folder, else it matches
+        #the name at any level
+        anchored = '/' in line
+        segments = line.lstrip('/').split('/')
+
+        regex = "" if anchored else "(?:.*/)?"
+        for index, segment in enumerate(segments):
+            last = index == len(segments) - 1
+            if segment == '**':
+                #"**/" matches any number of folders, a final "/**" all
+                #the entries inside
+                regex += ".+" if last else "(?:.*/)?"
+                continue
+            regex += PygnataIgnore.translate_glob(segment)
+            if not last:
+                regex += "/"
+
+        regex += re.escape(DIR_MARK)
+        if not dir_only:
+            regex += "?"
+        return regex + r"\Z", negation
+
+    @staticmethod
+    def translate_glob(glob):
+        """
+            Translate a glob matching a single name to a regex
+
+            :param glob: The glob
+
+            :type glob: string
+
+            :return: The regex
+            :rtype: string
+        """
+        regex = []
+        index = 0
+        while index < len(glob):
+            char = glob[index]
+            index += 1
+            if char == '*':
+                regex.append("[^/]*")
+            elif char == '?':
+                regex.append("[^/]")
+            elif char == '\\' and index < len(glob):
+                regex.append(re.escape(glob[index]))
+                index += 1
+            elif char == '[':
+                #A class ends with the first "]" not opening it
+                end = index
+                if end < len(glob) and glob[end] in '!^':
+                    end += 1
+                if end < len(glob) and glob[end] == ']':
+                    end += 1
+                end = glob.find(']', end)
+                if end < 0:
+                    regex.append(re.escape(char))
+                    continue
+                content = glob[index:end].replace('\\', '\\\\').replace(
+                    '[', '\\[')
+                if content[:1] in ('!', '^'):
+                    content = '^' + content[1:]
+                regex.append("[{}]".format(content))
+                index = end + 1
+            else:
+                regex.append(re.escape(char))
+        return "".join(regex)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import sqlite3
+import threading
+
+from path import path
+from .cache import PygnataCache
+from .config.config import pygconfig
+from .exception import ParserError
+from .logger import logger
+from .profiler import profiler
+
+#Version of the index tables, the index is rebuilt when it changes
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    name TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    author TEXT COLLATE NOCASE,
+    title TEXT COLLATE NOCASE,
+    version TEXT,
+    date TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS templates_author ON templates (author);
+CREATE INDEX IF NOT EXISTS templates_title ON templates (title);
+CREATE INDEX IF NOT EXISTS templates_version ON templates (version);
+"""
+
+#The INFO fields kept in the index
+FIELDS = ('author', 'title', 'version', 'date')
+
+
+class PygnataIndex(object):
+    """
+        Class used to index the .pyg files of the local folder in a
+        SQLite database. A file is read again only when its size or
+        modification time changed, so listing thousands of templates
+        does not parse them.
+    """
+    def __init__(self, folder, db_path=None, parser=None):
+        #The indexed folder
+        self.folder = path(folder).expand()
+
+        #Get the path of the database
+        if db_path is None:
+            db_path = pygconfig.get('INDEX', 'Path')
+        self.db_path = path(db_path).expand()
+
+        #Parser used to read the INFO part, created on the first need
+        self.parser = parser
+
+        #The .pyg files and the packed ones are indexed
+        self.extensions = (pygconfig.get('PROVIDER', 'Extension'),
+                           pygconfig.get('PACK', 'Extension'))
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def connect(self):
+        """
+            Open the database, the tables are created if needed
+
+            :return: The connection
+            :rtype: Connection
+        """
+        if self.connection is None:
+            if not self.db_path.parent.isdir():
+                os.makedirs(self.db_path.parent)
+            connection = sqlite3.connect(self.db_path,
+                                         check_same_thread=False)
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                connection.execute("DROP TABLE IF EXISTS templates")
+                connection.execute("PRAGMA user_version = {}".format(
+                    SCHEMA_VERSION))
+            connection.executescript(SCHEMA)
+            self.connection = connection
+        return self.connection
+
+    def close(self):
+        """
+            Close the database
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def read_info(self, file_path):
+        """
+            Read a .pyg file and get its hash and INFO fields
+
+            :param file_path: The path of the .pyg file
+
+            :type file_path: string
+
+            :return: The hash, the INFO fields and the error if the file
+                     is invalid
+            :rtype: tuple
+        """
+        if self.parser is None:
+            from .parser import PygnataParser
+            self.parser = PygnataParser()
+
+        if file_path.endswith(self.parser.pack_extension):
+            #Only the pages of the INFO section are read
+            from .pack import PygnataPack
+
+            try:
+                with PygnataPack(file_path) as pack:
+                    info, error = pack.info(), None
+                    file_hash = pack.digest()
+            except ParserError as e:
+                info, error = {}, '{}: {}'.format(type(e).__name__, e)
+                file_hash = ''
+        else:
+            with open(file_path, 'r') as fd:
+                file_content = fd.read()
+            info, error = self.parse_info(self.parser, file_content)
+            file_hash = PygnataCache.digest(file_content)
+        profiler.count('index.read')
+
+        return file_hash, info, error
+
+    @staticmethod
+    def parse_info(parser, file_content):
+        """
+            Get the INFO fields of a .pyg file, without rendering it
+
+            :param parser: The parser splitting the parts
+            :param file_content: The raw content of the .pyg file
+
+            :type parser: PygnataParser
+            :type file_content: string
+
+            :return: The INFO fields and the error if the file is invalid
+            :rtype: tuple
+        """
+        #yaml is imported only when a file is read
+        from . import yamlio
+
+        try:
+            part_dic = parser.get_parts(file_content)
+            info = yamlio.load(part_dic[parser.info_part][0]) or {}
+            if not isinstance(info, dict):
+                raise ValueError("The INFO part is not a dict")
+        except Exception as e:
+            return {}, '{}: {}'.format(type(e).__name__, e)
+        return info, None
+
+    def update(self, file_path, stat=None):
+        """
+            Add or refresh the entry of a .pyg file
+
+            :param file_path: The path of the .pyg file
+            :param stat: The stat result of the file, if already known
+
+            :type file_path: string
+            :type stat: stat_result
+        """
+        if stat is None:
+            stat = os.stat(file_path)
+        file_hash, info, error = self.read_info(file_path)
+        name = os.path.basename(file_path)
+
+        row = [name, os.path.abspath(file_path), stat.st_mtime_ns,
+               stat.st_size, file_hash]
+        row.extend(None if info.get(field) is None else str(info[field])
+                   for field in FIELDS)
+        row.append(error)
+
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO templates VALUES "
+                    "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def remove(self, name):
+        """
+            Remove the entry of a .pyg file
+
+            :param name: The name of the file
+
+            :type name: string
+        """
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute("DELETE FROM templates WHERE name = ?",
+                                   (name,))
+
+    def sync(self):
+        """
+            Bring the index up to date with the folder. Only the new
+            and modified files are read.
+
+            :return: The number of read and removed entries
+            :rtype: tuple
+        """
+        with self.lock:
+            known = dict((name, (mtime_ns, size)) for name, mtime_ns, size in
+                         self.connect().execute(
+                             "SELECT name, mtime_ns, size FROM templates"))
+
+        nb_read = 0
+        with profiler.phase('index.sync'):
+            with os.scandir(self.folder) as iterator:
+                for entry in iterator:
+                    if not entry.name.endswith(self.extensions):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    name = entry.name
+                    if known.pop(name, None) == (stat.st_mtime_ns,
+                                                 stat.st_size):
+                        continue
+                    try:
+                        self.update(entry.path, stat)
+                        nb_read += 1
+                    except (OSError, IOError, UnicodeDecodeError) as e:
+                        logger.debug("Cannot index {} ({})".format(entry.path,
+                                                                   e))
+
+            #The files left were removed from the folder
+            for name in known:
+                self.remove(name)
+
+        return nb_read, len(known)
+
+    def search(self, author=None, title=None, version=None):
+        """
+            Find the indexed files. Author and title match a part of
+            the field ignoring the case, version matches the whole field.
+
+            :param author: Filter on the author
+            :param title: Filter on the title
+            :param version: Filter on the version
+
+            :type author: string
+            :type title: string
+            :type version: string
+
+            :return: The matching entries sorted by name
+            :rtype: list
+        """
+        clauses = []
+        params = []
+        for field, value in (('author', author), ('title', title)):
+            if value:
+                #The wildcards of the value match themselves
+                clauses.append("{} LIKE ? ESCAPE '\\'".format(field))
+                params.append('%{}%'.format(value.replace('\\', '\\\\')
+                                            .replace('%', '\\%')
+                                            .replace('_', '\\_')))
+        if version:
+            clauses.append("version = ?")
+            params.append(str(version))
+
+        query = ("SELECT name, path, hash, author, title, version, date, "
+                 "error FROM templates")
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY name"
+
+        columns = ('name', 'path', 'hash') + FIELDS + ('error',)
+        with self.lock:
+            rows = self.connect().execute(query, params).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    @staticmethod
+    def summary(entries):
+        """
+            Format the indexed files in a table
+
+            :param entries: The entries of the index
+
+            :type entries: list
+
+            :return: The table
+            :rtype: string
+        """
+        lines = ["{:<30} {:<10} {:<20} {}".format("NAME", "VERSION",
+                                                  "AUTHOR", "TITLE")]
+        for entry in entries:
+            if entry['error']:
+                lines.append("{:<30} invalid: {}".format(entry['name'],
+                                                         entry['error']))
+                continue
+            lines.append("{:<30} {:<10} {:<20} {}".format(
+                entry['name'], entry['version'] or '', entry['author'] or '',
+                entry['title'] or ''))
+        lines.append("{} templates".format(len(entries)))
+        return "\n".join(lines)
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import json
+import mmap
+import zlib
+import base64
+import struct
+import datetime
+import tempfile
+
+from .config.config import pygconfig
+from .exception import ParserError
+from .profiler import profiler
+from .tree import PygnataTree
+from . import tree as tree_kinds
+
+#Start of a packed file
+MAGIC = b'PYGPACK\x00'
+#Version of the packed format
+VERSION = 1
+
+#Header: magic, version, flags, number of sections
+HEADER = struct.Struct('<8sHHI')
+#Section table entry: name, offset, stored length, flags, raw length
+SECTION = struct.Struct('<4sQQIQ')
+#Tree table record: kind, number of children, value offset, value length
+NODE = struct.Struct('<BIII')
+
+#Sections of a packed file
+SOURCE = b'SRC '
+INFO = b'INFO'
+DIGEST = b'HASH'
+PARTS = b'PART'
+TREE = b'TREE'
+
+#Flag of a compressed section
+COMPRESSED = 1
+
+#Kinds of the tree records
+FILE = 0
+DIR = 1
+CONTENT = 3
+#Number of children of a folder written "- folder:"
+NO_CHILDREN = 0xFFFFFFFF
+
+def encode_value(value):
+    """
+        Convert the YAML values unknown by JSON
+
+        :param value: A value of a part
+
+        :type value: object
+
+        :return: A tagged dict
+        :rtype: dict
+    """
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, bytes):
+        return {'$bytes': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, (set, frozenset)):
+        return {'$set': sorted(value, key=repr)}
+    raise TypeError("Cannot pack {!r}".format(value))
+
+
+def decode_value(dic):
+    """
+        Convert back the tagged dicts
+
+        :param dic: A decoded JSON object
+
+        :type dic: dict
+
+        :return: The YAML value
+        :rtype: object
+    """
+    if len(dic) == 1:
+        key, value = list(dic.items())[0]
+        if key == '$datetime':
+            return datetime.datetime.fromisoformat(value)
+        if key == '$date':
+            return datetime.date.fromisoformat(value)
+        if key == '$bytes':
+            return base64.b64decode(value)
+        if key == '$set':
+            return set(value)
+    return dic
+
+
+def dumps(value):
+    """
+        Encode a value in JSON bytes
+
+        :param value: The value
+
+        :type value: object
+
+        :return: The JSON bytes
+        :rtype: bytes
+    """
+    return json.dumps(value, default=encode_value,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """
+        Decode JSON bytes
+
+        :param data: The JSON bytes
+
+        :type data: bytes
+
+        :return: The value
+        :rtype: object
+    """
+    return json.loads(bytes(data).decode('utf-8'), object_hook=decode_value)
+
+
+class PygnataPack(object):
+    """
+        Class used to read a packed .pyg file. The file is mapped in
+        memory and only the sections used are read, so showing a file
+        or getting its INFO part does not load the rest.
+
+        A packed file is a header, a table of the sections, then the
+        sections: the exact .pyg source (compressed or not), the INFO
+        part, the decoded parts and the tree table, which is the TREE
+        part rendered like the show command does.
+    """
+    #Extension of the packed files
+    extension = pygconfig.get('PACK', 'Extension')
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.fd = open(file_path, 'rb')
+        try:
+            self.map = mmap.mmap(self.fd.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.fd.close()
+            raise ParserError("{} is empty".format(file_path))
+
+        try:
+            self.sections = self.read_table()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        """
+            Unmap and close the file
+        """
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.fd.close()
+
+    @staticmethod
+    def is_packed(file_path):
+        """
+            Check if a path is a packed .pyg file
+
+            :param file_path: The path of the file
+
+            :type file_path: string
+
+            :return: If the file is packed
+            :rtype: bool
+        """
+        return str(file_path).endswith(PygnataPack.extension)
+
+    def read_table(self):
+        """
+            Read the header and the section table
+
+            :return: Associate a section name to its offset, length,
+                     flags and raw length
+            :rtype: dict
+        """
+        if len(self.map) < HEADER.size:
+            raise ParserError("{} is not a packed file".format(self.file_path))
+
+        magic, version, _, count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ParserError("{} is not a packed file".format(self.file_path))
+        if version != VERSION:
+            raise ParserError("{}- Unknown version {}".format(self.file_path,
+                                                              version))
+
+        sections = {}
+        for index in range(count):
+            name, offset, length, flags, raw_length = SECTION.unpack_from(
+                self.map, HEADER.size + index * SECTION.size)
+            if offset + length > len(self.map):
+                raise ParserError("{}- Section {} truncated".format(
+                    self.file_path, name.decode('ascii')))
+            sections[name] = (offset, length, flags, raw_length)
+        return sections
+
+    def section(self, name):
+        """
+            Get the content of a section
+
+            :param name: The name of the section
+
+            :type name: bytes
+
+            :return: The content of the section
+            :rtype: bytes
+        """
+        if name not in self.sections:
+            raise ParserError("{}- Section {} absent".format(
+                self.file_path, name.decode('ascii')))
+
+        offset, length, flags, raw_length = self.sections[name]
+        data = self.map[offset:offset + length]
+        if flags & COMPRESSED:
+            data = zlib.decompress(data)
+        if len(data) != raw_length:
+            raise ParserError("{}- Section {} corrupted".format(
+                self.file_path, name.decode('ascii')))
+        profiler.count('pack.bytes', length)
+        return data
+
+    def source(self):
+        """
+            Get the .pyg source, with the newlines of a file read as text
+
+            :return: The source
+            :rtype: string
+        """
+        source = self.section(SOURCE).decode('utf-8')
+        return source.replace('\r\n', '\n').replace('\r', '\n')
+
+    def digest(self):
+        """
+            Get the hash of the .pyg source
+
+            :return: The hexadecimal hash
+            :rtype: string
+        """
+        return self.section(DIGEST).decode('ascii')
+
+    def info(self):
+        """
+            Get the INFO part
+
+            :return: The INFO part
+            :rtype: dict
+        """
+        return loads(self.section(INFO))
+
+    def parts(self):
+        """
+            Get the decoded parts, without the TREE part
+
+            :return: The parts
+            :rtype: dict
+        """
+        return loads(self.section(PARTS))
+
+    def tree(self):
+        """
+            Get the tree rendered with the default values
+
+            :return: The tree
+            :rtype: PygnataTree
+        """
+        data = memoryview(self.section(TREE))
+        count, = struct.unpack_from('<I', data, 0)
+        pool = data[4 + count * NODE.size:]
+
+        tree = PygnataTree()
+        #The parent of the open lists with their remaining children
+        stack = [[-1, -1]]
+        for kind, nb_children, offset, length in NODE.iter_unpack(
+                data[4:4 + count * NODE.size]):
+            while stack[-1][1] == 0:
+                stack.pop()
+            parent = stack[-1]
+            parent[1] -= 1
+            value = loads(pool[offset:offset + length])
+
+            if kind == FILE:
+                tree.add(value, tree_kinds.FILE, parent[0])
+            elif kind == CONTENT:
+                #A mapping with a single key
+                name, content = list(value.items())[0]
+                tree.add(name, tree_kinds.CONTENT, parent[0], content)
+            elif kind != DIR:
+                raise ParserError("{}- Unknown tree record kind {}".format(
+                    self.file_path, kind))
+            elif nb_children == NO_CHILDREN:
+                tree.add(value, tree_kinds.DIR | tree_kinds.NO_CHILDREN,
+                         parent[0])
+            else:
+                index = tree.add(value, tree_kinds.DIR, parent[0])
+                if nb_children:
+                    stack.append([index, nb_children])
+
+        tree.finish()
+        return tree
+
+    @staticmethod
+    def tree_records(tree):
+        """
+            Flatten a tree in records, in pre-order
+
+            :param tree: The tree
+
+            :type tree: PygnataTree
+
+            :return: The (kind, number of children, value) of the nodes
+            :rtype: list
+        """
+        tree = PygnataTree.from_yaml(tree)
+        records = []
+        for index in range(len(tree)):
+            name = tree.name(index)
+            kind = tree.kinds[index]
+            if kind & tree_kinds.KIND_MASK == tree_kinds.FILE:
+                records.append((FILE, 0, name))
+            elif kind & tree_kinds.KIND_MASK == tree_kinds.CONTENT:
+                records.append((CONTENT, 0, {name: tree.content(index)}))
+            elif kind & tree_kinds.NO_CHILDREN:
+                records.append((DIR, NO_CHILDREN, name))
+            else:
+                nb_children = sum(1 for _ in tree.children(index))
+                records.append((DIR, nb_children, name))
+        return records
+
+    @staticmethod
+    def write(dest_path, source, file_hash, part_dic, tree, info_part,
+              compress=False):
+        """
+            Write a packed file
+
+            :param dest_path: The path of the packed file
+            :param source: The exact bytes of the .pyg file
+            :param file_hash: The hash of the .pyg source
+            :param part_dic: The decoded parts, without the TREE part
+            :param tree: The TREE part rendered with the default values
+            :param info_part: The name of the INFO part
+            :param compress: Compress the source
+
+            :type dest_path: string
+            :type source: bytes
+            :type file_hash: string
+            :type part_dic: dict
+            :type tree: PygnataTree
+            :type info_part: string
+            :type compress: bool
+        """
+        #Build the tree table
+        records = PygnataPack.tree_records(tree)
+        table = [struct.pack('<I', len(records))]
+        pool = []
+        pool_size = 0
+        for kind, nb_children, value in records:
+            data = dumps(value)
+            table.append(NODE.pack(kind, nb_children, pool_size, len(data)))
+            pool.append(data)
+            pool_size += len(data)
+
+        sections = [(SOURCE, source, compress),
+                    (DIGEST, file_hash.encode('ascii'), False),
+                    (INFO, dumps(part_dic.get(info_part) or {}), False),
+                    (PARTS, dumps(part_dic), False),
+                    (TREE, b''.join(table + pool), False)]
+
+        offset = HEADER.size + len(sections) * SECTION.size
+        entries = []
+        contents = []
+        for name, data, compressed in sections:
+            stored = zlib.compress(data, 9) if compressed else data
+            entries.append(SECTION.pack(name, offset, len(stored),
+                                        COMPRESSED if compressed else 0,
+                                        len(data)))
+            contents.append(stored)
+            offset += len(stored)
+
+        dest_dir = os.path.dirname(os.path.abspath(dest_path))
+        #Write a temporary file and rename it for the other processes
+        fd, tmp_path = tempfile.mkstemp(dir=dest_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(HEADER.pack(MAGIC, VERSION, 0, len(sections)))
+                tmp_file.write(b''.join(entries))
+                for data in contents:
+                    tmp_file.write(data)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, dest_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def unpack(file_path, dest_path):
+        """
+            Write back the exact .pyg source of a packed file
+
+            :param file_path: The path of the packed file
+            :param dest_path: The path of the .pyg file
+
+            :type file_path: string
+            :type dest_path: string
+        """
+        with PygnataPack(file_path) as pack:
+            source = pack.section(SOURCE)
+        with open(dest_path, 'wb') as fd:
+            fd.write(source)
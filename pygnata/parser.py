@@ -5,13 +5,15 @@
 
 import os.path
 import re
-import yaml
 
-from jinja2 import Environment
+from functools import partial
 
+from .cache import PygnataCache
 from .config.config import pygconfig
 from .exception import ParserError
 from .logger import logger
+from .profiler import profiler
+from .tree import PygnataTree
 
 
 class PygnataParser(object):
@@ -19,7 +21,7 @@ class PygnataParser(object):
         Class use to parse a .pyg file
     """
 
-    def __init__(self):
+    def __init__(self, cache=None):
 
         #Get the parts name
         self.var_part = pygconfig.get('GENERAL', 'VarPart')
@@ -36,16 +38,36 @@ class PygnataParser(object):
         info_field = pygconfig.get('PARSER', 'InfoFields').split(',')
         self.req_fields = {self.info_part: info_field}
 
-    def parse(self, absolute_path, ask_var=True):
+        #Prefix of the environment variables giving the VAR part values
+        self.env_prefix = pygconfig.get('PARSER', 'VarEnvPrefix')
+
+        #Check if the tree is created while it is parsed
+        self.stream_tree = pygconfig.getboolean('PARSER', 'StreamTree')
+
+        #Extension of the packed .pyg files
+        self.pack_extension = pygconfig.get('PACK', 'Extension')
+
+        #Cache of the parsed files
+        self.cache = cache if cache is not None else PygnataCache()
+
+    def parse(self, absolute_path, ask_var=True, values=None,
+              interactive=True, stream=False):
         """
             Parse a Pygnata file and return a dictionnary with
             the part name as key and the part content as value.
 
             :param absolute_path: The absolute path of the .pyg file
             :param ask_var: Indicate if the the VAR part should be processed
+            :param values: The known values of the VAR part
+            :param interactive: Ask the user for the unknown values
+            :param stream: Parse the tree while it is created, when it
+                           is not in the cache
 
             :type absolute_path: string
             :type ask_var: bool
+            :type values: dict
+            :type interactive: bool
+            :type stream: bool
 
             :return: The dict containing the parts and related informations
             :rtype: dict
@@ -53,38 +75,123 @@ class PygnataParser(object):
         if not os.path.isfile(absolute_path):
             raise ParserError("The file does not exist")
 
-        part_dic = None
+        with profiler.phase('parser.read'):
+            if absolute_path.endswith(self.pack_extension):
+                from .pack import PygnataPack
+
+                with PygnataPack(absolute_path) as pack:
+                    #The parts and the tree to show are already decoded
+                    if not ask_var:
+                        part_dic = pack.parts()
+                        part_dic[self.tree_part] = pack.tree()
+                        return part_dic
+                    file_content = pack.source()
+            else:
+                with open(absolute_path, 'r') as fd:
+                    file_content = fd.read()
+            profiler.count('fs.read')
+
+        #Get the decoded parts from the cache if the file is known
+        with profiler.phase('parser.cache'):
+            file_hash = self.cache.digest(file_content)
+            part_dic = self.cache.get(PygnataCache.PARTS, file_hash)
+
+        if part_dic is None:
+            profiler.count('parser.parts_cache_miss')
+            part_dic = self.load_parts(file_content)
+            with profiler.phase('parser.cache'):
+                self.cache.put(PygnataCache.PARTS, file_hash, part_dic)
+        else:
+            profiler.count('parser.parts_cache_hit')
+
+        #browse the part
+        for part, content in list(part_dic.items()):
+            #If it is the VAR part and if it is not the show function,
+            # we ask for user values
+            if part == self.var_part and ask_var:
+                part_dic[part] = self.bind_variable(content, values,
+                                                    interactive)
+
+            #Test the required fields
+            self.test_required_fields(part, part_dic[part])
+
+        #Replace variable in tree with jinja2
+        tree = part_dic[self.tree_part][0]
+
+        #Get None if var or static are absents
+        var = part_dic.get(self.var_part)
+        static = part_dic.get(self.static_part)
+
+        part_dic[self.tree_part] = self.generate_tree(tree, var, static,
+                                                      file_hash, stream)
 
-        with open(absolute_path, 'r') as fd:
+        return part_dic
 
-            #retireve the parts
-            part_dic = self.get_parts(fd.read())
+    def pack(self, absolute_path, dest_path, compress=False):
+        """
+            Write a .pyg file in the packed format, with its parts
+            decoded and its tree rendered like the show command does.
 
-            #browse the part and convert the content with Yaml
-            #except the tree part
-            for part, content in list(part_dic.items()):
-                #If it is not the tree part and the part is not empty
-                if part != self.tree_part:
-                    yml_content = yaml.load(content[0])
+            :param absolute_path: The absolute path of the .pyg file
+            :param dest_path: The path of the packed file
+            :param compress: Compress the source in the packed file
+
+            :type absolute_path: string
+            :type dest_path: string
+            :type compress: bool
+        """
+        from .pack import PygnataPack
 
-                    #If it is the VAR part and if it is not the show function,
-                    # we ask for user values
-                    if part == self.var_part and ask_var:
-                        yml_content = self.ask_variable(yml_content)
+        if not os.path.isfile(absolute_path):
+            raise ParserError("The file does not exist")
+        if absolute_path.endswith(self.pack_extension):
+            raise ParserError("The file is already packed")
 
-                    part_dic[part] = yml_content
+        #The bytes are kept to unpack the exact same file
+        with open(absolute_path, 'rb') as fd:
+            source = fd.read()
+        file_content = source.decode('utf-8')
+        file_content = file_content.replace('\r\n', '\n').replace('\r', '\n')
 
-                #Test the required fields
-                self.test_required_fields(part, part_dic[part])
+        part_dic = self.load_parts(file_content)
+        for part, content in list(part_dic.items()):
+            self.test_required_fields(part, content)
 
-            #Replace variable in tree with jinja2
-            tree = part_dic[self.tree_part][0]
+        tree = self.generate_tree(part_dic.pop(self.tree_part)[0],
+                                  part_dic.get(self.var_part),
+                                  part_dic.get(self.static_part))
 
-            #Get None if var or static are absents
-            var = part_dic.get(self.var_part)
-            static = part_dic.get(self.static_part)
+        with profiler.phase('parser.pack'):
+            PygnataPack.write(dest_path, source,
+                              self.cache.digest(file_content), part_dic, tree,
+                              self.info_part, compress)
 
-            part_dic[self.tree_part] = self.generate_tree(tree, var, static)
+    def load_parts(self, file_content):
+        """
+            Retrieve the parts of the pygnata file and convert their
+            content with Yaml, except the tree part.
+
+            :param file_content: The raw content of the .pyg file
+
+            :type file_content: string
+
+            :return: The dict containing the parts and related informations
+            :rtype: dict
+        """
+        #yaml is imported only when the parts are not in the cache
+        from . import yamlio
+
+        #retrieve the parts
+        with profiler.phase('parser.get_parts'):
+            part_dic = self.get_parts(file_content)
+
+        #browse the part and convert the content with Yaml
+        #except the tree part
+        with profiler.phase('parser.yaml_parts'):
+            for part, content in list(part_dic.items()):
+                #If it is not the tree part and the part is not empty
+                if part != self.tree_part:
+                    part_dic[part] = yamlio.load(content[0])
 
         return part_dic
 
@@ -148,21 +255,27 @@ class PygnataParser(object):
                 if field not in content:
                     raise ParserError("{}- Field {} absent".format(part, field))
 
-    def generate_tree(self, tree, variable, static):
+    def generate_tree(self, tree, variable, static, file_hash=None,
+                      stream=False):
         """
-            Generate a YAML tree by replacing Jinja variable by
+            Generate the tree by replacing Jinja variable by
             the value from VAR and STATIC part.
 
             :param tree: The folder tree with Jinja2 variables
             :param variable: The variable content dict
             :param static: The static content dict
+            :param file_hash: The hash of the .pyg file, to use the cache
+            :param stream: Return a stream parsing the tree while it is
+                           read, when it is not in the cache
 
             :type tree: string
             :type variable: dict
             :type static: dict
+            :type file_hash: string
+            :type stream: bool
 
-            :return: The YAML folder tree
-            :rtype: string
+            :return: The folder tree
+            :rtype: PygnataTree or PygnataTreeStream
         """
         #Concat the static and var part
         jinja_var = {}
@@ -171,19 +284,147 @@ class PygnataParser(object):
         if static:
             jinja_var.update(static)
 
+        #Get the tree from the cache if it was rendered with these values
+        tree_key = None
+        if file_hash:
+            with profiler.phase('parser.cache'):
+                tree_key = self.cache.tree_key(file_hash, jinja_var)
+                yml_tree = self.cache.get(PygnataCache.TREES, tree_key)
+            if yml_tree is not None:
+                profiler.count('parser.tree_cache_hit')
+                #The entries of the older versions are YAML lists
+                return PygnataTree.from_yaml(yml_tree)
+            profiler.count('parser.tree_cache_miss')
+
+        #Jinja and yaml are imported only when the tree is not in the cache
+        from . import yamlio
+        from .environment import get_template
+
+        if stream:
+            from .stream import PygnataTreeStream
+
+            on_done = None
+            if tree_key:
+                #The tree is kept once entirely parsed
+                on_done = partial(self.cache.put, PygnataCache.TREES, tree_key)
+            return PygnataTreeStream(get_template(tree), jinja_var, on_done)
+
         #Generate Tree
-        new_tree = Environment().from_string(tree).render(jinja_var)
+        with profiler.phase('parser.jinja'):
+            new_tree = get_template(tree).render(jinja_var)
 
         #generate yaml tree
-        return yaml.load(new_tree)
+        with profiler.phase('parser.yaml_tree'):
+            yml_tree = PygnataTree.from_yaml(yamlio.load(new_tree))
 
-    def ask_variable(self, var_dic):
+        if tree_key:
+            with profiler.phase('parser.cache'):
+                self.cache.put(PygnataCache.TREES, tree_key, yml_tree)
+
+        return yml_tree
+
+    def bind_variable(self, var_dic, values=None, interactive=True):
+        """
+            Get the VAR part values from a dict, then from the environment
+            variables, and by asking the user for the other ones.
+
+            :param var_dic: The dic containing the VAR part fields
+            :param values: The known values of the VAR part fields
+            :param interactive: Ask the user for the unknown values
+
+            :type var_dic: dict
+            :type values: dict
+            :type interactive: bool
+
+            :return: The VAR part dict with the values
+            :rtype: dict
+        """
+        #If VAR part dict is not empty
+        if var_dic:
+            values = values or {}
+            missing = []
+
+            for var in list(var_dic):
+                value = values.get(var)
+                if value is None:
+                    value = os.environ.get(self.env_prefix + str(var).upper())
+
+                if value is None:
+                    missing.append(var)
+                else:
+                    var_dic[var] = self.split_value(value)
+
+            if missing:
+                #Fail before anything is created
+                if not interactive:
+                    raise ParserError("{}- Value of {} absent".format(
+                        self.var_part, ", ".join(str(var) for var in missing)))
+                self.ask_variable(var_dic, missing)
+
+        return var_dic
+
+    @staticmethod
+    def split_value(value):
+        """
+            Convert a value with commas in a list of values
+
+            :param value: The value of a VAR part field
+
+            :type value: string
+
+            :return: The value or the list of values
+            :rtype: string
+        """
+        if not isinstance(value, str):
+            return value
+        tab_var = value.split(",")
+        return value if len(tab_var) <= 1 else tab_var
+
+    @staticmethod
+    def load_values(vars_file=None, pairs=None):
+        """
+            Get the VAR part values from a JSON/YAML file and from
+            key=value strings, the strings override the file.
+
+            :param vars_file: The path of the JSON/YAML file
+            :param pairs: The key=value strings
+
+            :type vars_file: string
+            :type pairs: list
+
+            :return: The values of the VAR part fields
+            :rtype: dict
+        """
+        values = {}
+
+        if vars_file:
+            from . import yamlio
+
+            if not os.path.isfile(vars_file):
+                raise ParserError("The file {} does not exist".format(vars_file))
+            with open(vars_file, 'r') as fd:
+                file_values = yamlio.load(fd.read())
+            if file_values is not None and not isinstance(file_values, dict):
+                raise ParserError("{} is not a dict of values".format(vars_file))
+            values.update(file_values or {})
+
+        for pair in pairs or []:
+            if "=" not in pair:
+                raise ParserError("{} is not a key=value pair".format(pair))
+            key, value = pair.split("=", 1)
+            values[key] = value
+
+        return values
+
+    def ask_variable(self, var_dic, names=None):
         """
             Get the VAR part values by asking the user.
 
             :param var_dic: The dic containing the VAR part fields
+            :param names: The fields to ask, all of them by default
 
             :type var_dic: dict
+            :type names: list
 
             :return: The VAR part dict with the user answer
             :rtype: dict
@@ -192,16 +433,18 @@ class PygnataParser(object):
         if var_dic:
             logger.info("Pygnata need some informations:")
 
+            if names is None:
+                names = list(var_dic)
+
             #Ask user for variable
-            for var, msg in list(var_dic.items()):
-                to_print = "\t(?) - {} ? : ".format(msg)
+            for var in names:
+                to_print = "\t(?) - {} ? : ".format(var_dic[var])
                 var_in = input(to_print)
 
-                while var_in.replace(" ", "") is "":
+                while var_in.replace(" ", "") == "":
                     logger.error(" (!) you should answer something!")
                     var_in = input(to_print)
 
-                tab_var = var_in.split(",")
-                var_dic[var] = var_in if len(tab_var) <=1 else tab_var 
+                var_dic[var] = self.split_value(var_in)
 
             return var_dic
@@ -3,61 +3,871 @@
 #The MIT License (MIT)
 #Copyright (c) 2015 Alexandre LM, Dimitri S
 
+import os
+import json
+import threading
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
+
 from path import path
+from .config.config import pygconfig
+from .contents import PygnataContents, WRITE_FLAGS
+from .exception import ProcessorError
 from .logger import logger
+from .profiler import profiler
+from .staging import PygnataStaging
+from .stream import PygnataTreeStream
+from .tree import PygnataTree, DIR, KIND_MASK, NO_CHILDREN
+
+#Flags used to open a directory only to create entries inside it
+DIR_FLAGS = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0)
+#Flags used to create an empty file like a touch
+FILE_FLAGS = os.O_WRONLY | os.O_CREAT
+
+#Check if the platform can create entries relative to a directory fd
+HAS_DIR_FD = os.mkdir in os.supports_dir_fd and os.open in os.supports_dir_fd
 
 
 class PygnataProcessor(object):
     """
         Process a .pyg file
     """
-    def __init__(self):
+    def __init__(self, workers=None):
         #Part to process in a .pygnata file
         self.to_process = {'TREE': self.create_tree, }
 
-    def process(self, root_path, part_dic):
+        #Number of threads used to create the tree
+        if workers is None:
+            workers = pygconfig.getint('PROCESSOR', 'Workers')
+        self.workers = max(1, int(workers))
+
+        #Install the trees at once by default
+        self.atomic = pygconfig.getboolean('PROCESSOR', 'Atomic')
+
+        #Get the parts giving the values of the template files
+        self.var_part = pygconfig.get('GENERAL', 'VarPart')
+        self.static_part = pygconfig.get('GENERAL', 'StaticPart')
+        self.tree_part = pygconfig.get('GENERAL', 'TreePart')
+
+    def process(self, root_path, part_dic, source_dir=None, sync=False,
+                atomic=None):
         """
             Apply function for the part to process
 
             :param root_path: The absolute path of the .pyg file
             :param part_dic: The dict containing the parts informations
+            :param source_dir: The folder of the .pyg file
+            :param sync: Create only the missing entries of the tree
+            :param atomic: Create the tree in a staging folder and move
+                           it in root_path once complete, None for the
+                           configuration
 
             :type root_path: string
             :type part_dic: dict
+            :type source_dir: string
+            :type sync: bool
+            :type atomic: bool
+
+            :return: What was created, existing or in conflict in sync
+                     mode, None otherwise
+            :rtype: PygnataSyncReport
+        """
+        #The template files use the same values as the TREE part
+        values = {}
+        values.update(part_dic.get(self.var_part) or {})
+        values.update(part_dic.get(self.static_part) or {})
+        contents = PygnataContents(source_dir, values)
+
+        report = PygnataSyncReport() if sync else None
+
+        atomic = self.is_atomic(atomic, sync)
+        if atomic and sync:
+            raise ProcessorError("A sync cannot be atomic, it completes an "
+                                 "existing tree")
+
+        if atomic:
+            #Nothing is visible in root_path before the commit
+            with PygnataStaging(root_path) as staging:
+                self.process_parts(staging.path, part_dic, contents,
+                                   shown_path=root_path)
+                staging.commit()
+        else:
+            self.process_parts(root_path, part_dic, contents, report)
+
+        return report
+
+    def is_atomic(self, atomic, sync=False):
+        """
+            Tell if an install is done in a staging folder
+
+            :param atomic: The choice of the command line, None for the
+                           configuration
+            :param sync: If only the missing entries are created
+
+            :type atomic: bool
+            :type sync: bool
+
+            :return: If the install is atomic
+            :rtype: bool
+        """
+        if atomic is None:
+            return self.atomic and not sync
+        return atomic
+
+    def process_parts(self, root_path, part_dic, contents, report=None,
+                      shown_path=None):
+        """
+            Apply the function of each part to process
 
+            :param root_path: The path use to generate the tree
+            :param part_dic: The dict containing the parts informations
+            :param contents: Writes the content of the files
+            :param report: Collects the entries in sync mode
+            :param shown_path: The path of the tree in the logs, root_path
+                               by default
+
+            :type root_path: string
+            :type part_dic: dict
+            :type contents: PygnataContents
+            :type report: PygnataSyncReport
+            :type shown_path: string
         """
         #Browse the part
         for part, content in list(part_dic.items()):
             #If it is a part to process
             if part in self.to_process:
-                self.to_process[part](root_path, part_dic[part])
+                self.to_process[part](root_path, part_dic[part], contents,
+                                      report, shown_path)
+
+    def plan(self, root_path, part_dic, sync=False):
+        """
+            Tell what an install would do without writing anything. Only
+            the folders of the tree already on the disk are listed, with
+            one scandir each, the levels of the tree are checked in
+            parallel like they are created.
+
+            :param root_path: The path use to generate the tree
+            :param part_dic: The dict containing the parts informations
+            :param sync: Plan an install creating only the missing entries
+
+            :type root_path: string
+            :type part_dic: dict
+            :type sync: bool
+
+            :return: The counts, the existing entries and the conflicts
+            :rtype: PygnataPlan
+        """
+        tree = PygnataTree.from_yaml(part_dic.get(self.tree_part))
+        plan = PygnataPlan(sync)
+        plan_entries = partial(self.plan_entries, tree=tree, plan=plan)
+
+        #The folders of the current level which are on the disk
+        level = [(path(root_path), -1)]
+
+        with profiler.phase('processor.plan'):
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                while level:
+                    next_level = []
+                    for sub_dirs in pool.map(plan_entries, level):
+                        next_level.extend(sub_dirs)
+                    level = next_level
+            plan.depth = tree.count()[2]
+        return plan
+
+    def plan_entries(self, job, tree, plan):
+        """
+            Check the direct children of a folder on the disk. A new
+            folder is counted with its whole subtree, without listing.
+
+            :param job: The folder path and its node in the tree
+            :param tree: The TREE part
+            :param plan: Collects the counts and the entries
+
+            :type job: tuple
+            :type tree: PygnataTree
+            :type plan: PygnataPlan
+
+            :return: The sub folders on the disk to check
+            :rtype: list
+        """
+        root, node = job
+        sub_dirs = []
+        children = list(tree.children(node))
+        if not children:
+            return sub_dirs
+
+        entries = self.list_entries(root)
+        nb_dirs = 0
+        nb_files = 0
+        nb_filled = 0
+        existing = []
+        conflicts = []
+        for child in children:
+            key = tree.name(child)
+            new_path = root / key
+            is_dir = tree.is_dir(child)
+
+            if key in entries:
+                if entries[key] != is_dir:
+                    conflicts.append(new_path)
+                else:
+                    existing.append(new_path)
+                    if is_dir:
+                        sub_dirs.append((new_path, child))
+                continue
+
+            if not is_dir:
+                nb_files += 1
+                continue
+
+            #The kinds of the new subtree tell its folders and files
+            end = tree.ends[child]
+            kinds = tree.kinds[child + 1:end].tobytes()
+            sub_dir_count = (kinds.count(DIR) +
+                             kinds.count(DIR | NO_CHILDREN))
+            nb_dirs += 1 + sub_dir_count
+            nb_files += len(kinds) - sub_dir_count
+            #The folders having children are opened once
+            nb_filled += len(set(tree.parents[child + 1:end]))
+
+        plan.add(nb_dirs, nb_files, nb_filled, existing, conflicts,
+                 len(sub_dirs))
+        return sub_dirs
+
+    def create_tree(self, root_path, tree, contents=None, report=None,
+                    shown_path=None):
+        """
+            Generate a folder tree level by level, the folders of a
+            same level are filled in parallel by a pool of threads.
+
+            :param root_path: The path use to generate the tree
+            :param tree: The TREE part, its YAML list or its stream
+            :param contents: Writes the content of the files
+            :param report: Collects the entries in sync mode, None to
+                           create all the entries
+            :param shown_path: The path of the tree in the logs, root_path
+                               by default
+
+            :type root_path: string
+            :type tree: PygnataTree
+            :type contents: PygnataContents
+            :type report: PygnataSyncReport
+            :type shown_path: string
+
+        """
+        #The tree is created while it is parsed
+        if isinstance(tree, PygnataTreeStream):
+            return self.create_stream(root_path, tree, contents, report,
+                                      shown_path)
+
+        tree = PygnataTree.from_yaml(tree)
+        if contents is None:
+            contents = PygnataContents()
+        create_entries = partial(self.create_entries, tree=tree,
+                                 contents=contents, report=report)
+
+        #The folders to fill for the current level, with their node, a
+        #flag telling if the folder was just created and their logged path
+        level = [(path(root_path), -1, False, path(shown_path or root_path))]
+
+        with profiler.phase('processor.create_tree'):
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                while level:
+                    next_level = []
+                    #Fill each folder of the level and get their sub folders
+                    for sub_dirs in pool.map(create_entries, level):
+                        next_level.extend(sub_dirs)
+                    level = next_level
+                    profiler.count('processor.levels')
+
+    def create_entries(self, job, tree, contents=None, report=None):
+        """
+            Create the direct children of a folder. Entries are created
+            relatively to a file descriptor of the folder, so the kernel
+            does not resolve the whole path for each of them.
+
+            In sync mode, the folder is listed once and only the missing
+            entries are created. A folder created by the sync is known
+            to be empty, it is not listed.
+
+            :param job: The folder path, its node in the tree, if the
+                        folder was just created and its logged path
+            :param tree: The TREE part
+            :param contents: Writes the content of the files
+            :param report: Collects the entries in sync mode
+
+            :type job: tuple
+            :type tree: PygnataTree
+            :type contents: PygnataContents
+            :type report: PygnataSyncReport
 
-    def create_tree(self, root_path, tree_lst):
+            :return: The sub folders to fill with their children
+            :rtype: list
         """
-            Generate a folder tree recurcively
+        root, node, fresh, shown = job
+        sub_dirs = []
+        nb_dirs = 0
+        nb_files = 0
+        created = []
+        existing = []
+        conflicts = []
+
+        #An empty folder is written "- folder:" or "- folder: []"
+        children = list(tree.children(node))
+        if not children:
+            return sub_dirs
+
+        dir_fd = os.open(root, DIR_FLAGS) if HAS_DIR_FD else None
+        try:
+            #Associate the names in the folder to their type, in sync mode
+            entries = None
+            if report is not None:
+                entries = {} if fresh else self.list_entries(root, dir_fd)
+
+            #Browse the children of the folder
+            for child in children:
+                key = tree.name(child)
+                new_path = root / key
+                is_file = not tree.is_dir(child)
+
+                #Keep what is already in the folder
+                if entries is not None and key in entries:
+                    if entries[key] == is_file:
+                        conflicts.append(new_path)
+                    else:
+                        existing.append(new_path)
+                        if not is_file:
+                            sub_dirs.append((new_path, child, False,
+                                             shown / key))
+                    continue
+
+                spec = tree.content(child)
+                if spec is not None:
+                    #A file with a content
+                    self.make_file(root, key, dir_fd, spec,
+                                   contents or PygnataContents())
+                    nb_files += 1
+                    logger.info("New file {}".format(shown / key))
+                elif is_file:
+                    self.make_file(root, key, dir_fd)
+                    nb_files += 1
+                    logger.info("New file {}".format(shown / key))
+                else:
+                    #Create the new folder
+                    self.make_dir(root, key, dir_fd)
+                    nb_dirs += 1
+                    logger.info("New dir  {}".format(shown / key))
+                    sub_dirs.append((new_path, child, True, shown / key))
+
+                if entries is not None:
+                    entries[key] = not is_file
+                    created.append(new_path)
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+
+        if report is not None:
+            report.extend(created, existing, conflicts)
+
+        if profiler.enabled:
+            profiler.count('fs.open_dir')
+            profiler.count('fs.mkdir', nb_dirs)
+            profiler.count('fs.create_file', nb_files)
+        return sub_dirs
+
+    def create_stream(self, root_path, stream, contents=None, report=None,
+                      shown_path=None):
+        """
+            Create a tree while it is parsed. The nodes come in pre-order,
+            the entries of each folder are gathered and handed by batches
+            to the pool of threads once the folder exists, so the first
+            folders are filled while the rest of the tree is parsed.
 
             :param root_path: The path use to generate the tree
-            :param tree_array: The list containing the TREE part informations
+            :param stream: The stream of the TREE part
+            :param contents: Writes the content of the files
+            :param report: Collects the entries in sync mode, None to
+                           create all the entries
+            :param shown_path: The path of the tree in the logs, root_path
+                               by default
 
             :type root_path: string
-            :type tree_array: list
-
-        """
-        root = path(root_path)
-
-        #Browse the tree array
-        for value in tree_lst:
-            #if it is a dict
-            if isinstance(value, dict):
-                for key, value in list(value.items()):
-                    #Create the new root Path
-                    new_path = root / key
-                    new_path.mkdir()
-                    logger.info("New dir  {}".format(new_path))
-                    #Call the function recursively
-                    self.create_tree(new_path, value)
-            #If not a dict, create the file
+            :type stream: PygnataTreeStream
+            :type contents: PygnataContents
+            :type report: PygnataSyncReport
+            :type shown_path: string
+        """
+        if contents is None:
+            contents = PygnataContents()
+        root = PygnataStreamFolder(path(root_path), False,
+                                   path(shown_path or root_path))
+        root.ready.set_result(None)
+
+        #The open folders with their node, and the batches not created
+        stack = [(-1, root)]
+        jobs = deque()
+
+        with profiler.phase('processor.create_stream'):
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                hand = partial(self.hand_batch, pool, jobs, contents, report)
+                try:
+                    for index, parent, kind, name, spec in stream:
+                        while stack[-1][0] != parent:
+                            hand(stack.pop()[1])
+                        folder = stack[-1][1]
+
+                        child = None
+                        if kind & KIND_MASK == DIR:
+                            child = PygnataStreamFolder(
+                                folder.path / name, shown=folder.shown / name)
+                            stack.append((index, child))
+                        folder.pending.append((name, spec, child))
+
+                        #A folder is created before its entries are handed
+                        if child is not None or len(folder.pending) >= \
+                                stream.batch:
+                            hand(folder)
+
+                        #Do not parse too far ahead of the disk
+                        while len(jobs) > stream.queue_size:
+                            jobs.popleft().result()
+
+                    for _, folder in stack:
+                        hand(folder)
+                finally:
+                    wait(jobs)
+
+        for job in jobs:
+            job.result()
+
+    def hand_batch(self, pool, jobs, contents, report, folder):
+        """
+            Hand the pending entries of a folder to the pool of threads,
+            they are created once the folder exists. In sync mode, they
+            are also created after the previous batches of the folder.
+
+            :param pool: The pool of threads
+            :param jobs: The batches not created yet
+            :param contents: Writes the content of the files
+            :param report: Collects the entries in sync mode
+            :param folder: The folder
+
+            :type pool: ThreadPoolExecutor
+            :type jobs: deque
+            :type contents: PygnataContents
+            :type report: PygnataSyncReport
+            :type folder: PygnataStreamFolder
+        """
+        if not folder.pending:
+            return
+        batch, folder.pending = folder.pending, []
+        previous, done = folder.last, Future()
+        if report is not None:
+            #The first batch lists the folder, the next ones wait for it
+            folder.last = done
+        jobs.append(done)
+
+        def submit(_):
+            pool.submit(self.create_batch, folder, batch, previous, done,
+                        contents, report)
+        previous.add_done_callback(submit)
+
+    def create_batch(self, folder, batch, previous, done, contents=None,
+                     report=None):
+        """
+            Create a batch of entries of a folder of a stream. The sub
+            folders are marked as created, existing or skipped after a
+            conflict, so their own batches can start.
+
+            :param folder: The folder
+            :param batch: The name, content and folder of each entry
+            :param previous: Done once the folder is created, and its
+                             previous batches in sync mode
+            :param done: Done once the batch is created
+            :param contents: Writes the content of the files
+            :param report: Collects the entries in sync mode
+
+            :type folder: PygnataStreamFolder
+            :type batch: list
+            :type previous: Future
+            :type done: Future
+            :type contents: PygnataContents
+            :type report: PygnataSyncReport
+        """
+        nb_dirs = 0
+        nb_files = 0
+        created = []
+        existing = []
+        conflicts = []
+        dir_fd = None
+        try:
+            #A failure stops the entries depending on it
+            previous.result()
+
+            if folder.skipped:
+                #The entries of a conflicting folder are not created
+                for _, _, child in batch:
+                    if child is not None:
+                        child.skipped = True
+                        child.ready.set_result(None)
+                done.set_result(None)
+                return
+
+            root = folder.path
+            if HAS_DIR_FD:
+                dir_fd = os.open(root, DIR_FLAGS)
+            if report is not None and folder.entries is None:
+                folder.entries = ({} if folder.fresh
+                                  else self.list_entries(root, dir_fd))
+            entries = folder.entries
+
+            for name, spec, child in batch:
+                new_path = root / name
+                is_dir = child is not None
+
+                #Keep what is already in the folder
+                if entries is not None and name in entries:
+                    if entries[name] != is_dir:
+                        conflicts.append(new_path)
+                        if is_dir:
+                            child.skipped = True
+                    else:
+                        existing.append(new_path)
+                        if is_dir:
+                            child.fresh = False
+                    if is_dir:
+                        child.ready.set_result(None)
+                    continue
+
+                if spec is not None:
+                    #A file with a content
+                    self.make_file(root, name, dir_fd, spec, contents)
+                    nb_files += 1
+                    logger.info("New file {}".format(folder.shown / name))
+                elif not is_dir:
+                    self.make_file(root, name, dir_fd)
+                    nb_files += 1
+                    logger.info("New file {}".format(folder.shown / name))
+                else:
+                    #Create the new folder, its batches can start
+                    self.make_dir(root, name, dir_fd)
+                    nb_dirs += 1
+                    logger.info("New dir  {}".format(folder.shown / name))
+                    child.ready.set_result(None)
+
+                if entries is not None:
+                    entries[name] = is_dir
+                    created.append(new_path)
+        except BaseException as e:
+            for _, _, child in batch:
+                if child is not None and not child.ready.done():
+                    child.ready.set_exception(e)
+            done.set_exception(e)
+            return
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+            if report is not None:
+                report.extend(created, existing, conflicts)
+
+        if profiler.enabled:
+            profiler.count('fs.open_dir')
+            profiler.count('fs.mkdir', nb_dirs)
+            profiler.count('fs.create_file', nb_files)
+        done.set_result(None)
+
+    @staticmethod
+    def list_entries(root, dir_fd=None):
+        """
+            List a folder with a single scandir
+
+            :param root: The folder
+            :param dir_fd: An open file descriptor of root
+
+            :type root: Path
+            :type dir_fd: int
+
+            :return: Associate the name of each entry to True for a folder
+            :rtype: dict
+        """
+        if dir_fd is not None and os.scandir in os.supports_fd:
+            target = dir_fd
+        else:
+            target = root
+
+        with os.scandir(target) as iterator:
+            entries = dict((entry.name, entry.is_dir()) for entry in iterator)
+        profiler.count('fs.scandir')
+        return entries
+
+    @staticmethod
+    def make_dir(root, name, dir_fd=None):
+        """
+            Create a folder in root
+
+            :param root: The parent folder
+            :param name: The name of the new folder
+            :param dir_fd: An open file descriptor of root
+
+            :type root: Path
+            :type name: string
+            :type dir_fd: int
+        """
+        if dir_fd is None:
+            os.mkdir(root / name)
+        else:
+            os.mkdir(name, dir_fd=dir_fd)
+
+    @staticmethod
+    def make_file(root, name, dir_fd=None, spec=None, contents=None):
+        """
+            Create an empty file in root, or update its times if it exists.
+            With a content, the file is written again.
+
+            :param root: The parent folder
+            :param name: The name of the new file
+            :param dir_fd: An open file descriptor of root
+            :param spec: The mapping describing the content of the file
+            :param contents: Writes the content of the file
+
+            :type root: Path
+            :type name: string
+            :type dir_fd: int
+            :type spec: dict
+            :type contents: PygnataContents
+        """
+        flags = FILE_FLAGS if spec is None else WRITE_FLAGS
+        if dir_fd is None:
+            file_fd = os.open(root / name, flags, 0o666)
+        else:
+            file_fd = os.open(name, flags, 0o666, dir_fd=dir_fd)
+        try:
+            if spec is None:
+                os.utime(file_fd)
             else:
-                new_file = root / value
-                new_file.touch()
-                logger.info("New file {}".format(new_file))
+                contents.write(file_fd, name, spec)
+        finally:
+            os.close(file_fd)
+
+
+class PygnataStreamFolder(object):
+    """
+        A folder of a tree created while it is parsed, with its entries
+        not handed yet and the last work its next batch waits for
+    """
+    def __init__(self, dir_path, fresh=True, shown=None):
+        self.path = dir_path
+        #The path of the folder in the logs
+        self.shown = dir_path if shown is None else shown
+        #If the folder was just created, it is known to be empty
+        self.fresh = fresh
+        #If the folder is in conflict, its entries are not created
+        self.skipped = False
+        #The entries on the disk in sync mode, listed by the first batch
+        self.entries = None
+
+        #Done once the folder exists, then the last batch handed in sync
+        #mode
+        self.ready = Future()
+        self.last = self.ready
+        self.pending = []
+
+
+class PygnataSyncReport(object):
+    """
+        Class used to collect the entries of a tree applied in sync
+        mode: the created ones, the existing ones and the conflicts,
+        where a file of the tree is a folder on the disk or the reverse.
+    """
+    CREATED = 'created'
+    EXISTING = 'existing'
+    CONFLICTS = 'conflicts'
+
+    def __init__(self):
+        self.entries = {PygnataSyncReport.CREATED: [],
+                        PygnataSyncReport.EXISTING: [],
+                        PygnataSyncReport.CONFLICTS: []}
+        self.lock = threading.Lock()
+
+    def extend(self, created, existing, conflicts):
+        """
+            Add the entries of a folder
+
+            :param created: The paths of the created entries
+            :param existing: The paths of the existing entries
+            :param conflicts: The paths of the conflicting entries
+
+            :type created: list
+            :type existing: list
+            :type conflicts: list
+        """
+        with self.lock:
+            self.entries[PygnataSyncReport.CREATED].extend(
+                str(entry) for entry in created)
+            self.entries[PygnataSyncReport.EXISTING].extend(
+                str(entry) for entry in existing)
+            self.entries[PygnataSyncReport.CONFLICTS].extend(
+                str(entry) for entry in conflicts)
+
+    def counts(self):
+        """
+            Count the entries of each kind
+
+            :return: Associate a kind to its number of entries
+            :rtype: dict
+        """
+        with self.lock:
+            return dict((kind, len(entries))
+                        for kind, entries in self.entries.items())
+
+    def summary(self):
+        """
+            Format the counts and the conflicts
+
+            :return: The summary
+            :rtype: string
+        """
+        counts = self.counts()
+        lines = ["{} created, {} existing, {} conflicts".format(
+            counts[PygnataSyncReport.CREATED],
+            counts[PygnataSyncReport.EXISTING],
+            counts[PygnataSyncReport.CONFLICTS])]
+        for entry in sorted(self.entries[PygnataSyncReport.CONFLICTS]):
+            lines.append("conflict {}".format(entry))
+        return "\n".join(lines)
+
+    def save(self, dest_path):
+        """
+            Write the entries in a JSON file
+
+            :param dest_path: The path of the JSON file
+
+            :type dest_path: string
+        """
+        with self.lock:
+            report = dict((kind, sorted(entries))
+                          for kind, entries in self.entries.items())
+        with open(dest_path, 'w') as fd:
+            json.dump(report, fd, indent=2, sort_keys=True)
+
+
+class PygnataPlan(object):
+    """
+        Class used to tell what an install would do: the number of
+        folders and files created, the entries already on the disk, the
+        conflicts, the depth of the tree and an estimate of the system
+        calls. An install without sync fails on an existing folder or a
+        conflict.
+    """
+    #Estimated system calls of each operation of an install
+    OPEN_DIR = 2
+    MKDIR = 1
+    CREATE_FILE = 3
+    SCANDIR = 3
+
+    def __init__(self, sync=False):
+        self.sync = sync
+        self.nb_dirs = 0
+        self.nb_files = 0
+        #Folders receiving entries, each one is opened by the install
+        self.nb_filled = 0
+        #Folders on the disk listed by the plan
+        self.nb_listed = 0
+        self.existing = []
+        self.nb_existing_dirs = 0
+        self.conflicts = []
+        self.depth = 0
+        self.lock = threading.Lock()
+
+    def add(self, nb_dirs, nb_files, nb_filled, existing, conflicts,
+            nb_existing_dirs=0):
+        """
+            Add the counts and the entries of a folder on the disk
+
+            :param nb_dirs: The number of new folders, with their subtree
+            :param nb_files: The number of new files, with their subtree
+            :param nb_filled: The number of new folders having children
+            :param existing: The paths of the existing entries
+            :param conflicts: The paths of the conflicting entries
+            :param nb_existing_dirs: The number of existing folders
+
+            :type nb_dirs: int
+            :type nb_files: int
+            :type nb_filled: int
+            :type existing: list
+            :type conflicts: list
+            :type nb_existing_dirs: int
+        """
+        with self.lock:
+            self.nb_dirs += nb_dirs
+            self.nb_files += nb_files
+            #The folder itself is opened to fill it
+            self.nb_filled += nb_filled + 1
+            self.nb_listed += 1
+            self.existing.extend(str(entry) for entry in existing)
+            self.nb_existing_dirs += nb_existing_dirs
+            self.conflicts.extend(str(entry) for entry in conflicts)
+
+    def syscalls(self):
+        """
+            Estimate the system calls of the install
+
+            :return: The number of system calls
+            :rtype: int
+        """
+        nb_syscalls = (self.nb_filled * PygnataPlan.OPEN_DIR +
+                       self.nb_dirs * PygnataPlan.MKDIR +
+                       self.nb_files * PygnataPlan.CREATE_FILE)
+        if self.sync:
+            #The folders already on the disk are listed
+            nb_syscalls += self.nb_listed * PygnataPlan.SCANDIR
+        return nb_syscalls
+
+    def will_fail(self):
+        """
+            Check if the install would stop on an entry of the disk
+
+            :return: If an existing folder or a conflict stops the install
+            :rtype: bool
+        """
+        if self.sync:
+            return False
+        return bool(self.conflicts or self.nb_existing_dirs)
+
+    def summary(self):
+        """
+            Format the counts and the conflicts
+
+            :return: The summary
+            :rtype: string
+        """
+        with self.lock:
+            lines = ["{} folders and {} files to create, {} existing, {} "
+                     "conflicts, depth {}, about {} system calls".format(
+                         self.nb_dirs, self.nb_files, len(self.existing),
+                         len(self.conflicts), self.depth, self.syscalls())]
+            for entry in sorted(self.conflicts):
+                lines.append("conflict {}".format(entry))
+        if self.will_fail():
+            lines.append("The install would stop on the existing entries, "
+                         "--sync creates only the missing ones")
+        return "\n".join(lines)
+
+    def save(self, dest_path):
+        """
+            Write the plan in a JSON file
+
+            :param dest_path: The path of the JSON file
+
+            :type dest_path: string
+        """
+        with self.lock:
+            report = {'sync': self.sync, 'folders': self.nb_dirs,
+                      'files': self.nb_files, 'depth': self.depth,
+                      'syscalls': self.syscalls(),
+                      PygnataSyncReport.EXISTING: sorted(self.existing),
+                      PygnataSyncReport.CONFLICTS: sorted(self.conflicts)}
+        with open(dest_path, 'w') as fd:
+            json.dump(report, fd, indent=2, sort_keys=True)
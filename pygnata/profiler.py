@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import json
+import time
+import threading
+
+
+class NullPhase(object):
+    """
+        Phase used when the profiler is disabled, it does nothing
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class PygnataPhase(object):
+    """
+        Context manager timing a phase of the profiler
+    """
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class PygnataProfiler(object):
+    """
+        Class used to record the time of each phase of pygnata and the
+        number of nodes and filesystem operations. When it is disabled,
+        phase() returns a shared no-op context and the counters should be
+        guarded by the enabled attribute, so the cost is close to nothing.
+    """
+    #The phase used when the profiler is disabled
+    null_phase = NullPhase()
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+            Remove the recorded timings and counters
+        """
+        with self.lock:
+            #Associate a phase name to its [calls, total time]
+            self.timings = {}
+            #Associate a counter name to its value
+            self.counters = {}
+
+    def enable(self):
+        """
+            Start recording
+        """
+        self.enabled = True
+
+    def disable(self):
+        """
+            Stop recording
+        """
+        self.enabled = False
+
+    def phase(self, name):
+        """
+            Get a context manager timing a phase
+
+            :param name: The name of the phase
+
+            :type name: string
+
+            :return: The context manager
+            :rtype: PygnataPhase
+        """
+        if not self.enabled:
+            return PygnataProfiler.null_phase
+        return PygnataPhase(self, name)
+
+    def add_time(self, name, duration):
+        """
+            Add the duration of a call to a phase
+
+            :param name: The name of the phase
+            :param duration: The duration in seconds
+
+            :type name: string
+            :type duration: float
+        """
+        with self.lock:
+            timing = self.timings.setdefault(name, [0, 0.0])
+            timing[0] += 1
+            timing[1] += duration
+
+    def count(self, name, value=1):
+        """
+            Increment a counter
+
+            :param name: The name of the counter
+            :param value: The value to add
+
+            :type name: string
+            :type value: int
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        """
+            Get the recorded timings and counters
+
+            :return: The phases and counters
+            :rtype: dict
+        """
+        with self.lock:
+            phases = dict((name, {'calls': calls, 'time': duration})
+                          for name, (calls, duration) in self.timings.items())
+            return {'phases': phases, 'counters': dict(self.counters)}
+
+    def summary(self):
+        """
+            Format the recorded timings and counters in a table
+
+            :return: The table
+            :rtype: string
+        """
+        report = self.report()
+        lines = ["{:<28} {:>8} {:>12}".format("PHASE", "CALLS", "TIME (s)")]
+        for name, timing in sorted(report['phases'].items()):
+            lines.append("{:<28} {:>8} {:>12.6f}".format(name, timing['calls'],
+                                                         timing['time']))
+        lines.append("")
+        lines.append("{:<28} {:>21}".format("COUNTER", "VALUE"))
+        for name, value in sorted(report['counters'].items()):
+            lines.append("{:<28} {:>21}".format(name, value))
+        return "\n".join(lines)
+
+    def save(self, dest_path):
+        """
+            Write the recorded timings and counters in a JSON file
+
+            :param dest_path: The path of the JSON file
+
+            :type dest_path: string
+        """
+        with open(dest_path, 'w') as fd:
+            json.dump(self.report(), fd, indent=2, sort_keys=True)
+
+
+#The profiler shared by the pygnata components
+profiler = PygnataProfiler()
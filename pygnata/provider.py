@@ -4,17 +4,15 @@
 #Copyright (c) 2015 Alexandre LM, Dimitri S
 
 import os.path
+import time
 import shutil
-
-try:
-    import urllib.request
-except ImportError:
-    import urllib
+import hashlib
 
 from .exception import ProviderError
 from .logger import logger
 from .config.config import pygconfig
-from .logger import logger
+from .profiler import profiler
+from .downloader import PygnataDownloader
 from path import path
 
 
@@ -28,6 +26,8 @@ class PygnataProvider(object):
     Pygnata_tmp_path = path(pygconfig.get('PROVIDER', 'TmpAppDir')).expand()
     #Extension of the Pygnata files
     extension = pygconfig.get('PROVIDER', 'Extension')
+    #Extension of the packed Pygnata files
+    pack_extension = pygconfig.get('PACK', 'Extension')
 
     #Get the values for providing methods
     DATABASE = pygconfig.get('PROVIDER', 'Database')
@@ -44,6 +44,14 @@ class PygnataProvider(object):
         if not os.path.isdir(PygnataProvider.Pygnata_tmp_path):
             os.makedirs(PygnataProvider.Pygnata_tmp_path)
 
+        #Download the remote .pyg files
+        self.downloader = PygnataDownloader()
+
+        #Index of the local folder, opened on the first need
+        self.index = None
+        #Database of templates, opened on the first need
+        self.database = None
+
     def search(self, provide_type, value):
         """
             Launch the proper providing function to retrieve a .pyg file.
@@ -70,7 +78,8 @@ class PygnataProvider(object):
             provide_type = PygnataProvider.CURRENT
 
         #Call the proper method
-        return methods[provide_type](value)
+        with profiler.phase('provider.search'):
+            return methods[provide_type](value)
 
     def search_current(self, value):
         """
@@ -83,25 +92,19 @@ class PygnataProvider(object):
             :return: The absolute path of the .pyg file
             :rtype:  Path
         """
-        #Set the filename
-        file_name = value
-
-        #Check if the value arg don't end with .Pygnata
-        if not value.endswith(PygnataProvider.extension):
-            file_name = file_name + PygnataProvider.extension
-
         #Check if the file exist in the current directory
         current_folder = path.getcwd()
-        local_pyg_files = os.listdir(current_folder)
-        if file_name in local_pyg_files:
-            return os.path.abspath(current_folder / path(file_name))
-        else:
-            #Search in the .pygnata folder
-            return self.search_local(value)
+        for file_name in self.file_names(value):
+            profiler.count('fs.stat')
+            if os.path.isfile(current_folder / path(file_name)):
+                return os.path.abspath(current_folder / path(file_name))
+
+        #Search in the .pygnata folder
+        return self.search_local(value)
 
     def search_database(self, value):
         """
-            Search a file in an online database
+            Search a file in the database, by name or by keywords
 
             :param value: The value use to search the file
 
@@ -109,12 +112,25 @@ class PygnataProvider(object):
 
             :return: The absolute path of the .pyg file
             :rtype:  Path
-
-            .. warnings:: Function not implemented yet
         """
-        logger.debug(("my value arg {}".format(value)))
-        #SOOOON!
-        pass
+        if not value:
+            raise ProviderError("No template name or keywords provided")
+
+        file_path = self.template_database().materialize(
+            value, PygnataProvider.Pygnata_tmp_path)
+        if file_path is None:
+            raise ProviderError("No template matches {}".format(value))
+
+        #Written with a metadata file like a download, so the cache
+        #commands evict and clear it
+        if self.downloader.read_meta(file_path) is None:
+            self.downloader.write_meta(file_path, {'database': value,
+                                                   'checked': time.time()})
+        self.downloader.touch(file_path)
+        self.downloader.evict(PygnataProvider.Pygnata_tmp_path, [file_path])
+
+        #return the abs path of the written file
+        return os.path.abspath(file_path)
 
     def search_local(self, value):
         """
@@ -127,22 +143,36 @@ class PygnataProvider(object):
             :return: The absolute path of the .pyg file
             :rtype:  Path
         """
-        #Set the filename
-        file_name = value
-
-        #Check if the value arg don't end with .Pygnata
-        if not value.endswith(PygnataProvider.extension):
-            file_name = file_name + PygnataProvider.extension
-
         #Check if the file exist in the .pygnata folder
-        if not file_name in os.listdir(PygnataProvider.Pygnata_local_path):
-            #We search for a path if local failed
-            return self.search_path(value)
-        else:
+        for file_name in self.file_names(value):
             #Set the path
             file_path = PygnataProvider.Pygnata_local_path / path(file_name)
-            #return the absolute path and the neighbors files path
-            return os.path.abspath(file_path)
+            profiler.count('fs.stat')
+            if os.path.isfile(file_path):
+                #return the absolute path and the neighbors files path
+                return os.path.abspath(file_path)
+
+        #We search for a path if local failed
+        return self.search_path(value)
+
+    @staticmethod
+    def file_names(value):
+        """
+            Get the file names a value can designate, a name without
+            extension is a .pyg file or else a packed file
+
+            :param value: The value use to search the file
+
+            :type value: string
+
+            :return: The file names to try, in order
+            :rtype: list
+        """
+        if value.endswith((PygnataProvider.extension,
+                           PygnataProvider.pack_extension)):
+            return [value]
+        return [value + PygnataProvider.extension,
+                value + PygnataProvider.pack_extension]
 
     def search_path(self, value):
         """
@@ -158,7 +188,8 @@ class PygnataProvider(object):
         #Use os.path.expanduser to avoid ~
         file_path = path(value).expanduser()
         #Check the file extension
-        if not file_path.endswith(PygnataProvider.extension):
+        if not file_path.endswith((PygnataProvider.extension,
+                                   PygnataProvider.pack_extension)):
             raise ProviderError("Not a .pyg file")
 
         #Test if the path exist
@@ -178,47 +209,132 @@ class PygnataProvider(object):
 
             :return: The absolute path of the .pyg file
             :rtype:  Path
-
-            .. warnings:: Function not fully tested and functionnal
         """
         if not value:
             raise ProviderError("No URL provided")
 
-        #Set the filenames
-        original_name = value.split('/')[-1]
-        file_name = original_name.split('.')[0] + PygnataProvider.extension
-        tmp_filename = PygnataProvider.Pygnata_tmp_path + file_name + ".tmp"
-        #final_filename = PygnataProvider.Pygnata_local_path + file_name
-
-        #Open the URL
-        response = urllib.request.urlopen(value)
-        #Open the file
-        with open(tmp_filename, 'wb') as fd:
-            #get the file size
-            file_size = int(response.getheader("Content-Length"))
-            logger.info("Downloading: {}({} b)".format(tmp_filename, file_size))
-            file_size_dl = 0
-            block_sz = 8192
-            while True:
-                file_buffer = response.read(block_sz)
-                #If nothing to read
-                if not file_buffer:
-                    break
-                #Copy data in the buffer
-                file_size_dl += len(file_buffer)
-                #Copy the buffer in the file
-                fd.write(file_buffer)
-                #Calculate the ddl percent
-                ddl_percent = (file_size_dl / file_size) * 100
-                status = r"%10d [%3.2f%%]" % (file_size_dl, ddl_percent)
-                print(status)
-
-        #If the file is ok, we put in .Pygnata file
-        #os.rename(tmp_filename, final_filename)
+        tmp_filename = self.url_path(value)
+        try:
+            self.downloader.fetch(value, tmp_filename)
+        except Exception as e:
+            raise ProviderError("Cannot download {}: {}".format(value, e))
+        finally:
+            self.downloader.evict(PygnataProvider.Pygnata_tmp_path,
+                                  [tmp_filename])
 
         #return the abs path of the tmp file
         return os.path.abspath(tmp_filename)
 
+    def search_urls(self, values):
+        """
+            Download several PygnataFiles concurrently
+
+            :param values: The URLs of the files
+
+            :type values: list
+
+            :return: The absolute path or the error of each file
+            :rtype: list
+        """
+        downloads = [(value, self.url_path(value)) for value in values]
+        results = self.downloader.fetch_many(downloads)
+        self.downloader.evict(PygnataProvider.Pygnata_tmp_path,
+                              [dest_path for _, dest_path in downloads])
+
+        paths = []
+        for value, result in zip(values, results):
+            if isinstance(result, Exception):
+                result = ProviderError("Cannot download {}: {}".format(value,
+                                                                       result))
+            else:
+                result = os.path.abspath(result)
+            paths.append(result)
+        return paths
+
+    def url_path(self, value):
+        """
+            Get the local path of a downloaded PygnataFile, the hash of
+            the URL avoids a clash between files with the same name
+
+            :param value: The URL of the file
+
+            :type value: string
+
+            :return: The path in the tmp folder
+            :rtype: Path
+        """
+        #Set the filenames
+        original_name = value.split('?')[0].rstrip('/').split('/')[-1]
+        url_hash = hashlib.sha1(value.encode('utf-8')).hexdigest()[:12]
+        file_name = "{}-{}{}".format(original_name.split('.')[0] or 'file',
+                                     url_hash, PygnataProvider.extension)
+        return PygnataProvider.Pygnata_tmp_path / file_name
+
+    def source_dir(self, file_path):
+        """
+            Get the folder of the source and template files of a .pyg
+            file. A downloaded file or a file of the database has its own
+            folder, so it cannot read the other files of the tmp folder.
+
+            :param file_path: The path of the .pyg file
+
+            :type file_path: string
+
+            :return: The path of the folder
+            :rtype: string
+        """
+        folder = os.path.dirname(os.path.abspath(file_path))
+        if os.path.realpath(folder) != os.path.realpath(
+                PygnataProvider.Pygnata_tmp_path):
+            return folder
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(folder, name)
+
+    def local_index(self):
+        """
+            Get the index of the .pygnata folder
+
+            :return: The index
+            :rtype: PygnataIndex
+        """
+        if self.index is None:
+            #sqlite is imported only when the index is used
+            from .index import PygnataIndex
+            self.index = PygnataIndex(PygnataProvider.Pygnata_local_path)
+        return self.index
+
+    def template_database(self):
+        """
+            Get the database of templates
+
+            :return: The database
+            :rtype: PygnataDatabase
+        """
+        if self.database is None:
+            #sqlite is imported only when the database is used
+            from .database import PygnataDatabase
+            self.database = PygnataDatabase()
+        return self.database
+
+    def list_local(self, author=None, title=None, version=None):
+        """
+            List the .pyg files of the .pygnata folder
+
+            :param author: Filter on the author
+            :param title: Filter on the title
+            :param version: Filter on the version
+
+            :type author: string
+            :type title: string
+            :type version: string
+
+            :return: The matching entries of the index
+            :rtype: list
+        """
+        index = self.local_index()
+        index.sync()
+        return index.search(author, title, version)
+
     def put_to_local(self, absolute_path, name=None):
         """
             Put a copy of a .pyg file in the .pygnata folder
@@ -237,13 +353,17 @@ class PygnataProvider(object):
         local_path = PygnataProvider.Pygnata_local_path
         #Set the original filename
         file_name = absolute_path.split("/")[-1]
+        #A packed file keeps its extension
+        extension = PygnataProvider.extension
+        if file_name.endswith(PygnataProvider.pack_extension):
+            extension = PygnataProvider.pack_extension
         #If there is a custom name
         if name:
             #If the extension is here
-            if name.endswith(PygnataProvider.extension):
+            if name.endswith(extension):
                 file_name = name
             else:
-                file_name = name + PygnataProvider.extension
+                file_name = name + extension
         #Set the destination path
         dest = local_path / path(file_name)
 
@@ -252,15 +372,20 @@ class PygnataProvider(object):
             logger.info("File already exist in {}, replace? (Y/n)".format(local_path))
             value = str(input())
 
-            while value is not "Y" and value is not "n":
+            while value != "Y" and value != "n":
                 logger.info("File already exist in {}, replace? (Y/n)".format(local_path))
                 value = str(input())
 
-            if value is "Y":
-                #copy the src to dest
-                shutil.copy2(absolute_path, dest)
-                #return the absolute path
-                return os.path.abspath(dest)
-
-        logger.info("Copy in {} folder abort!".format(local_path))
-        return absolute_path
+            if value != "Y":
+                logger.info("Copy in {} folder abort!".format(local_path))
+                return absolute_path
+
+        #copy the src to dest
+        shutil.copy2(absolute_path, dest)
+        #Add the file to the index
+        try:
+            self.local_index().update(dest)
+        except Exception as e:
+            logger.debug("Cannot index {} ({})".format(dest, e))
+        #return the absolute path
+        return os.path.abspath(dest)
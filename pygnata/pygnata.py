@@ -6,50 +6,124 @@
 """That script.
 Usage:
   pygnata (-h|--help)
-  pygnata [-l <value> | --local <value>]
-  pygnata [-u <value> | --url <value>]
-  pygnata [-d <value> | --database <value>]
-  pygnata <src>
-  pygnata create <src> [<dest>] [--ignore ... | -i ...] [-o <filename> | --output <filename>]
-  pygnata show <src>
-  pygnata show [-l <value> | --local <value>]
-  pygnata show [-u <value> | --url <value>]
-  pygnata show [-d <value> | --database <value>]
-  pygnata save <src> [<dest>]
-  pygnata save [-l <value> | --local <value>] [<dest>]
-  pygnata save [-u <value> | --url <value>] [<dest>]
-  pygnata save [-d <value> | --database <value>] [<dest>]
+  pygnata --version
+  pygnata [-l <value> | --local <value>] [--var <pair>]... [--vars <file>] [--no-input] [-j <jobs> | --jobs <jobs>]
+          [--sync] [--plan] [--atomic] [--stream] [--report <file>]
+          [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata [-u <value> | --url <value>] [--var <pair>]... [--vars <file>] [--no-input] [-j <jobs> | --jobs <jobs>]
+          [--sync] [--plan] [--atomic] [--stream] [--report <file>]
+          [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata [-d <value> | --database <value>] [--var <pair>]... [--vars <file>] [--no-input] [-j <jobs> | --jobs <jobs>]
+          [--sync] [--plan] [--atomic] [--stream] [--report <file>]
+          [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata <src> [--var <pair>]... [--vars <file>] [--no-input] [-j <jobs> | --jobs <jobs>]
+          [--sync] [--plan] [--atomic] [--stream] [--report <file>]
+          [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata list [--author <author>] [--title <title>] [--template-version <version>]
+          [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata create <src> [<dest>] [--ignore ... | -i ...] [--exclude <rules> | -x <rules>]
+          [-o <filename> | --output <filename>] [-j <jobs> | --jobs <jobs>] [--contents] [--rescan]
+          [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata show <src> [--depth <n>] [--max-entries <n>] [--summary | --json]
+          [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata show [-l <value> | --local <value>] [--depth <n>] [--max-entries <n>] [--summary | --json]
+          [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata show [-u <value> | --url <value>] [--depth <n>] [--max-entries <n>] [--summary | --json]
+          [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata show [-d <value> | --database <value>] [--depth <n>] [--max-entries <n>] [--summary | --json]
+          [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata save <src> [<dest>] [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata save [-l <value> | --local <value>] [<dest>] [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata save [-u <value> | --url <value>] [<dest>] [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata save [-d <value> | --database <value>] [<dest>] [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata batch <manifest> [--var <pair>]... [--vars <file>] [-j <jobs> | --jobs <jobs>]
+          [--sync] [--atomic] [--stream] [--report <file>] [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata pack <src> [<dest>] [--compress] [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata unpack <src> [<dest>] [--profile] [--profile-output <file>] [--cprofile <file>]
+  pygnata cache clear
+  pygnata import <folder> [--profile] [--profile-output <file>] [--cprofile <file>]
 
 Options:
   -h --help  Show this help message and exit
+  --version  Show the version and the YAML backend in use
   -o <filename>, --output <filename>  Specify an output name for .pyg file
   -u <url>, --url <url>  Get .pyg file from URL.
   -d <filename>, --database <filename>  Get .pyg file from the database.
   -i ..., --ignore ... Files/folders to ignore when creating .pyg file
+  -x <rules>, --exclude <rules>  Ignore rules in the .gitignore syntax, comma separated
+  -j <jobs>, --jobs <jobs>  Number of threads used to scan or create the tree
+  --rescan  Scan the whole folder, without the listings of the last build
+  --contents  Copy the non empty files next to the built .pyg file
+  --compress  Compress the source in the packed file
+  --profile  Print the time of each phase and the operation counts
+  --profile-output <file>  Write the profiling report in a JSON file
+  --cprofile <file>  Dump the cProfile statistics of the command in a file
+  --report <file>  Write the batch, sync or plan report in a JSON file
+  --sync  Create only the missing entries of an existing tree
+  --plan  Tell what the install would do, without writing anything
+  --atomic  Build the tree in a hidden folder and move it once complete,
+            one rename for each top level entry
+  --stream  Create the tree while it is parsed, always done when atomic
+  --var <pair>  Value of a VAR part field, as key=value
+  --vars <file>  JSON/YAML file with the values of the VAR part fields
+  --no-input  Fail instead of asking the missing VAR part values
+  --author <author>  List the templates whose author contains the value
+  --title <title>  List the templates whose title contains the value
+  --template-version <version>  List the templates of a version
+  --depth <n>  Number of tree levels shown
+  --max-entries <n>  Number of tree entries shown
+  --summary  Show only the number of folders and files of the tree
+  --json  Show the parts in JSON
 """
 
-from .provider import PygnataProvider
-from .parser import PygnataParser
-from .processor import PygnataProcessor
-from .display import PygnataDisplay
-from .builder import PygnataBuilder
+import os
+import sys
+import importlib
+
+from .config.config import pygconfig
 from .logger import logger
-from .exception import ParserError, BuilderError, ProviderError
+from .exception import (ParserError, BuilderError, ProviderError, BatchError,
+                        ProcessorError)
+from .profiler import profiler
+from . import __version__
 
 __all__ = ['pygnata_run']
 
 from docopt import docopt
 
 
-# Initialize pygnata
-pyg_provider = PygnataProvider()
-pyg_parser = PygnataParser()
-pyg_proc = PygnataProcessor()
-pyg_display = PygnataDisplay()
-pyg_builder = PygnataBuilder()
+#The module and the class of each pygnata component
+COMPONENTS = {'provider': ('.provider', 'PygnataProvider'),
+              'parser': ('.parser', 'PygnataParser'),
+              'processor': ('.processor', 'PygnataProcessor'),
+              'display': ('.display', 'PygnataDisplay'),
+              'builder': ('.builder', 'PygnataBuilder')}
+
+#The components already initialized
+pyg_components = {}
+
+
+def get_component(name):
+    """
+        Get a pygnata component. The component and its dependencies
+        are imported and initialized on the first call only, so a
+        command pays only for the components it uses.
+
+        :param name: The name of the component (provider, parser, ...)
 
+        :type name: string
 
-def pygnata_save(provide_type, src, dest=None, *options):
+        :return: The component
+        :rtype: object
+    """
+    if name not in pyg_components:
+        module_name, class_name = COMPONENTS[name]
+        module = importlib.import_module(module_name, __package__)
+        pyg_components[name] = getattr(module, class_name)()
+    return pyg_components[name]
+
+
+def pygnata_save(provide_type, src, dest=None, *options, **settings):
     """
         Save a pygnata file in .pygnata folder or in a custom path
 
@@ -57,22 +131,25 @@ def pygnata_save(provide_type, src, dest=None, *options):
         :param src: The value provided in the command line
         :param dest: The destination provided in the command line
         :param options: A list containing the unused options
+        :param settings: A dict containing the unused settings
 
         :type provide_type: int
         :type src: string
         :type dest: string
         :type options: list
+        :type settings: dict
     """
-    file_path = pyg_provider.search(provide_type, src)
+    file_path = get_component('provider').search(provide_type, src)
 
-    if pyg_parser.parse(file_path, False):
+    if get_component('parser').parse(file_path, False):
         logger.info(" The file seems to be OK :D")
         #Put the file in the .pygnata folder
-        location = pyg_provider.put_to_local(file_path, dest)
+        location = get_component('provider').put_to_local(file_path, dest)
         logger.info((" File saved in {}".format(location)))
 
 
-def pygnata_build(provide_type, src, dest=None, out_name=None, ignored=None):
+def pygnata_build(provide_type, src, dest=None, out_name=None, ignored=None,
+                  jobs=None, **settings):
     """
         Generate a pygnata file from an existing folder
 
@@ -81,80 +158,370 @@ def pygnata_build(provide_type, src, dest=None, out_name=None, ignored=None):
         :param dest: The destination provided in the command line
         :param out_name: The output name provided in the command line
         :param ignored: A list of regex used for ignoring files or folders
+        :param jobs: The number of threads scanning the folder
+        :param settings: A dict containing the settings (contents, rescan,
+                         excluded)
 
         :type provide_type: int
         :type src: string
         :type dest: string
         :type out_name: string
         :type ignored: list
+        :type jobs: int
+        :type settings: dict
     """
     logger.info((" Building the file from folder {}".format(src)))
+    #Without the snapshot, the whole folder is scanned again
+    snapshot = False if settings.get('rescan') else None
     #Build the template
-    path = pyg_builder.build(src, dest, out_name, ignored)
+    path = get_component('builder').build(src, dest, out_name, ignored,
+                                          jobs=jobs,
+                                          contents=settings.get('contents'),
+                                          snapshot=snapshot,
+                                          excluded=settings.get('excluded'))
     logger.info((" File built in {}".format(path)))
 
 
-def pygnata_install(provide_type, src, *options):
+def pygnata_install(provide_type, src, *options, **settings):
     """
         Generate the project tree from a .pyg file
 
         :param provide_type: The providing method choose to retrieve the file
         :param src: The value provided in the command line
         :param options: A list containing the unused options
+        :param settings: A dict containing the settings (jobs, var_pairs,
+                         vars_file, no_input, sync, plan, atomic,
+                         stream, report)
 
         :type provide_type: int
         :type src: string
         :type options: list
+        :type settings: dict
     """
-    file_path = pyg_provider.search(provide_type, src)
+    pyg_parser = get_component('parser')
+    #Get the VAR part values given in the command line
+    values = pyg_parser.load_values(settings.get('vars_file'),
+                                    settings.get('var_pairs'))
+
+    file_path = get_component('provider').search(provide_type, src)
     logger.info((" Generate from file \"{}\" --".format(file_path)))
-    file_dic = pyg_parser.parse(file_path)
+    pyg_proc = get_component('processor')
+    atomic = settings.get('atomic') or None
+    #The tree is created while it is parsed, a plan needs the whole tree.
+    #An atomic install is streamed, a late error only removes its staging
+    plan = settings.get('plan')
+    stream = (settings.get('stream') or pyg_parser.stream_tree or
+              pyg_proc.is_atomic(atomic, settings.get('sync')))
+    file_dic = pyg_parser.parse(file_path, True, values,
+                                not settings.get('no_input'),
+                                stream and not plan)
 
     logger.info((" Parse file \"{}\" --".format(file_path)))
-    pyg_proc.process("./", file_dic)
-
-
-def pygnata_show(provide_type, src, *options):
+    #Set the number of threads creating the tree
+    if settings.get('jobs'):
+        pyg_proc.workers = settings['jobs']
+
+    if plan:
+        #Nothing is written
+        install_plan = pyg_proc.plan("./", file_dic, settings.get('sync'))
+        print(install_plan.summary())
+        if settings.get('report'):
+            install_plan.save(settings['report'])
+            logger.info((" Plan saved in {}".format(settings['report'])))
+        return
+
+    #The source and template files are next to the .pyg file
+    source_dir = get_component('provider').source_dir(file_path)
+    report = pyg_proc.process("./", file_dic, source_dir,
+                              settings.get('sync'), atomic)
+
+    if report is not None:
+        print(report.summary())
+        if settings.get('report'):
+            report.save(settings['report'])
+            logger.info((" Sync report saved in {}".format(settings['report'])))
+
+
+def pygnata_show(provide_type, src, *options, **settings):
     """
         Show the content of a .pyg file
 
         :param provide_type: The providing method choose to retrieve the file
         :param src: The value provided in the command line
         :param options: A list containing the unused options
+        :param settings: A dict containing the settings (depth, max_entries,
+                         summary, json)
 
         :type provide_type: int
         :type src: string
         :type options: list
+        :type settings: dict
     """
-    file_path = pyg_provider.search(provide_type, src)
+    file_path = get_component('provider').search(provide_type, src)
     logger.info((" Informations from file \"{}\" --".format(file_path)))
-    file_dic = pyg_parser.parse(file_path, False)
+    file_dic = get_component('parser').parse(file_path, False)
+    from .display import TEXT, SUMMARY, JSON
+
+    mode = TEXT
+    if settings.get('summary'):
+        mode = SUMMARY
+    elif settings.get('json'):
+        mode = JSON
     #Print the file content
-    pyg_display.show(file_dic)
+    get_component('display').show(file_dic, settings.get('depth'),
+                                  settings.get('max_entries'), mode)
+
+
+def pygnata_batch(provide_type, src, *options, **settings):
+    """
+        Install the .pyg files of a manifest in a single process
+
+        :param provide_type: The providing method choose to retrieve the file
+        :param src: The path of the manifest
+        :param options: A list containing the unused options
+        :param settings: A dict containing the settings (jobs, report,
+                         var_pairs, vars_file, sync, atomic, stream)
+
+        :type provide_type: int
+        :type src: string
+        :type options: list
+        :type settings: dict
+    """
+    from .batch import PygnataBatch
+
+    pyg_parser = get_component('parser')
+    #The VAR part values of the command line are shared by the entries
+    values = pyg_parser.load_values(settings.get('vars_file'),
+                                    settings.get('var_pairs'))
+
+    batch = PygnataBatch(get_component('provider'), pyg_parser,
+                         get_component('processor'), settings.get('jobs'),
+                         values, settings.get('sync'),
+                         settings.get('atomic') or None,
+                         settings.get('stream'))
+    entries = batch.load_manifest(src)
+    logger.info((" Install {} entries from \"{}\" --".format(len(entries), src)))
+
+    results = batch.run(entries)
+    print(batch.summary(results))
+
+    if settings.get('report'):
+        batch.save(results, settings['report'])
+        logger.info((" Batch report saved in {}".format(settings['report'])))
+
+
+def pygnata_cache(provide_type, src, *options, **settings):
+    """
+        Remove the parsed and the downloaded .pyg files from the cache,
+        and the folder snapshots of the builds
+
+        :param provide_type: The providing method choose to retrieve the file
+        :param src: The value provided in the command line
+        :param options: A list containing the unused options
+        :param settings: A dict containing the unused settings
+
+        :type provide_type: int
+        :type src: string
+        :type options: list
+        :type settings: dict
+    """
+    nb_entries = get_component('parser').cache.clear()
+    logger.info((" {} entries removed from the cache".format(nb_entries)))
+
+    provider = get_component('provider')
+    nb_downloads = provider.downloader.clear(provider.Pygnata_tmp_path)
+    logger.info((" {} downloaded files removed".format(nb_downloads)))
+
+    from .snapshot import PygnataSnapshot
+
+    nb_snapshots = PygnataSnapshot.clear()
+    logger.info((" {} folder snapshots removed".format(nb_snapshots)))
+
+
+def pack_path(file_path, dest, extension):
+    """
+        Get the path of a packed or unpacked file
+
+        :param file_path: The path of the source file
+        :param dest: The destination folder or file, or None
+        :param extension: The extension of the destination file
+
+        :type file_path: string
+        :type dest: string
+        :type extension: string
+
+        :return: The path of the destination file
+        :rtype: string
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0] + extension
+    if not dest:
+        return os.path.join(os.path.dirname(file_path), name)
+    if os.path.isdir(dest):
+        return os.path.join(dest, name)
+    return dest
+
+
+def pygnata_pack(provide_type, src, dest=None, *options, **settings):
+    """
+        Convert a .pyg file in the packed format
+
+        :param provide_type: The providing method choose to retrieve the file
+        :param src: The value provided in the command line
+        :param dest: The destination provided in the command line
+        :param options: A list containing the unused options
+        :param settings: A dict containing the settings (compress)
+
+        :type provide_type: int
+        :type src: string
+        :type dest: string
+        :type options: list
+        :type settings: dict
+    """
+    file_path = get_component('provider').search(provide_type, src)
+    dest_path = pack_path(file_path, dest, pygconfig.get('PACK', 'Extension'))
+
+    compress = (settings.get('compress') or
+                pygconfig.getboolean('PACK', 'Compress'))
+    get_component('parser').pack(file_path, dest_path, compress)
+    logger.info((" File packed in {}".format(dest_path)))
+
+
+def pygnata_unpack(provide_type, src, dest=None, *options, **settings):
+    """
+        Convert back a packed file in a .pyg file
+
+        :param provide_type: The providing method choose to retrieve the file
+        :param src: The value provided in the command line
+        :param dest: The destination provided in the command line
+        :param options: A list containing the unused options
+        :param settings: A dict containing the unused settings
+
+        :type provide_type: int
+        :type src: string
+        :type dest: string
+        :type options: list
+        :type settings: dict
+    """
+    from .pack import PygnataPack
+
+    file_path = get_component('provider').search(provide_type, src)
+    if not PygnataPack.is_packed(file_path):
+        raise ParserError("{} is not a packed file".format(file_path))
+
+    dest_path = pack_path(file_path, dest,
+                          pygconfig.get('PROVIDER', 'Extension'))
+    PygnataPack.unpack(file_path, dest_path)
+    logger.info((" File unpacked in {}".format(dest_path)))
+
+
+def pygnata_import(provide_type, src, *options, **settings):
+    """
+        Import the .pyg files of a folder in the database
+
+        :param provide_type: The providing method choose to retrieve the file
+        :param src: The folder of the .pyg files
+        :param options: A list containing the unused options
+        :param settings: A dict containing the unused settings
+
+        :type provide_type: int
+        :type src: string
+        :type options: list
+        :type settings: dict
+    """
+    database = get_component('provider').template_database()
+    logger.info((" Import the .pyg files of \"{}\" --".format(src)))
+    imported, unchanged, invalid = database.import_folder(src)
+    logger.info((" {} imported, {} unchanged, {} invalid".format(
+        imported, unchanged, invalid)))
+
+
+def pygnata_list(provide_type, src, *options, **settings):
+    """
+        List the .pyg files of the .pygnata folder
+
+        :param provide_type: The providing method choose to retrieve the file
+        :param src: The value provided in the command line
+        :param options: A list containing the unused options
+        :param settings: A dict containing the settings (filters)
+
+        :type provide_type: int
+        :type src: string
+        :type options: list
+        :type settings: dict
+    """
+    from .index import PygnataIndex
+
+    filters = settings.get('filters') or {}
+    entries = get_component('provider').list_local(**filters)
+    print(PygnataIndex.summary(entries))
+
+
+def pygnata_profile(profile, profile_output, stats=None, stats_output=None):
+    """
+        Print or save the profiling report of a command
+
+        :param profile: Print the summary table on the error output
+        :param profile_output: The path of the JSON report
+        :param stats: The cProfile profiler of the command
+        :param stats_output: The path of the cProfile statistics
+
+        :type profile: bool
+        :type profile_output: string
+        :type stats: Profile
+        :type stats_output: string
+    """
+    if profile:
+        sys.stderr.write(profiler.summary() + "\n")
+
+    if profile_output:
+        profiler.save(profile_output)
+        logger.info((" Profiling report saved in {}".format(profile_output)))
+
+    if stats is not None:
+        stats.dump_stats(stats_output)
+        logger.info((" cProfile statistics saved in {}".format(stats_output)))
 
 
 def pygnata_run():
     """
         Entry point of Pygnata
     """
-    arguments = docopt(__doc__, version='0.1')
+    arguments = docopt(__doc__)
+
+    #Show the version, yaml is imported only there
+    if arguments['--version']:
+        from .yamlio import backend
+        print("pygnata {} (YAML backend: {})".format(__version__, backend()))
+        return
 
     #Get the pygnata main functions
     functions = {'save': pygnata_save,
                  'show': pygnata_show,
-                 'create': pygnata_build}
+                 'create': pygnata_build,
+                 'batch': pygnata_batch,
+                 'cache': pygnata_cache,
+                 'list': pygnata_list,
+                 'import': pygnata_import,
+                 'pack': pygnata_pack,
+                 'unpack': pygnata_unpack}
+
+    #The functions working without a source
+    no_source = [pygnata_cache, pygnata_list]
 
     #Associate type to options
-    types = {'--local': PygnataProvider.LOCAL,
-             '--url': PygnataProvider.URL,
-             '--database': PygnataProvider.DATABASE}
+    types = {'--local': pygconfig.get('PROVIDER', 'Local'),
+             '--url': pygconfig.get('PROVIDER', 'Url'),
+             '--database': pygconfig.get('PROVIDER', 'Database')}
 
     #List the options
     src_file = "<src>"
+    manifest_file = "<manifest>"
+    folder = "<folder>"
     dst_file = "<dest>"
     type_value = "<value>"
     ignore = ["-i", "--ignore"]
     output = ["-o", "--output"]
+    jobs = ["-j", "--jobs"]
 
     source = None
     destination = None
@@ -163,9 +530,10 @@ def pygnata_run():
     current_fct = pygnata_install
     is_ignored = None
     out_name = None
+    nb_jobs = None
 
     # Set current by default
-    current_type = PygnataProvider.CURRENT
+    current_type = pygconfig.get('PROVIDER', 'Current')
 
     # Browse the command line options
     for option, value in list(arguments.items()):
@@ -182,7 +550,7 @@ def pygnata_run():
             if option == type_value:
                 source = value
 
-            if option == src_file:
+            if option in (src_file, manifest_file, folder):
                 source = value
 
             if option in output:
@@ -194,17 +562,82 @@ def pygnata_run():
             if option == dst_file:
                 destination = value
 
-    if not source and current_type == PygnataProvider.CURRENT:
+            if option in jobs:
+                nb_jobs = value
+
+    #The limits of the shown tree
+    limits = (arguments['--depth'], arguments['--max-entries'])
+
+    #The ignore rules of the built tree
+    excluded = None
+    if arguments['--exclude']:
+        excluded = arguments['--exclude'].split(',')
+
+    if not source and current_type == pygconfig.get('PROVIDER', 'Current') \
+            and current_fct not in no_source:
         logger.error("Don't know how to use pygnata? Try 'pygnata -h' first!")
+    elif nb_jobs and not nb_jobs.isdigit():
+        logger.error("The number of jobs should be a positive integer")
+    elif any(limit and not limit.isdigit() for limit in limits):
+        logger.error("The depth and the number of entries should be positive "
+                     "integers")
+    elif arguments['--atomic'] and arguments['--sync']:
+        logger.error("A sync cannot be atomic, it completes an existing tree")
     else:
+        if nb_jobs:
+            nb_jobs = max(1, int(nb_jobs))
+        depth, max_entries = [int(limit) if limit else None
+                              for limit in limits]
+
+        #Record the phases if asked, nothing is recorded otherwise
+        stats_output = arguments['--cprofile']
+        profile_output = arguments['--profile-output']
+        if arguments['--profile'] or profile_output or stats_output:
+            profiler.enable()
+
+        stats = None
+        if stats_output:
+            import cProfile
+            stats = cProfile.Profile()
+
         try:
             # Execute the function with arg
-            current_fct(current_type, source, destination, out_name, is_ignored)
+            args = (current_type, source, destination, out_name, is_ignored)
+            settings = {'jobs': nb_jobs, 'report': arguments['--report'],
+                        'var_pairs': arguments['--var'],
+                        'vars_file': arguments['--vars'],
+                        'no_input': arguments['--no-input'],
+                        'contents': arguments['--contents'],
+                        'compress': arguments['--compress'],
+                        'sync': arguments['--sync'],
+                        'plan': arguments['--plan'],
+                        'atomic': arguments['--atomic'],
+                        'stream': arguments['--stream'],
+                        'rescan': arguments['--rescan'],
+                        'excluded': excluded,
+                        'depth': depth, 'max_entries': max_entries,
+                        'summary': arguments['--summary'],
+                        'json': arguments['--json'],
+                        'filters': {'author': arguments['--author'],
+                                    'title': arguments['--title'],
+                                    'version': arguments['--template-version']}}
+            if stats is not None:
+                stats.runcall(current_fct, *args, **settings)
+            else:
+                current_fct(*args, **settings)
         except ProviderError as e:
             logger.critical('ProviderError: {}'.format(e))
         except ParserError as e:
             logger.critical('ParserError: {}'.format(e))
         except BuilderError as e:
             logger.critical('BuilderError: {}'.format(e))
+        except BatchError as e:
+            logger.critical('BatchError: {}'.format(e))
+        except ProcessorError as e:
+            logger.critical('ProcessorError: {}'.format(e))
         except Exception as e:
             logger.error('UnknownError: {}'.format(e))
+
+        if profiler.enabled:
+            pygnata_profile(arguments['--profile'], profile_output,
+                            stats, stats_output)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import time
+import pickle
+import hashlib
+import tempfile
+import threading
+
+from path import path
+from .config.config import pygconfig
+from .logger import logger
+from .profiler import profiler
+
+#Version of the snapshot files, the old ones are ignored
+SNAPSHOT_VERSION = 1
+
+#A folder modified less than this before its scan may change again with
+#the same modification time, its listing is not kept (nanoseconds)
+RACY_DELAY = 2 * 10 ** 9
+
+
+class PygnataSnapshot(object):
+    """
+        Class used to keep the listings of the folders scanned by a
+        build. A folder is identified by its inode, modification time
+        and change time: adding, removing or renaming an entry changes
+        the modification time, so a folder with the same stat is listed
+        from the snapshot without being scanned.
+
+        The listings with a symbolic link are not kept, the type of a
+        link depends on its target and not on the folder. The ignored
+        entries are kept, the ignore rules may change without the folder.
+    """
+    #Extension of the snapshot files
+    extension = '.pickle'
+
+    def __init__(self, root_path, snapshot_dir=None):
+        #Get the folder of the snapshots
+        if snapshot_dir is None:
+            snapshot_dir = pygconfig.get('BUILDER', 'SnapshotDir')
+        self.snapshot_dir = path(snapshot_dir).expand()
+
+        #A snapshot for each root folder
+        self.root_path = os.path.abspath(root_path)
+        self.file_path = self.snapshot_dir / (
+            hashlib.sha256(self.root_path.encode('utf-8')).hexdigest() +
+            PygnataSnapshot.extension)
+
+        #The listings of the last build and of the current one
+        self.previous = {}
+        self.current = {}
+        self.lock = threading.Lock()
+
+        #Time of the scan, to detect the folders modified during the scan
+        self.start = time.time_ns()
+
+    @staticmethod
+    def identity(stat):
+        """
+            Get what identifies the state of a folder
+
+            :param stat: The stat result of the folder
+
+            :type stat: stat_result
+
+            :return: The device, inode, modification and change times
+            :rtype: tuple
+        """
+        return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns)
+
+    def load(self):
+        """
+            Read the snapshot of the last build, if any
+        """
+        try:
+            with open(self.file_path, 'rb') as fd:
+                data = pickle.load(fd)
+        except (OSError, IOError, EOFError, pickle.UnpicklingError,
+                AttributeError, ValueError) as e:
+            logger.debug("No snapshot {} ({})".format(self.file_path, e))
+            return
+
+        if (not isinstance(data, dict) or
+                data.get('version') != SNAPSHOT_VERSION or
+                data.get('root') != self.root_path):
+            return
+        self.previous = data.get('listings') or {}
+
+    def get(self, dir_path, stat):
+        """
+            Get the listing of a folder kept by the last build
+
+            :param dir_path: The absolute path of the folder
+            :param stat: The stat result of the folder
+
+            :type dir_path: string
+            :type stat: stat_result
+
+            :return: The sorted (name, is_dir) of the entries or None
+            :rtype: list
+        """
+        kept = self.previous.get(dir_path)
+        if kept is None or kept[0] != self.identity(stat):
+            profiler.count('snapshot.miss')
+            return None
+
+        with self.lock:
+            self.current[dir_path] = kept
+        profiler.count('snapshot.hit')
+        return kept[1]
+
+    def put(self, dir_path, stat, entries):
+        """
+            Keep the listing of a scanned folder
+
+            :param dir_path: The absolute path of the folder
+            :param stat: The stat result of the folder, before the scan
+            :param entries: The sorted (name, is_dir) of the entries
+
+            :type dir_path: string
+            :type stat: stat_result
+            :type entries: list
+        """
+        #The folder may change again without a new modification time
+        if self.start - stat.st_mtime_ns < RACY_DELAY:
+            return
+
+        with self.lock:
+            self.current[dir_path] = (self.identity(stat), entries)
+
+    def save(self):
+        """
+            Write the listings of the current build, the folders not
+            visited anymore are dropped
+        """
+        with self.lock:
+            data = {'version': SNAPSHOT_VERSION, 'root': self.root_path,
+                    'listings': self.current}
+            content = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+
+        try:
+            if not self.snapshot_dir.isdir():
+                os.makedirs(self.snapshot_dir)
+            #Write a temporary file and rename it for the other processes
+            fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_dir)
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(content)
+            os.replace(tmp_path, self.file_path)
+        except (OSError, IOError) as e:
+            logger.debug("Cannot write {} ({})".format(self.file_path, e))
+
+    @staticmethod
+    def clear(snapshot_dir=None):
+        """
+            Remove all the snapshots
+
+            :param snapshot_dir: The folder of the snapshots
+
+            :type snapshot_dir: string
+
+            :return: The number of removed snapshots
+            :rtype: int
+        """
+        if snapshot_dir is None:
+            snapshot_dir = pygconfig.get('BUILDER', 'SnapshotDir')
+        snapshot_dir = path(snapshot_dir).expand()
+
+        nb_removed = 0
+        if not snapshot_dir.isdir():
+            return nb_removed
+        for entry in snapshot_dir.files('*' + PygnataSnapshot.extension):
+            try:
+                os.remove(entry)
+                nb_removed += 1
+            except OSError:
+                pass
+        return nb_removed
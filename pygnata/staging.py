@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import sys
+import errno
+import shutil
+import tempfile
+
+from .exception import ProcessorError
+from .logger import logger
+from .profiler import profiler
+
+#Arguments of renameat2 on Linux
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1
+
+#The renameat2 function of the C library, loaded on the first need
+_renameat2 = []
+
+
+def get_renameat2():
+    """
+        Get the renameat2 function of the C library, on Linux only
+
+        :return: The function or None
+        :rtype: function
+    """
+    if not _renameat2:
+        function = None
+        if sys.platform.startswith('linux'):
+            import ctypes
+            import ctypes.util
+
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                                   use_errno=True)
+                function = libc.renameat2
+                function.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                     ctypes.c_int, ctypes.c_char_p,
+                                     ctypes.c_uint]
+                function.restype = ctypes.c_int
+            except (OSError, AttributeError, TypeError) as e:
+                logger.debug("No renameat2 ({}), rename used".format(e))
+                function = None
+        _renameat2.append(function)
+    return _renameat2[0]
+
+
+def rename_noreplace(src, dst):
+    """
+        Rename an entry, failing if the destination exists. The check is
+        done by the kernel with renameat2, else just before the rename.
+
+        :param src: The path of the entry
+        :param dst: The new path
+
+        :type src: string
+        :type dst: string
+    """
+    renameat2 = get_renameat2()
+    if renameat2 is not None:
+        import ctypes
+
+        if renameat2(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst),
+                     RENAME_NOREPLACE) == 0:
+            return
+        error = ctypes.get_errno()
+        #Not supported by the kernel or by the filesystem
+        if error not in (errno.ENOSYS, errno.EINVAL):
+            raise OSError(error, os.strerror(error), dst)
+
+    if os.path.lexists(dst):
+        raise OSError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+    os.rename(src, dst)
+
+
+class PygnataStaging(object):
+    """
+        Class used to install a tree at once. The tree is created in a
+        hidden folder of the target, on the same filesystem, then each
+        entry of its top level is moved in the target with a rename that
+        never replaces an existing entry. On a failure, the hidden folder
+        is removed and the target is left as it was.
+
+        Each top level entry has its own rename: a tree with a single top
+        level entry appears at once, with several entries another process
+        may see the first ones before the others. If one of them cannot
+        be moved, the moved ones are put back, as far as possible.
+
+        Used as a context manager: the tree is rolled back if the block
+        fails, commit() must be called at its end.
+    """
+    #Prefix of the hidden folders
+    prefix = '.pygnata-staging-'
+
+    def __init__(self, root_path):
+        self.root_path = root_path
+        self.path = None
+
+    def __enter__(self):
+        self.path = tempfile.mkdtemp(prefix=PygnataStaging.prefix,
+                                     dir=self.root_path)
+        logger.debug("Staging folder {}".format(self.path))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.rollback()
+        return False
+
+    def commit(self):
+        """
+            Move the entries of the staging folder in the target, the
+            moved entries are put back if one of them cannot be moved
+        """
+        moved = []
+        with profiler.phase('staging.commit'):
+            names = sorted(os.listdir(self.path))
+            #Nothing is moved if an entry is already there
+            for name in names:
+                if os.path.lexists(os.path.join(self.root_path, name)):
+                    raise ProcessorError("Cannot install {} ({})".format(
+                        os.path.join(self.root_path, name),
+                        os.strerror(errno.EEXIST)))
+            try:
+                for name in names:
+                    rename_noreplace(os.path.join(self.path, name),
+                                     os.path.join(self.root_path, name))
+                    moved.append(name)
+            except OSError as e:
+                self.restore(moved)
+                raise ProcessorError("Cannot install {} ({})".format(
+                    e.filename, e.strerror))
+            os.rmdir(self.path)
+        profiler.count('staging.renames', len(moved))
+
+    def restore(self, moved):
+        """
+            Put back in the staging folder the entries already moved in
+            the target, the ones that cannot be moved are logged
+
+            :param moved: The names of the moved entries
+
+            :type moved: list
+        """
+        for name in reversed(moved):
+            try:
+                rename_noreplace(os.path.join(self.root_path, name),
+                                 os.path.join(self.path, name))
+            except OSError as e:
+                logger.error("Cannot remove {} from the target ({})".format(
+                    os.path.join(self.root_path, name), e.strerror))
+
+    def rollback(self):
+        """
+            Remove the staging folder and the tree inside it
+        """
+        with profiler.phase('staging.rollback'):
+            shutil.rmtree(self.path, ignore_errors=True)
+        logger.debug("Staging folder {} removed".format(self.path))
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import queue
+import threading
+
+from .config.config import pygconfig
+from .exception import ParserError
+from .profiler import profiler
+from .tree import PygnataTree, FILE, DIR, CONTENT, NO_CHILDREN
+
+#Contexts of the tree being parsed
+SEQUENCE = 0
+MAPPING = 1
+
+#End of the nodes in the queue
+_DONE = object()
+
+
+class PygnataChunkReader(object):
+    """
+        File object reading the chunks generated by a Jinja template,
+        the template is rendered as the YAML parser reads it
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ''
+
+    def read(self, size=-1):
+        """
+            Read characters of the rendered template
+
+            :param size: The number of characters, -1 for all
+
+            :type size: int
+
+            :return: The characters, empty at the end
+            :rtype: string
+        """
+        if size is None or size < 0:
+            data = self.buffer + ''.join(self.chunks)
+            self.buffer = ''
+            return data
+
+        parts = [self.buffer]
+        length = len(self.buffer)
+        while length < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            parts.append(chunk)
+            length += len(chunk)
+
+        data = ''.join(parts)
+        self.buffer = data[size:]
+        return data[:size]
+
+
+class PygnataTreeStream(object):
+    """
+        Class used to render and parse the TREE part while the tree is
+        created. The chunks of the Jinja template feed the YAML parser,
+        its events are turned into nodes in pre-order by a thread, and
+        the nodes are handed by batches to the processor. The rendered
+        text and the YAML document are never held entirely.
+
+        The nodes are kept in a PygnataTree, given to on_done once the
+        whole part is parsed.
+    """
+    def __init__(self, template, values, on_done=None, batch=None,
+                 queue_size=None):
+        self.template = template
+        self.values = values or {}
+        self.on_done = on_done
+
+        #Number of nodes handed at once, and batches parsed ahead
+        if batch is None:
+            batch = pygconfig.getint('PARSER', 'StreamBatch')
+        self.batch = max(1, int(batch))
+        if queue_size is None:
+            queue_size = pygconfig.getint('PARSER', 'StreamQueue')
+        self.queue_size = max(1, int(queue_size))
+
+        #The nodes parsed so far
+        self.tree = PygnataTree()
+
+    def __iter__(self):
+        """
+            Parse the tree in a thread and get its nodes as they come
+
+            :return: A generator of (index, parent, kind, name, content)
+            :rtype: generator
+        """
+        batches = queue.Queue(self.queue_size)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                batch = []
+                for node in self.nodes():
+                    batch.append(node)
+                    if len(batch) >= self.batch:
+                        if not self.put(batches, batch, stop):
+                            return
+                        batch = []
+                if batch and not self.put(batches, batch, stop):
+                    return
+                self.put(batches, _DONE, stop)
+            except Exception as e:
+                self.put(batches, e, stop)
+
+        thread = threading.Thread(target=produce, name='pygnata-tree')
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is _DONE:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                profiler.count('stream.batches')
+                for node in batch:
+                    yield node
+        finally:
+            #Stop the thread if the processor failed
+            stop.set()
+            thread.join()
+
+    @staticmethod
+    def put(batches, item, stop):
+        """
+            Put an item in the queue unless the reader stopped
+
+            :param batches: The queue
+            :param item: The item
+            :param stop: Set when the reader stopped
+
+            :type batches: Queue
+            :type item: object
+            :type stop: Event
+
+            :return: If the item was put
+            :rtype: bool
+        """
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def nodes(self):
+        """
+            Render and parse the tree, the nodes are added to the tree
+
+            :return: A generator of (index, parent, kind, name, content)
+            :rtype: generator
+        """
+        import yaml
+        from . import yamlio
+
+        reader = PygnataChunkReader(self.template.generate(self.values))
+        loader = yamlio.Loader(reader)
+        try:
+            with profiler.phase('parser.stream_tree'):
+                for node in self.parse_events(yaml, loader):
+                    yield node
+        finally:
+            loader.dispose()
+
+        self.tree.finish()
+        if self.on_done is not None:
+            self.on_done(self.tree)
+
+    def parse_events(self, yaml, loader):
+        """
+            Turn the YAML events of the TREE part into nodes, the
+            document must be a list of files and folders like for
+            PygnataTree.from_yaml
+
+            :param yaml: The yaml module
+            :param loader: The YAML loader reading the rendered tree
+
+            :type yaml: module
+            :type loader: Loader
+
+            :return: A generator of (index, parent, kind, name, content)
+            :rtype: generator
+        """
+        tree = self.tree
+        get_event = loader.get_event
+        get_event()
+        event = get_event()
+        #An empty part
+        if isinstance(event, yaml.StreamEndEvent):
+            return
+        event = get_event()
+        if isinstance(event, yaml.ScalarEvent) and self.construct(
+                yaml, loader, event) is None:
+            return
+        if not isinstance(event, yaml.SequenceStartEvent):
+            raise ParserError("TREE- A list of files and folders expected")
+
+        #The open lists and mappings with the folder holding their entries
+        stack = [(SEQUENCE, -1)]
+        while stack:
+            event = get_event()
+            if isinstance(event, (yaml.SequenceEndEvent,
+                                  yaml.MappingEndEvent)):
+                stack.pop()
+                continue
+            context, parent = stack[-1]
+
+            if context == SEQUENCE:
+                if isinstance(event, yaml.MappingStartEvent):
+                    #A mapping holds folders and files with a content
+                    stack.append((MAPPING, parent))
+                    continue
+                if not isinstance(event, yaml.ScalarEvent):
+                    raise ParserError("TREE- A file name or a mapping "
+                                      "expected ({})".format(event.start_mark))
+                #A scalar is an empty file
+                name = self.construct(yaml, loader, event)
+                index = tree.add(name, FILE, parent)
+                yield index, parent, FILE, tree.name(index), None
+                continue
+
+            #The key of the mapping then its value
+            name = self.construct(yaml, loader, event)
+            event = get_event()
+            if isinstance(event, yaml.SequenceStartEvent):
+                index = tree.add(name, DIR, parent)
+                yield index, parent, DIR, tree.name(index), None
+                stack.append((SEQUENCE, index))
+                continue
+
+            value = self.construct(yaml, loader, event)
+            if isinstance(value, dict):
+                index = tree.add(name, CONTENT, parent, value)
+                yield index, parent, CONTENT, tree.name(index), value
+            elif value is None:
+                index = tree.add(name, DIR | NO_CHILDREN, parent)
+                yield index, parent, DIR | NO_CHILDREN, tree.name(index), None
+            else:
+                raise ParserError("TREE- {}: {} is not a folder".format(
+                    name, value))
+
+        if not isinstance(get_event(), yaml.DocumentEndEvent):
+            raise ParserError("TREE- A single document expected")
+
+    def construct(self, yaml, loader, event):
+        """
+            Build the value starting with an event, like yaml.load does
+
+            :param yaml: The yaml module
+            :param loader: The YAML loader reading the rendered tree
+            :param event: The first event of the value
+
+            :type yaml: module
+            :type loader: Loader
+            :type event: Event
+
+            :return: The value
+            :rtype: object
+        """
+        node = self.compose(yaml, loader, event)
+        try:
+            return loader.construct_object(node, deep=True)
+        finally:
+            #The constructed values are not kept
+            loader.constructed_objects = {}
+
+    @staticmethod
+    def compose(yaml, loader, event):
+        """
+            Build the YAML node starting with an event
+
+            :param yaml: The yaml module
+            :param loader: The YAML loader reading the rendered tree
+            :param event: The first event of the node
+
+            :type yaml: module
+            :type loader: Loader
+            :type event: Event
+
+            :return: The node
+            :rtype: Node
+        """
+        #The open collections with their pending key
+        stack = []
+        while True:
+            if isinstance(event, yaml.AliasEvent):
+                raise ParserError("TREE- Aliases are not supported ({})"
+                                  .format(event.start_mark))
+
+            if isinstance(event, (yaml.SequenceEndEvent,
+                                  yaml.MappingEndEvent)):
+                node = stack.pop()[0]
+                node.end_mark = event.end_mark
+            elif isinstance(event, yaml.ScalarEvent):
+                tag = event.tag
+                if tag is None or tag == '!':
+                    tag = loader.resolve(yaml.ScalarNode, event.value,
+                                         event.implicit)
+                node = yaml.ScalarNode(tag, event.value, event.start_mark,
+                                       event.end_mark, style=event.style)
+            else:
+                node_class = (yaml.SequenceNode if isinstance(
+                    event, yaml.SequenceStartEvent) else yaml.MappingNode)
+                tag = event.tag
+                if tag is None or tag == '!':
+                    tag = loader.resolve(node_class, None, event.implicit)
+                stack.append([node_class(tag, [], event.start_mark, None,
+                                         flow_style=event.flow_style), None])
+                event = loader.get_event()
+                continue
+
+            #The node is complete, add it to its collection
+            if not stack:
+                return node
+            parent = stack[-1]
+            if isinstance(parent[0], yaml.SequenceNode):
+                parent[0].value.append(node)
+            elif parent[1] is None:
+                parent[1] = node
+            else:
+                parent[0].value.append((parent[1], node))
+                parent[1] = None
+            event = loader.get_event()
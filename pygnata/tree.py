@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import sys
+
+from array import array
+
+from .exception import ParserError
+
+#Kinds of the nodes
+FILE = 0
+DIR = 1
+#A file with a content, see PygnataContents
+CONTENT = 2
+#Flag of a folder written "- folder:" instead of "- folder: []"
+NO_CHILDREN = 4
+
+#Mask of the kind in the flags of a node
+KIND_MASK = 3
+
+#End of a list while reading a YAML tree
+_END = object()
+
+
+class PygnataTree(object):
+    """
+        Class used to hold the TREE part in flat arrays. The nodes are
+        stored in pre-order: a node is followed by all its descendants,
+        and ends[i] is the index after the last descendant of node i.
+        Each node costs a parent index, an end index, a name index and
+        a kind, the names are interned in a single table.
+
+        The nodes of the top level have the parent -1. A YAML mapping
+        with several keys gives one node for each key.
+    """
+    __slots__ = ('parents', 'ends', 'kinds', 'name_ids', 'names',
+                 'name_index', 'contents')
+
+    def __init__(self):
+        #Parent, end of the subtree, kind flags and name of each node
+        self.parents = array('i')
+        self.ends = array('I')
+        self.kinds = array('B')
+        self.name_ids = array('I')
+
+        #The distinct names and their index in the table
+        self.names = []
+        self.name_index = {}
+
+        #The content of the files having one, by node
+        self.contents = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getstate__(self):
+        return (self.parents, self.ends, self.kinds, self.name_ids,
+                self.names, self.contents)
+
+    def __setstate__(self, state):
+        (self.parents, self.ends, self.kinds, self.name_ids, self.names,
+         self.contents) = state
+        self.name_index = dict((name, index)
+                               for index, name in enumerate(self.names))
+
+    def add(self, name, kind, parent=-1, content=None):
+        """
+            Add a node after the last one, its parent must be the last
+            folder still open. finish() must be called once all the
+            nodes are added.
+
+            :param name: The name of the file or folder
+            :param kind: The kind flags of the node
+            :param parent: The index of the parent, -1 for the top level
+            :param content: The content of a file
+
+            :type name: string
+            :type kind: int
+            :type parent: int
+            :type content: dict
+
+            :return: The index of the node
+            :rtype: int
+        """
+        name = str(name)
+        name_id = self.name_index.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(sys.intern(name))
+            self.name_index[name] = name_id
+
+        index = len(self.kinds)
+        self.parents.append(parent)
+        self.ends.append(index + 1)
+        self.kinds.append(kind)
+        self.name_ids.append(name_id)
+        if content is not None:
+            self.contents[index] = content
+        return index
+
+    def finish(self):
+        """
+            Compute the end of the subtree of each node
+        """
+        parents = self.parents
+        ends = self.ends
+        for index in range(len(parents) - 1, -1, -1):
+            parent = parents[index]
+            if parent >= 0 and ends[index] > ends[parent]:
+                ends[parent] = ends[index]
+
+    def name(self, index):
+        """
+            Get the name of a node
+
+            :param index: The index of the node
+
+            :type index: int
+
+            :return: The name
+            :rtype: string
+        """
+        return self.names[self.name_ids[index]]
+
+    def is_dir(self, index):
+        """
+            Check if a node is a folder
+
+            :param index: The index of the node
+
+            :type index: int
+
+            :return: If the node is a folder
+            :rtype: bool
+        """
+        return self.kinds[index] & KIND_MASK == DIR
+
+    def content(self, index):
+        """
+            Get the content of a file
+
+            :param index: The index of the node
+
+            :type index: int
+
+            :return: The mapping describing the content or None
+            :rtype: dict
+        """
+        return self.contents.get(index)
+
+    def children(self, index=-1):
+        """
+            Get the children of a folder, in order
+
+            :param index: The index of the folder, -1 for the top level
+
+            :type index: int
+
+            :return: A generator of the indexes of the children
+            :rtype: generator
+        """
+        ends = self.ends
+        child = index + 1
+        end = ends[index] if index >= 0 else len(ends)
+        while child < end:
+            yield child
+            child = ends[child]
+
+    def is_last(self, index):
+        """
+            Check if a node is the last child of its parent
+
+            :param index: The index of the node
+
+            :type index: int
+
+            :return: If no sibling follows the node
+            :rtype: bool
+        """
+        parent = self.parents[index]
+        end = self.ends[parent] if parent >= 0 else len(self.ends)
+        return self.ends[index] == end
+
+    def walk(self, depth=None):
+        """
+            Walk the nodes in pre-order, without recursion
+
+            :param depth: The number of levels walked, None for all
+
+            :type depth: int
+
+            :return: A generator of (index, level)
+            :rtype: generator
+        """
+        ends = self.ends
+        kinds = self.kinds
+        #The ends of the open folders
+        stack = []
+        index = 0
+        count = len(kinds)
+        while index < count:
+            while stack and index >= stack[-1]:
+                stack.pop()
+            level = len(stack)
+            yield index, level
+
+            if kinds[index] & KIND_MASK == DIR and ends[index] > index + 1:
+                if depth is None or level + 1 < depth:
+                    stack.append(ends[index])
+                else:
+                    #Skip the levels under the limit
+                    index = ends[index]
+                    continue
+            index += 1
+
+    def count(self):
+        """
+            Count the folders and files and the depth of the tree
+
+            :return: The number of folders, of files and the depth
+            :rtype: tuple
+        """
+        nb_dirs = 0
+        max_depth = 0
+        for index, level in self.walk():
+            if self.kinds[index] & KIND_MASK == DIR:
+                nb_dirs += 1
+            if level >= max_depth:
+                max_depth = level + 1
+        return nb_dirs, len(self) - nb_dirs, max_depth
+
+    @staticmethod
+    def from_yaml(tree_lst):
+        """
+            Build a tree from the YAML shape of the TREE part
+
+            :param tree_lst: The list of the files and folders
+
+            :type tree_lst: list
+
+            :return: The tree
+            :rtype: PygnataTree
+        """
+        if isinstance(tree_lst, PygnataTree):
+            return tree_lst
+        tree = PygnataTree()
+        if tree_lst is None:
+            return tree
+        if not isinstance(tree_lst, list):
+            raise ParserError("TREE- A list of files and folders expected")
+
+        #The remaining entries of each open folder with its index
+        stack = [(iter(tree_lst), -1)]
+        while stack:
+            item = next(stack[-1][0], _END)
+            if item is _END:
+                stack.pop()
+                continue
+            parent = stack[-1][1]
+
+            if isinstance(item, tuple):
+                #A key of a mapping with several keys
+                key, value = item
+            elif isinstance(item, dict) and len(item) == 1:
+                key, value = list(item.items())[0]
+            elif isinstance(item, dict):
+                #Its keys are read in order, after the descendants of
+                #the previous ones
+                stack.append((iter(list(item.items())), parent))
+                continue
+            else:
+                #A scalar is an empty file
+                tree.add(item, FILE, parent)
+                continue
+
+            #A mapping holds folders and files with a content
+            if isinstance(value, dict):
+                tree.add(key, CONTENT, parent, value)
+            elif value is None:
+                tree.add(key, DIR | NO_CHILDREN, parent)
+            elif isinstance(value, list):
+                index = tree.add(key, DIR, parent)
+                stack.append((iter(value), index))
+            else:
+                raise ParserError("TREE- {}: {} is not a folder".format(key,
+                                                                        value))
+
+        tree.finish()
+        return tree
+
+    def to_yaml(self):
+        """
+            Convert the tree to the YAML shape of the TREE part
+
+            :return: The list of the files and folders
+            :rtype: list
+        """
+        root = []
+        #The lists of the open folders with their end
+        stack = [(len(self), root)]
+        for index in range(len(self)):
+            while index >= stack[-1][0]:
+                stack.pop()
+            entries = stack[-1][1]
+
+            kind = self.kinds[index]
+            name = self.name(index)
+            if kind & KIND_MASK == FILE:
+                entries.append(name)
+            elif kind & KIND_MASK == CONTENT:
+                entries.append({name: self.contents[index]})
+            elif kind & NO_CHILDREN:
+                entries.append({name: None})
+            else:
+                children = []
+                entries.append({name: children})
+                stack.append((self.ends[index], children))
+        return root
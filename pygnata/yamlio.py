@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import yaml
+
+from .config.config import pygconfig
+
+#Name of the YAML backends
+LIBYAML = 'libyaml'
+PYTHON = 'python'
+
+#Use the C loader and dumper if libyaml is available, unless the
+#configuration asks for the pure Python ones
+try:
+    if pygconfig.get('YAML', 'Backend') == PYTHON:
+        raise ImportError("Pure Python backend required")
+    from yaml import CSafeLoader as Loader, CSafeDumper as Dumper
+    BACKEND = LIBYAML
+except ImportError:
+    from yaml import SafeLoader as Loader, SafeDumper as Dumper
+    BACKEND = PYTHON
+
+
+def backend():
+    """
+        Get the name of the YAML backend in use
+
+        :return: libyaml or python
+        :rtype: string
+    """
+    return BACKEND
+
+
+def load(stream):
+    """
+        Load a YAML document with the safe loader
+
+        :param stream: The YAML document
+
+        :type stream: string
+
+        :return: The decoded document
+        :rtype: object
+    """
+    return yaml.load(stream, Loader=Loader)
+
+
+def dump(data, stream=None, **options):
+    """
+        Dump an object in YAML with the safe dumper
+
+        :param data: The object to dump
+        :param stream: The file object where the YAML is written
+        :param options: The options of yaml.dump
+
+        :type data: object
+        :type stream: file
+        :type options: dict
+
+        :return: The YAML document if no stream is given
+        :rtype: string
+    """
+    return yaml.dump(data, stream, Dumper=Dumper, **options)
+
+
+def emit(events, stream):
+    """
+        Write YAML events in a stream with the safe dumper
+
+        :param events: The YAML events
+        :param stream: The file object where the YAML is written
+
+        :type events: iterable
+        :type stream: file
+    """
+    return yaml.emit(events, stream, Dumper=Dumper)
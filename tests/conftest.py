@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    """
+        Keep the caches and the snapshots of each test in its own folder
+    """
+    home_dir = tmp_path / 'home'
+    home_dir.mkdir()
+    monkeypatch.setenv('HOME', str(home_dir))
+    return home_dir
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+
+from pygnata.batch import PygnataBatch
+from pygnata.parser import PygnataParser
+from pygnata.processor import PygnataProcessor
+
+
+def test_nested_targets_share_a_group(tmp_path):
+    out = str(tmp_path / 'out')
+    targets = [os.path.join(out, 'sub'), str(tmp_path / 'other'), out,
+               os.path.join(out, 'sub', 'deep'), str(tmp_path / 'out-2'),
+               os.path.join(out, '..', 'out', 'sub')]
+    entries = [{'template': 't{}'.format(index), 'target': target}
+               for index, target in enumerate(targets)]
+
+    groups = []
+    batch = PygnataBatch(None, PygnataParser(), PygnataProcessor(), 4)
+    batch.install_group = lambda group: (
+        groups.append([index for index, _ in group]) or
+        [(index, None) for index, _ in group])
+    batch.run(entries)
+
+    #The entries in out are installed in order, by a single thread
+    assert sorted(groups) == [[0, 2, 3, 5], [1], [4]]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import pytest
+
+from pygnata.cache import PygnataCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PygnataCache(str(tmp_path / 'cache'), 10000, True)
+    listings = []
+    entries = cache.entries
+
+    def counted_entries():
+        listings.append(1)
+        return entries()
+
+    cache.entries = counted_entries
+    cache.listings = listings
+    return cache
+
+
+def test_put_lists_the_folder_once(cache):
+    for index in range(20):
+        cache.put(PygnataCache.PARTS, str(index), 'x' * 100)
+    assert len(cache.listings) == 1
+    assert cache.disk_size == sum(size for _, size, _ in cache.entries())
+
+
+def test_put_replacing_an_entry_keeps_the_size(cache):
+    cache.put(PygnataCache.PARTS, 'a', 'x' * 100)
+    size = cache.disk_size
+    cache.put(PygnataCache.PARTS, 'a', 'y' * 100)
+    assert cache.disk_size == size
+
+
+def test_full_cache_is_evicted(cache):
+    for index in range(50):
+        cache.put(PygnataCache.TREES, str(index), 'x' * 1000)
+    entries = cache.entries()
+    assert sum(size for _, size, _ in entries) <= cache.max_size
+    assert cache.disk_size == sum(size for _, size, _ in entries)
+    assert cache.get(PygnataCache.TREES, '49') == 'x' * 1000
+
+
+def test_clear_resets_the_size(cache):
+    cache.put(PygnataCache.PARTS, 'a', 'x' * 100)
+    assert cache.clear() == 1
+    assert cache.disk_size == 0
+    assert cache.get(PygnataCache.PARTS, 'a') is None
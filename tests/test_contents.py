@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+
+import pytest
+
+from pygnata.contents import PygnataContents
+from pygnata.exception import ProcessorError
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    folder = tmp_path / 'source'
+    (folder / 'files').mkdir(parents=True)
+    (folder / 'files' / 'a.txt').write_text('a')
+    (tmp_path / 'secret.txt').write_text('secret')
+    return folder
+
+
+def test_resolve_source_in_folder(source_dir):
+    contents = PygnataContents(str(source_dir))
+    assert contents.resolve('a', 'files/a.txt') == os.path.realpath(
+        str(source_dir / 'files' / 'a.txt'))
+
+
+def test_resolve_rejects_parent_path(source_dir):
+    contents = PygnataContents(str(source_dir))
+    with pytest.raises(ProcessorError):
+        contents.resolve('a', '../secret.txt')
+
+
+def test_resolve_rejects_link_out_of_folder(source_dir):
+    os.symlink(str(source_dir.parent / 'secret.txt'),
+               str(source_dir / 'files' / 'link.txt'))
+    contents = PygnataContents(str(source_dir))
+    with pytest.raises(ProcessorError):
+        contents.resolve('a', 'files/link.txt')
+
+
+def test_resolve_through_linked_folder(source_dir, tmp_path):
+    os.symlink(str(source_dir), str(tmp_path / 'linked'))
+    contents = PygnataContents(str(tmp_path / 'linked'))
+    assert os.path.isfile(contents.resolve('a', 'files/a.txt'))
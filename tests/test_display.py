@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import io
+import json
+
+from pygnata.display import PygnataDisplay, JSON
+
+TREE = [{'src': [{'pkg': ['a.py', 'b.py']}, 'main.py']}, {'empty': None},
+        'README.md']
+
+
+def show(depth=None, max_entries=None):
+    stream = io.StringIO()
+    PygnataDisplay().show({'TREE': TREE}, depth, max_entries, JSON, stream)
+    return json.loads(stream.getvalue())
+
+
+def test_json_tree_is_complete_without_limit():
+    shown = show()
+    assert 'truncated' not in shown
+    src, empty, readme = shown['TREE']
+    assert [child['name'] for child in src['children']] == ['pkg', 'main.py']
+    assert empty == {'name': 'empty', 'type': 'folder', 'children': []}
+    assert readme == {'name': 'README.md', 'type': 'file'}
+
+
+def test_json_folder_cut_by_depth_is_truncated():
+    src, empty, _ = show(depth=1)['TREE']
+    assert src['children'] == [] and src['truncated']
+    #An empty folder is not cut
+    assert 'truncated' not in empty
+
+    pkg = show(depth=2)['TREE'][0]['children'][0]
+    assert pkg['children'] == [] and pkg['truncated']
+
+
+def test_json_tree_cut_by_max_entries_is_truncated():
+    shown = show(max_entries=3)
+    assert shown['truncated']
+    assert len(shown['TREE']) == 1
+    assert 'truncated' not in show(max_entries=7)
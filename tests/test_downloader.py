@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import http.client
+import http.server
+import threading
+
+import pytest
+
+from pygnata.downloader import PygnataDownloader
+
+BODY = b"pygnata" * 1000
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """
+        Serve BODY on /file, and a body shorter than its Content-Length
+        on /short
+    """
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append(self.path)
+        body = BODY[:100] if self.path == '/short' else BODY
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.send_header('ETag', '"v1"')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.requests = []
+    httpd = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def downloader():
+    downloader = PygnataDownloader(jobs=1, retries=2, timeout=5)
+    downloader.backoff = 0
+    return downloader
+
+
+def url(httpd, path):
+    return "http://127.0.0.1:{}{}".format(httpd.server_address[1], path)
+
+
+def test_short_body_is_retried_then_raised(server, downloader, tmp_path):
+    folder = tmp_path / 'downloads'
+    folder.mkdir()
+    dest_path = str(folder / 'short')
+    with pytest.raises(http.client.IncompleteRead):
+        downloader.fetch(url(server, '/short'), dest_path)
+    assert Handler.requests == ['/short'] * 3
+    #Neither the file nor its partial download is left
+    assert list(folder.iterdir()) == []
+
+
+def test_offline_fallback_to_previous_download(server, downloader, tmp_path):
+    dest_path = str(tmp_path / 'file')
+    file_url = url(server, '/file')
+    assert downloader.fetch(file_url, dest_path) == dest_path
+    assert downloader.read_meta(dest_path)['etag'] == '"v1"'
+
+    #Revalidate on each fetch, with the server down
+    downloader.ttl = 0
+    server.shutdown()
+    server.server_close()
+    assert downloader.fetch(file_url, dest_path) == dest_path
+    with open(dest_path, 'rb') as fd:
+        assert fd.read() == BODY
+    assert Handler.requests == ['/file']
+
+
+def test_offline_without_previous_download(server, downloader, tmp_path):
+    file_url = url(server, '/file')
+    server.shutdown()
+    server.server_close()
+    with pytest.raises(OSError):
+        downloader.fetch(file_url, str(tmp_path / 'file'))
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+from concurrent.futures import ThreadPoolExecutor
+
+from pygnata.environment import get_environment, get_template
+
+
+def test_sources_are_not_kept():
+    for index in range(100):
+        template = get_template("{{ a }}-" + str(index))
+        assert template.render(a='x') == 'x-' + str(index)
+    assert get_environment().loader.sources == {}
+
+
+def test_same_source_from_threads():
+    sources = ["{{ a }}" + str(index % 5) for index in range(200)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        rendered = list(pool.map(lambda source: get_template(source).render(
+            a='x'), sources))
+    assert rendered == ['x' + str(index % 5) for index in range(200)]
+    assert get_environment().loader.sources == {}
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import pytest
+
+from pygnata.exception import BuilderError
+from pygnata.ignore import PygnataIgnore
+
+
+def test_ignore_regexes_keep_their_own_flags():
+    ignore = PygnataIgnore([r'(?i).*\.bak$', r'tmp'], files=[])
+    assert ignore.is_ignored((), '/src', 'A.BAK', False)
+    assert ignore.is_ignored((), '/src', 'tmp.txt', False)
+    assert not ignore.is_ignored((), '/src', 'TMP.txt', False)
+    assert not ignore.is_ignored((), '/src', 'a.txt', False)
+
+
+def test_invalid_ignore_regex():
+    with pytest.raises(BuilderError):
+        PygnataIgnore([r'(?i).*\.bak$', r'(unclosed'], files=[])
+
+
+def test_no_rules_by_default(tmp_path):
+    (tmp_path / '.git').mkdir()
+    ignore = PygnataIgnore(files=[])
+    context = ignore.enter(None, str(tmp_path), ['.git'])
+    assert not ignore.is_ignored(context, str(tmp_path), '.git', True)
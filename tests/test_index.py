@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import pytest
+
+from pygnata.index import PygnataIndex
+
+TEMPLATE = """---
+INFO:
+    title: "{title}"
+    author: "{author}"
+    version: 0.1
+    date: 2015-07-23
+---
+TREE:
+- a.txt
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    folder = tmp_path / 'local'
+    folder.mkdir()
+    for name, author, title in (('percent', '100% me', 'a_b'),
+                                ('plain', '100 me', 'axb'),
+                                ('slash', 'me\\\\you', 'a\\\\b')):
+        (folder / (name + '.pyg')).write_text(TEMPLATE.format(
+            author=author, title=title))
+    index = PygnataIndex(str(folder), str(tmp_path / 'index.db'))
+    index.sync()
+    yield index
+    index.close()
+
+
+def names(entries):
+    return sorted(entry['name'] for entry in entries)
+
+
+def test_like_wildcards_match_themselves(index):
+    assert names(index.search(author='0%')) == ['percent.pyg']
+    assert names(index.search(title='a_b')) == ['percent.pyg']
+    assert names(index.search(title='\\')) == ['slash.pyg']
+    assert names(index.search(author='ME')) == ['percent.pyg', 'plain.pyg',
+                                                'slash.pyg']
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+
+import pytest
+
+from pygnata.exception import ParserError
+from pygnata.pack import PygnataPack, TREE
+from pygnata.parser import PygnataParser
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'example.pyg')
+
+
+@pytest.fixture
+def packed(tmp_path):
+    dest_path = str(tmp_path / 'example.pygp')
+    PygnataParser().pack(EXAMPLE, dest_path, False)
+    return dest_path
+
+
+def test_tree_is_read_back(packed):
+    with PygnataPack(packed) as pack:
+        tree = pack.tree()
+    assert tree.name(0) == 'my_folder'
+
+
+def test_unknown_record_kind_is_rejected(packed):
+    with PygnataPack(packed) as pack:
+        offset = pack.sections[TREE][0]
+    #The kind of the first record, after the number of records
+    with open(packed, 'r+b') as fd:
+        fd.seek(offset + 4)
+        fd.write(b'\x02')
+
+    with PygnataPack(packed) as pack:
+        with pytest.raises(ParserError):
+            pack.tree()
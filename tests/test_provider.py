@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import shutil
+
+import pytest
+from path import path
+
+from pygnata.batch import PygnataBatch
+from pygnata.database import PygnataDatabase
+from pygnata.downloader import PygnataDownloader
+from pygnata.parser import PygnataParser
+from pygnata.processor import PygnataProcessor
+from pygnata.provider import PygnataProvider
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'example.pyg')
+
+#A template copying a file of its folder
+COPIER = """---
+INFO:
+    title: "copier"
+    author: "Me"
+    version: 0.1
+    date: 2015-07-23
+---
+TREE:
+- copied.txt: {source: secret.txt}
+"""
+
+
+@pytest.fixture
+def provider(tmp_path, monkeypatch):
+    monkeypatch.setattr(PygnataProvider, 'Pygnata_local_path',
+                        path(str(tmp_path / 'local')))
+    monkeypatch.setattr(PygnataProvider, 'Pygnata_tmp_path',
+                        path(str(tmp_path / 'tmp')))
+    provider = PygnataProvider()
+
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    shutil.copy(EXAMPLE, str(templates))
+    (templates / 'copier.pyg').write_text(COPIER)
+    provider.database = PygnataDatabase(str(tmp_path / 'templates.db'))
+    provider.database.import_folder(str(templates))
+    yield provider
+    provider.database.close()
+
+
+def test_database_template_is_cleared_with_the_downloads(provider):
+    file_path = provider.search_database('example')
+    assert os.path.isfile(file_path)
+    assert os.path.isfile(file_path + PygnataDownloader.meta_extension)
+
+    tmp_path = PygnataProvider.Pygnata_tmp_path
+    assert provider.downloader.clear(tmp_path) == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_database_template_has_its_own_source_dir(provider, tmp_path):
+    file_path = provider.search_database('example')
+    tmp_dir = PygnataProvider.Pygnata_tmp_path
+    source_dir = provider.source_dir(file_path)
+    assert os.path.dirname(source_dir) == tmp_dir
+    assert source_dir != tmp_dir
+
+    local_file = str(tmp_path / 'example.pyg')
+    assert provider.source_dir(local_file) == str(tmp_path)
+
+
+def test_batch_database_template_has_its_own_source_dir(provider, tmp_path):
+    #A file kept in the tmp folder with the other downloads
+    tmp_dir = PygnataProvider.Pygnata_tmp_path
+    with open(os.path.join(tmp_dir, 'secret.txt'), 'w') as fd:
+        fd.write('secret')
+
+    target = tmp_path / 'target'
+    batch = PygnataBatch(provider, PygnataParser(), PygnataProcessor(), 1)
+    result, = batch.run([{'template': 'copier', 'target': str(target),
+                          'provider': 'database'}])
+    assert result['status'] == 'error'
+    assert 'secret.txt does not exist' in result['error']
+    assert (target / 'copied.txt').read_text() != 'secret'
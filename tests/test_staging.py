@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import errno
+import logging
+import os
+import sys
+
+import pytest
+
+from pygnata import staging
+from pygnata.exception import ProcessorError
+from pygnata.parser import PygnataParser
+from pygnata.processor import PygnataProcessor
+from pygnata.pygnata import pygnata_run
+from pygnata.staging import PygnataStaging
+
+TREE = """---
+INFO:
+    title: "tree"
+    author: "Me"
+    version: 0.1
+    date: 2015-07-23
+---
+TREE:
+- app:
+    - main.py
+- README.md
+"""
+
+
+@pytest.fixture
+def target(tmp_path):
+    folder = tmp_path / 'target'
+    folder.mkdir()
+    (folder / 'b').write_text('kept')
+    return folder
+
+
+def stage(target, names):
+    with PygnataStaging(str(target)) as stage:
+        for name in names:
+            os.mkdir(os.path.join(stage.path, name))
+            with open(os.path.join(stage.path, name, 'f.txt'), 'w') as fd:
+                fd.write(name)
+        stage.commit()
+
+
+def test_commit_moves_every_entry(target):
+    stage(target, ['a', 'c'])
+    assert sorted(os.listdir(str(target))) == ['a', 'b', 'c']
+
+
+def test_existing_entry_leaves_target_unchanged(target):
+    with pytest.raises(ProcessorError):
+        stage(target, ['a', 'b', 'c'])
+    assert os.listdir(str(target)) == ['b']
+    assert (target / 'b').read_text() == 'kept'
+
+
+def test_failed_rename_puts_back_moved_entries(target, monkeypatch):
+    rename = staging.rename_noreplace
+
+    def failing_rename(src, dst):
+        #An entry created by another process after the check
+        if os.path.basename(dst) == 'c':
+            raise OSError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+        rename(src, dst)
+
+    monkeypatch.setattr(staging, 'rename_noreplace', failing_rename)
+    with pytest.raises(ProcessorError):
+        stage(target, ['a', 'c'])
+    assert os.listdir(str(target)) == ['b']
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_atomic_install_logs_target_paths(tmp_path, caplog, stream):
+    pyg_file = tmp_path / 'tree.pyg'
+    pyg_file.write_text(TREE)
+    target = tmp_path / 'target'
+    target.mkdir()
+
+    part_dic = PygnataParser().parse(str(pyg_file), True, {}, False, stream)
+    with caplog.at_level(logging.INFO):
+        PygnataProcessor().process(str(target), part_dic, atomic=True)
+    created = [record.getMessage() for record in caplog.records
+               if record.getMessage().startswith('New ')]
+    assert sorted(created) == sorted([
+        "New dir  {}".format(target / 'app'),
+        "New file {}".format(target / 'app' / 'main.py'),
+        "New file {}".format(target / 'README.md')])
+
+
+def test_atomic_sync_is_rejected_before_the_install(tmp_path, caplog,
+                                                     monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    monkeypatch.setattr(sys, 'argv', ['pygnata', 'missing.pyg', '--atomic',
+                                      '--sync'])
+    pygnata_run()
+    messages = [record.getMessage() for record in caplog.records]
+    assert "A sync cannot be atomic, it completes an existing tree" in messages
+    #The template was not searched
+    assert not any('ProviderError' in message for message in messages)
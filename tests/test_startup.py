@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+import subprocess
+import sys
+
+#Modules only needed by the commands, not by the help
+HEAVY_MODULES = ['yaml', 'jinja2', 'path', 'urllib.request', 'sqlite3']
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HELP = """
+import sys
+sys.argv = ['pygnata', '-h']
+from pygnata.pygnata import pygnata_run
+try:
+    pygnata_run()
+except SystemExit:
+    pass
+print(','.join(name for name in {!r} if name in sys.modules))
+""".format(HEAVY_MODULES)
+
+
+def test_help_imports_no_heavy_module():
+    #The startup time itself is checked by the benchmark
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, '-c', HELP], env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True).stdout
+    assert 'Usage' in output
+    assert output.splitlines()[-1] == ''
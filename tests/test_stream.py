@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import os
+
+import pytest
+
+from pygnata.exception import ParserError
+from pygnata.parser import PygnataParser
+from pygnata.processor import PygnataProcessor
+
+#A tree whose last entry is not a folder, after many valid ones
+BROKEN = """---
+INFO:
+    title: "broken"
+    author: "Me"
+    version: 0.1
+    date: 2015-07-23
+---
+TREE:
+- root:
+{% for i in range(3000) %}
+    - d{{ i }}:
+        - a.txt
+{% endfor %}
+    - last: 3
+"""
+
+#A valid tree with files, contents and empty folders
+VALID = """---
+INFO:
+    title: "valid"
+    author: "Me"
+    version: 0.1
+    date: 2015-07-23
+---
+TREE:
+- app:
+{% for i in range(500) %}
+    - d{{ i }}:
+        - a.txt
+        - b.txt: {content: "{{ i }}"}
+        - empty:
+{% endfor %}
+- README.md: {content: "app"}
+"""
+
+
+@pytest.fixture
+def broken(tmp_path):
+    pyg_file = tmp_path / 'broken.pyg'
+    pyg_file.write_text(BROKEN)
+    target = tmp_path / 'target'
+    target.mkdir()
+    return pyg_file, target
+
+
+def install(pyg_file, target, stream, atomic, sync=False):
+    parser = PygnataParser()
+    part_dic = parser.parse(str(pyg_file), True, {}, False, stream)
+    return PygnataProcessor().process(str(target), part_dic,
+                                      str(pyg_file.parent), sync, atomic)
+
+
+def snapshot(target):
+    """
+        Get the entries of a tree with the content of its files
+    """
+    entries = {}
+    for dir_path, dir_names, file_names in os.walk(str(target)):
+        relative = os.path.relpath(dir_path, str(target))
+        for name in dir_names:
+            entries[os.path.join(relative, name)] = None
+        for name in file_names:
+            with open(os.path.join(dir_path, name)) as fd:
+                entries[os.path.join(relative, name)] = fd.read()
+    return entries
+
+
+def test_default_install_of_broken_tree_writes_nothing(broken):
+    pyg_file, target = broken
+    with pytest.raises(ParserError):
+        install(pyg_file, target, PygnataParser().stream_tree, None)
+    assert list(target.iterdir()) == []
+
+
+def test_atomic_stream_of_broken_tree_writes_nothing(broken):
+    pyg_file, target = broken
+    with pytest.raises(ParserError):
+        install(pyg_file, target, True, True)
+    assert list(target.iterdir()) == []
+
+
+@pytest.mark.parametrize('atomic', [False, True])
+def test_stream_install_matches_whole_parse(tmp_path, atomic):
+    pyg_file = tmp_path / 'valid.pyg'
+    pyg_file.write_text(VALID)
+    whole, streamed = tmp_path / 'whole', tmp_path / 'streamed'
+    whole.mkdir()
+    streamed.mkdir()
+
+    install(pyg_file, whole, False, False)
+    install(pyg_file, streamed, True, atomic)
+    entries = snapshot(whole)
+    assert len(entries) > 2000
+    assert snapshot(streamed) == entries
+
+
+def test_stream_sync_matches_whole_parse(tmp_path):
+    pyg_file = tmp_path / 'valid.pyg'
+    pyg_file.write_text(VALID)
+    reports = []
+    targets = []
+    for stream in (False, True):
+        target = tmp_path / 'stream-{}'.format(stream)
+        #A part of the tree exists, with a file in conflict with a folder
+        (target / 'app' / 'd7').mkdir(parents=True)
+        (target / 'app' / 'd7' / 'a.txt').write_text('kept')
+        (target / 'app' / 'd9').write_text('not a folder')
+        reports.append(install(pyg_file, target, stream, False, True))
+        targets.append(target)
+
+    assert snapshot(targets[1]) == snapshot(targets[0])
+    assert reports[1].counts() == reports[0].counts()
+    for kind in reports[0].entries:
+        assert (sorted(os.path.relpath(entry, str(targets[1]))
+                       for entry in reports[1].entries[kind]) ==
+                sorted(os.path.relpath(entry, str(targets[0]))
+                       for entry in reports[0].entries[kind]))
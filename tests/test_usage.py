@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+#The MIT License (MIT)
+#Copyright (c) 2015 Alexandre LM, Dimitri S
+
+import pytest
+from docopt import docopt, DocoptExit
+
+from pygnata import pygnata
+
+VALID = [
+    'x.pyg --var a=1 --var b=2 --vars v.yml --no-input -j 4 --atomic --stream',
+    'x.pyg --sync --plan --report plan.json --profile',
+    '-u http://host/x.pyg --sync --cprofile stats.prof',
+    'list --author me --title t --template-version 1',
+    'create src out -i a,b -x .git/ -o name -j 2 --contents --rescan',
+    'show x.pyg --depth 2 --max-entries 10 --json',
+    '-d name',
+    'show -d name --summary --profile-output profile.json',
+    'save x.pyg dest',
+    'batch manifest.yml --var a=1 -j 2 --sync --report r.json',
+    'batch manifest.yml --atomic --stream',
+    'pack x.pyg --compress',
+    'unpack x.pygp dest',
+    'cache clear',
+    'import folder --profile',
+]
+
+INVALID = [
+    'show x.pyg --atomic',
+    'show x.pyg --summary --json',
+    'create src --sync',
+    'create src --var a=1',
+    'save x.pyg --plan',
+    'list --depth 2',
+    'batch manifest.yml --plan',
+    'batch manifest.yml --no-input',
+    'pack x.pyg --json',
+    'unpack x.pygp --compress',
+    'cache clear --profile',
+    'x.pyg --depth 2',
+    'x.pyg --contents',
+]
+
+
+@pytest.mark.parametrize('line', VALID)
+def test_valid_command_line(line):
+    docopt(pygnata.__doc__, line.split())
+
+
+@pytest.mark.parametrize('line', INVALID)
+def test_unrelated_option_is_rejected(line):
+    with pytest.raises(DocoptExit):
+        docopt(pygnata.__doc__, line.split())